@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.dependencies import get_current_stream_user
+from app.crud.push_channel import get_push_channel
+from app.crud.user import get_user
+from app.database.connection import SessionLocal
+from app.integrations.calendar.event_cache import sync_events
+from app.integrations.calendar.google_auth import get_calendar_service
+from app.integrations.gmail.google_auth import get_gmail_service
+from app.integrations.gmail.mirror import sync_mailbox
+from app.models.user import UserInDB
+from app.services.credentials import get_user_credentials, user_to_token_data
+from app.services.event_stream import broker, format_event
+from app.services.executor import run_blocking
+
+router = APIRouter()
+
+async def _stream(subscriber, reset: bool):
+    try:
+        yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+        if reset:
+            yield "event: reset\ndata: {}\n\n"
+        while not subscriber.overflowed:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), settings.EVENT_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscriber)
+
+@router.get("")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_stream_user)
+):
+    """Server-sent events for the user's mail and calendar changes.
+
+    "mail" events carry added messages, deleted ids and label changes;
+    "calendar" events carry changed events and deleted ids. Either may be
+    {"resynced": true} after a full sync. Reconnects with Last-Event-ID
+    replay what was missed; "reset" means that is no longer possible and the
+    client should refetch. Events published by any worker reach every
+    stream through the shared state.
+    """
+    subscriber, reset = await run_blocking(broker.subscribe, current_user.id, last_event_id)
+    return StreamingResponse(
+        _stream(subscriber, reset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _has_live_channel(db, user_id: int, kind: str) -> bool:
+    if not settings.PUSH_NOTIFICATIONS_ENABLED:
+        return False
+    channel = get_push_channel(db, user_id, kind)
+    return channel is not None and channel.expiration > datetime.utcnow()
+
+def _sync_streamed_user(user_id: int, max_age: timedelta):
+    db = SessionLocal()
+    try:
+        user = get_user(db, user_id)
+        creds = get_user_credentials(user_to_token_data(user), db) if user else None
+        if not creds:
+            return
+        if settings.MAIL_MIRROR_ENABLED and not _has_live_channel(db, user_id, 'gmail'):
+            sync_mailbox(get_gmail_service(creds), db, user_id, max_age)
+        if settings.CALENDAR_CACHE_ENABLED and not _has_live_channel(db, user_id, 'calendar'):
+            sync_events(get_calendar_service(creds), db, user_id, max_age)
+    finally:
+        db.close()
+
+async def sync_streamed_users():
+    """Sync mail and calendar for users with open streams that push notifications do not cover.
+
+    Only the mirror and cache that are enabled are synced, for up to
+    EVENT_STREAM_SYNC_CONCURRENCY users at a time; one user failing does
+    not stop the others.
+    """
+    if not settings.MAIL_MIRROR_ENABLED and not settings.CALENDAR_CACHE_ENABLED:
+        return
+    max_age = timedelta(seconds=settings.EVENT_STREAM_SYNC_INTERVAL_SECONDS)
+    slots = asyncio.Semaphore(settings.EVENT_STREAM_SYNC_CONCURRENCY)
+
+    async def sync_user(user_id: int):
+        async with slots:
+            try:
+                await run_blocking(_sync_streamed_user, user_id, max_age)
+            except Exception as e:
+                print(f"Error syncing streamed user {user_id}: {e}")
+
+    await asyncio.gather(*(sync_user(user_id) for user_id in broker.subscribed_user_ids()))
+
+async def run_event_stream_sync():
+    """Background task feeding open event streams by syncing their users."""
+    while True:
+        await asyncio.sleep(settings.EVENT_STREAM_SYNC_INTERVAL_SECONDS)
+        try:
+            await sync_streamed_users()
+        except Exception as e:
+            print(f"Error in event stream sync: {e}")
@@ -0,0 +1,40 @@
+import hashlib
+from typing import Optional
+
+from app.core.config import settings
+from app.models.user import TokenData, UserInDB
+from app.services.shared_state import get_state
+
+# Verified access tokens, by sha256, -> TokenData fields, each kept no longer than the token is valid
+TOKEN_PREFIX = "auth:token:"
+# User email -> UserInDB fields but the Google tokens, which stay in the database;
+# crud.user invalidates entries whenever it writes a user
+USER_PREFIX = "auth:user:"
+# Authenticated users carry blank Google tokens; credentials are built from the user's row
+TOKENLESS = {'access_token': "", 'refresh_token': ""}
+
+def _token_key(token: str) -> str:
+    # Raw bearer tokens never leave the process
+    return TOKEN_PREFIX + hashlib.sha256(token.encode()).hexdigest()
+
+def get_token_claims(token: str) -> Optional[TokenData]:
+    claims = get_state().get(_token_key(token))
+    return None if claims is None else TokenData(**claims)
+
+def set_token_claims(token: str, token_data: TokenData, ttl: float):
+    get_state().set(_token_key(token), token_data.model_dump(), ttl)
+
+def get_cached_user(email: str) -> Optional[UserInDB]:
+    user = get_state().get(USER_PREFIX + email)
+    return None if user is None else UserInDB(**user, **TOKENLESS)
+
+def set_cached_user(user: UserInDB):
+    get_state().set(USER_PREFIX + user.email, user.model_dump(mode="json", exclude=set(TOKENLESS)),
+                    settings.AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_user(email: str):
+    get_state().delete(USER_PREFIX + email)
+
+def clear_auth_cache():
+    get_state().delete_prefix(TOKEN_PREFIX)
+    get_state().delete_prefix(USER_PREFIX)
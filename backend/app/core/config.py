@@ -1,3 +1,4 @@
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,8 +12,161 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # get_current_user caches verified JWT claims and user records in the shared
+    # state; writes through crud.user invalidate them, the TTL bounds staleness otherwise
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
+    # Where caches, token refresh locks and quota counters live: "memory" keeps
+    # them per process (one worker only), "sqlite" in a file shared by the
+    # workers on one host, "redis" on a Redis-protocol server shared by any number
+    SHARED_STATE_BACKEND: str = "memory"
+    SHARED_STATE_MEMORY_MAX_ENTRIES: int = 100000
+    SHARED_STATE_SQLITE_PATH: str = "./app/database/shared_state.db"
+    SHARED_STATE_REDIS_URL: str = "redis://localhost:6379/0"
+    SHARED_STATE_KEY_PREFIX: str = "gcm:" # Namespaces this app's keys on a shared Redis
+    SHARED_STATE_TIMEOUT_SECONDS: float = 5.0 # Redis connect and reply timeout
+
+    # Firebase ID tokens are verified locally against Google's signing certs,
+    # cached for the max-age they are served with; verified tokens are
+    # remembered for a short while so repeat logins skip the signature check
+    FIREBASE_PROJECT_ID: Optional[str] = None # Read from the service account when unset
+    FIREBASE_CERTS_URL: str = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+    FIREBASE_VERIFIED_TOKEN_TTL_SECONDS: int = 300
+
     # Database settings
     DATABASE_URL: str = "sqlite:///./app/database/app.db" # Relative path within container
+    # Async engine URL; derived from DATABASE_URL (aiosqlite / asyncpg) when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT_SECONDS: int = 30
+    DATABASE_POOL_RECYCLE_SECONDS: int = 1800
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    # Create missing tables and columns at startup; turn off where the schema
+    # is managed separately to skip the per-table checks on every cold start
+    DATABASE_CREATE_TABLES: bool = True
+
+    # Google API client settings
+    GOOGLE_API_ROOT_URL: Optional[str] = None # Override googleapis.com, e.g. with a local fake
+    GOOGLE_TOKEN_URI: str = "https://oauth2.googleapis.com/token" # Where stored tokens are refreshed
+
+    # One pooled keep-alive HTTP client carries every Google API call and token
+    # refresh; HTTP/2 is used when enabled and the h2 package is installed
+    GOOGLE_HTTP_POOL_SIZE: int = 100 # Max open connections
+    GOOGLE_HTTP_KEEPALIVE_SECONDS: float = 60.0 # Idle connections are closed after this long
+    GOOGLE_HTTP_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    GOOGLE_HTTP_TIMEOUT_SECONDS: float = 60.0 # Per read or write
+    GOOGLE_HTTP2_ENABLED: bool = True
+
+    # Client-side Google API quota per user and per project, counted in the shared
+    # state, in quota units per second for each API; calls wait for quota instead of failing
+    GOOGLE_QUOTA_ENABLED: bool = True
+    GOOGLE_USER_QUOTA_PER_SECOND: Dict[str, float] = {"gmail": 250.0, "calendar": 10.0}
+    GOOGLE_PROJECT_QUOTA_PER_SECOND: Dict[str, float] = {"gmail": 20000.0, "calendar": 166.0}
+    # Google enforces per-second quotas as a moving average, which tolerates short bursts
+    GOOGLE_QUOTA_BURST_SECONDS: float = 4.0 # Bucket size; a burst may use this many seconds of quota
+    # Quota units per call, from the Gmail API usage limits; unlisted methods cost 1
+    GOOGLE_QUOTA_COSTS: Dict[str, int] = {
+        "gmail.users.getProfile": 1,
+        "gmail.users.history.list": 2,
+        "gmail.users.labels.list": 1,
+        "gmail.users.messages.attachments.get": 5,
+        "gmail.users.messages.batchModify": 50,
+        "gmail.users.messages.get": 5,
+        "gmail.users.messages.list": 5,
+        "gmail.users.messages.modify": 5,
+        "gmail.users.messages.send": 100,
+        "gmail.users.threads.get": 10,
+        "gmail.users.threads.list": 10,
+        "gmail.users.watch": 100,
+        "gmail.users.stop": 50,
+    }
+
+    # Stored Google tokens are refreshed in the background this long before they expire
+    TOKEN_REFRESH_MARGIN_SECONDS: int = 600
+    TOKEN_REFRESH_INTERVAL_SECONDS: int = 60
+    # A refresh token Google rejected as revoked or expired is not tried again for this long
+    TOKEN_REJECTED_RETRY_SECONDS: int = 24 * 3600
+
+    # Local Gmail mirror: answer search and last-received from the database,
+    # syncing incrementally when the copy is older than the staleness bound
+    MAIL_MIRROR_ENABLED: bool = False
+    MAIL_MIRROR_MAX_STALENESS_SECONDS: int = 60
+    MAIL_MIRROR_INITIAL_SYNC_SIZE: int = 500
+
+    # Batched Gmail message fetches: attempts (with exponential backoff) for messages Gmail rate limited
+    GMAIL_BATCH_MAX_ATTEMPTS: int = 4
+    GMAIL_BATCH_BACKOFF_SECONDS: float = 1.0
+
+    # Message bodies are cut at this many UTF-8 bytes, with a truncation marker
+    MAIL_BODY_MAX_BYTES: int = 256 * 1024
+
+    # Outbound mail queue: delivery workers and backoff for 429/5xx responses
+    SEND_QUEUE_WORKERS: int = 4
+    SEND_QUEUE_POLL_INTERVAL_SECONDS: float = 1.0
+    SEND_QUEUE_MAX_ATTEMPTS: int = 8
+    SEND_QUEUE_BACKOFF_BASE_SECONDS: float = 2.0
+    SEND_QUEUE_BACKOFF_MAX_SECONDS: float = 600.0
+    SEND_QUEUE_LEASE_SECONDS: int = 300 # A "sending" job untouched this long is picked up again
+    SEND_QUEUE_MAX_BULK_SIZE: int = 500
+
+    # SQLite FTS5 index over stored mail, fed by the mirror and by live fetches
+    SEARCH_INDEX_ENABLED: bool = False
+    SEARCH_INDEX_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+
+    # Local calendar event cache kept current with syncToken incremental sync
+    CALENDAR_CACHE_ENABLED: bool = False
+    CALENDAR_CACHE_MAX_STALENESS_SECONDS: int = 60
+
+    # Bulk calendar operations: calls per batch request, items per API call,
+    # and attempts (with exponential backoff) for rate-limited or 5xx items
+    CALENDAR_BATCH_SIZE: int = 50
+    CALENDAR_BULK_MAX_ITEMS: int = 1000
+    CALENDAR_BULK_MAX_ATTEMPTS: int = 4
+    CALENDAR_BULK_BACKOFF_SECONDS: float = 1.0
+
+    # Push notifications keep the mail mirror and calendar cache current without
+    # polling: Gmail users.watch publishes to a Pub/Sub topic whose push
+    # subscription targets /integrations/gmail/push?token=..., and Calendar
+    # events.watch channels post to PUSH_WEBHOOK_BASE_URL/integrations/calendar/push.
+    # The push routes only exist while enabled, and Gmail pushes are refused
+    # unless they carry the verification token or, with GMAIL_PUBSUB_AUDIENCE
+    # set, a Google-signed OIDC token from GMAIL_PUBSUB_SERVICE_ACCOUNT
+    PUSH_NOTIFICATIONS_ENABLED: bool = False
+    PUSH_WEBHOOK_BASE_URL: Optional[str] = None # Public https URL of this backend
+    GMAIL_PUBSUB_TOPIC: Optional[str] = None # projects/<project>/topics/<topic>
+    GMAIL_PUBSUB_VERIFICATION_TOKEN: Optional[str] = None
+    GMAIL_PUBSUB_AUDIENCE: Optional[str] = None # Audience set on the push subscription
+    GMAIL_PUBSUB_SERVICE_ACCOUNT: Optional[str] = None # Service account the subscription signs as
+    GOOGLE_OIDC_CERTS_URL: str = "https://www.googleapis.com/oauth2/v1/certs"
+    CALENDAR_CHANNEL_TTL_SECONDS: int = 7 * 24 * 3600
+    PUSH_CHANNEL_RENEW_MARGIN_SECONDS: int = 24 * 3600
+    PUSH_CHANNEL_RENEW_INTERVAL_SECONDS: int = 3600
+
+    # Server-sent event stream of mail and calendar changes at /api/events.
+    # Events go through the shared state, which each worker polls for its own
+    # streams. Users with open streams but no live push channel are synced
+    # server side, once per interval however many streams they have open
+    EVENT_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    EVENT_STREAM_RETRY_MS: int = 3000
+    EVENT_STREAM_HISTORY_SIZE: int = 100 # Events kept per user for Last-Event-ID resume
+    EVENT_STREAM_QUEUE_SIZE: int = 256
+    EVENT_STREAM_POLL_SECONDS: float = 1.0 # How soon events published by other workers arrive
+    EVENT_STREAM_SYNC_INTERVAL_SECONDS: int = 30
+    EVENT_STREAM_SYNC_CONCURRENCY: int = 8 # Users synced at once
+
+    # Metrics are always collected and served at /metrics; when tracing is
+    # enabled, spans for requests, Google calls and token refreshes are also
+    # exported over OTLP/HTTP to a collector
+    TRACING_ENABLED: bool = False
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "gmail-calendar-backend"
+
+    # Worker threads for blocking Google API and database calls
+    BLOCKING_IO_THREADS: int = 100
 
     # CORS settings (add your Vercel frontend URL here in production)
     FRONTEND_URL: str = "http://localhost:3000" # For local development
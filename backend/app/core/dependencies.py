@@ -1,21 +1,63 @@
+import time
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from app.core.auth_cache import TOKENLESS, get_cached_user, get_token_claims, set_cached_user, set_token_claims
+from app.core.config import settings
 from app.core.security import verify_token
 from app.database.connection import get_db
 from app.crud.user import get_user_by_email
-from app.models.user import UserInDB
+from app.models.user import TokenData, UserInDB
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _verify_token(token: str, credentials_exception) -> TokenData:
+    if not settings.AUTH_CACHE_ENABLED:
+        return verify_token(token, credentials_exception)
+    token_data = get_token_claims(token)
+    if token_data is None:
+        token_data = verify_token(token, credentials_exception)
+        ttl = settings.AUTH_CACHE_TTL_SECONDS
+        if token_data.exp is not None:
+            # Never trust a cached token past its own expiry
+            ttl = min(ttl, token_data.exp - time.time())
+        set_token_claims(token, token_data, ttl)
+    return token_data
+
+def _load_user(db: Session, email: str) -> Optional[UserInDB]:
+    user = get_cached_user(email) if settings.AUTH_CACHE_ENABLED else None
+    if user is None:
+        db_user = get_user_by_email(db, email=email)
+        if db_user is None:
+            return None
+        user = UserInDB.from_orm(db_user).model_copy(update=TOKENLESS)
+        if settings.AUTH_CACHE_ENABLED:
+            set_cached_user(user)
+    return user
+
+def _authenticate(db: Session, token: Optional[str]) -> UserInDB:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token_data = verify_token(token, credentials_exception)
-    user = get_user_by_email(db, email=token_data.email)
+    if not token:
+        raise credentials_exception
+    token_data = _verify_token(token, credentials_exception)
+    user = _load_user(db, token_data.email)
     if user is None:
         raise credentials_exception
-    return UserInDB.from_orm(user) 
\ No newline at end of file
+    return user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return _authenticate(db, token)
+
+def get_current_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """get_current_user for EventSource clients, which cannot set headers: also accepts ?access_token=."""
+    return _authenticate(db, token or access_token)
@@ -0,0 +1,14 @@
+from fastapi import HTTPException, status
+
+from app.services.google_client import is_rate_limited, retry_after_seconds
+
+# Retry-After for a throttled Google call when Google did not send one
+DEFAULT_RETRY_AFTER_SECONDS = 5
+
+def google_api_error(error: Exception, detail: str) -> HTTPException:
+    """The HTTPException for a failed Google call: 429 with Retry-After when Google throttled it, else 500."""
+    if is_rate_limited(error):
+        retry_after = retry_after_seconds(error) or DEFAULT_RETRY_AFTER_SECONDS
+        return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=detail,
+                             headers={"Retry-After": str(retry_after)})
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
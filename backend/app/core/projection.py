@@ -0,0 +1,38 @@
+from typing import List, Optional, Type
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Validate a comma-separated fields= selector against a response model.
+
+    Returns the selected field names in model order, or None to select all.
+    """
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = selected - set(model.model_fields)
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Valid fields: {', '.join(model.model_fields)}."
+        )
+    return [name for name in model.model_fields if name in selected]
+
+def project(item: Optional[dict], fields: Optional[List[str]]) -> Optional[dict]:
+    if item is None or fields is None:
+        return item
+    return {name: item.get(name) for name in fields}
+
+def projected_response(content, fields: List[str], headers: Optional[dict] = None) -> ORJSONResponse:
+    """Serialize projected items directly, bypassing response model validation."""
+    if isinstance(content, list):
+        content = [project(item, fields) for item in content]
+    else:
+        content = project(content, fields)
+    return ORJSONResponse(content, headers=headers)
+
+def ndjson_line(item: dict) -> bytes:
+    return orjson.dumps(item) + b"\n"
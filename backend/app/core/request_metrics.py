@@ -0,0 +1,54 @@
+import math
+import time
+
+from app.services.metrics import Histogram
+from app.services.tracing import span
+
+# Event streams stay open for minutes, so the default buckets are extended
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, math.inf)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving an HTTP request to sending the last byte of its response.",
+    ("method", "route", "status"),
+    REQUEST_BUCKETS,
+)
+
+def _route_template(scope) -> str:
+    # The path template keeps label values bounded; unmatched paths share one value
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording each request's latency by route template and status.
+
+    Written against raw ASGI rather than BaseHTTPMiddleware so streamed
+    responses pass through unbuffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with span(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"]}) as current:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = _route_template(scope)
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route, status=status)
+                if current is not None:
+                    current.update_name(f"{scope['method']} {route}")
+                    current.set_attribute("http.route", route)
+                    current.set_attribute("http.status_code", status)
@@ -25,7 +25,7 @@ def verify_token(token: str, credentials_exception):
         if email is None:
             raise credentials_exception
         from app.models.user import TokenData
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, exp=payload.get("exp"))
     except JWTError:
         raise credentials_exception
     return token_data 
\ No newline at end of file
@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Session
+from app.models.calendar import CalendarEvent, CalendarSyncState
+from datetime import datetime
+from typing import List
+
+def get_sync_state(db: Session, user_id: int):
+    return db.get(CalendarSyncState, user_id)
+
+def _set_sync_state(db: Session, user_id: int, sync_token: str):
+    state = db.get(CalendarSyncState, user_id)
+    if state is None:
+        state = CalendarSyncState(user_id=user_id)
+    state.sync_token = sync_token
+    state.last_synced_at = datetime.utcnow()
+    db.add(state)
+
+def _upsert_events(db: Session, user_id: int, events: List[dict]):
+    if not events:
+        return
+    existing = {
+        e.event_id: e for e in db.query(CalendarEvent).filter(
+            CalendarEvent.user_id == user_id,
+            CalendarEvent.event_id.in_([event['event_id'] for event in events])
+        )
+    }
+    for event in events:
+        db_event = existing.get(event['event_id'])
+        if db_event is None:
+            db_event = CalendarEvent(user_id=user_id)
+        for key, value in event.items():
+            setattr(db_event, key, value)
+        db.add(db_event)
+
+def _delete_events(db: Session, user_id: int, event_ids: List[str]):
+    if not event_ids:
+        return
+    db.query(CalendarEvent).filter(
+        CalendarEvent.user_id == user_id,
+        CalendarEvent.event_id.in_(event_ids)
+    ).delete(synchronize_session=False)
+
+def upsert_events(db: Session, user_id: int, events: List[dict]):
+    _upsert_events(db, user_id, events)
+    db.commit()
+
+def delete_events(db: Session, user_id: int, event_ids: List[str]):
+    _delete_events(db, user_id, event_ids)
+    db.commit()
+
+def apply_event_changes(db: Session, user_id: int, changed: List[dict], deleted: List[str], sync_token: str):
+    _upsert_events(db, user_id, changed)
+    _delete_events(db, user_id, deleted)
+    _set_sync_state(db, user_id, sync_token)
+    db.commit()
+
+def replace_events(db: Session, user_id: int, events: List[dict], sync_token: str):
+    # One transaction, so readers see either the old or the new snapshot
+    db.query(CalendarEvent).filter(CalendarEvent.user_id == user_id).delete(synchronize_session=False)
+    db.add_all([CalendarEvent(user_id=user_id, **event) for event in events])
+    _set_sync_state(db, user_id, sync_token)
+    db.commit()
+
+def get_events_between(db: Session, user_id: int, start: datetime, end: datetime):
+    return db.query(CalendarEvent).filter(
+        CalendarEvent.user_id == user_id,
+        CalendarEvent.end_at > start,
+        CalendarEvent.start_at < end
+    ).order_by(CalendarEvent.start_at).all()
+
+def get_cached_user_ids(db: Session) -> List[int]:
+    return [row.user_id for row in db.query(CalendarSyncState.user_id)]
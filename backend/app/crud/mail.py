@@ -0,0 +1,113 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.models.mail import MailMessage, MailSyncState
+from datetime import datetime
+from typing import Dict, List, Optional
+
+def _contains(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def get_sync_state(db: Session, user_id: int):
+    return db.get(MailSyncState, user_id)
+
+def save_sync_state(db: Session, user_id: int, history_id: str):
+    state = db.get(MailSyncState, user_id)
+    if state is None:
+        state = MailSyncState(user_id=user_id)
+    state.history_id = history_id
+    state.last_synced_at = datetime.utcnow()
+    db.add(state)
+    db.commit()
+    return state
+
+def upsert_messages(db: Session, user_id: int, messages: List[dict]):
+    if not messages:
+        return
+    existing = {
+        m.message_id: m for m in db.query(MailMessage).filter(
+            MailMessage.user_id == user_id,
+            MailMessage.message_id.in_([msg['message_id'] for msg in messages])
+        )
+    }
+    for msg in messages:
+        db_message = existing.get(msg['message_id'])
+        if db_message is None:
+            db_message = MailMessage(user_id=user_id)
+        for key, value in msg.items():
+            # None means "unknown", e.g. the body of a metadata-only fetch
+            if value is not None:
+                setattr(db_message, key, value)
+        db.add(db_message)
+    db.commit()
+
+def update_message_labels(db: Session, user_id: int, labels: Dict[str, List[str]]):
+    if not labels:
+        return
+    for db_message in db.query(MailMessage).filter(
+        MailMessage.user_id == user_id,
+        MailMessage.message_id.in_(list(labels))
+    ):
+        db_message.label_ids = " ".join(labels[db_message.message_id])
+    db.commit()
+
+def delete_messages(db: Session, user_id: int, message_ids: List[str]):
+    if not message_ids:
+        return
+    db.query(MailMessage).filter(
+        MailMessage.user_id == user_id,
+        MailMessage.message_id.in_(message_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def replace_mailbox(db: Session, user_id: int, messages: List[dict], history_id: str, complete: bool,
+                    oldest_internal_date: Optional[int]):
+    """Swap the user's stored messages for a fresh copy in one transaction.
+
+    Readers see either the old mailbox or the new one, never an empty one,
+    and a failure before the commit leaves the old mailbox in place.
+    """
+    db.query(MailMessage).filter(MailMessage.user_id == user_id).delete(synchronize_session=False)
+    db.add_all(MailMessage(user_id=user_id, **msg) for msg in messages)
+    state = db.get(MailSyncState, user_id)
+    if state is None:
+        state = MailSyncState(user_id=user_id)
+    state.history_id = history_id
+    state.last_synced_at = datetime.utcnow()
+    state.complete = complete
+    state.oldest_internal_date = oldest_internal_date
+    db.add(state)
+    db.commit()
+    return state
+
+def get_latest_message(db: Session, user_id: int):
+    return db.query(MailMessage).filter(
+        MailMessage.user_id == user_id
+    ).order_by(MailMessage.internal_date.desc()).first()
+
+def get_message_ids(db: Session, user_id: int) -> List[str]:
+    return [row.message_id for row in db.query(MailMessage.message_id).filter(MailMessage.user_id == user_id)]
+
+def get_user_ids_with_messages(db: Session) -> List[int]:
+    return [row.user_id for row in db.query(MailMessage.user_id).distinct()]
+
+def search_messages(db: Session, user_id: int, terms: List[str], senders: List[str], subjects: List[str], labels: List[str], limit: int, offset: int = 0):
+    query = db.query(MailMessage).filter(MailMessage.user_id == user_id)
+    for term in terms:
+        pattern = _contains(term)
+        query = query.filter(or_(
+            MailMessage.subject.ilike(pattern, escape="\\"),
+            MailMessage.sender.ilike(pattern, escape="\\"),
+            MailMessage.snippet.ilike(pattern, escape="\\"),
+            MailMessage.body.ilike(pattern, escape="\\")
+        ))
+    for sender in senders:
+        query = query.filter(MailMessage.sender.ilike(_contains(sender), escape="\\"))
+    for subject in subjects:
+        query = query.filter(MailMessage.subject.ilike(_contains(subject), escape="\\"))
+    for label in labels:
+        query = query.filter(MailMessage.label_ids.ilike(_contains(label), escape="\\"))
+    return query.order_by(MailMessage.internal_date.desc()).offset(offset).limit(limit).all()
+
+def get_mirrored_user_ids(db: Session) -> List[int]:
+    return [row.user_id for row in db.query(MailSyncState.user_id)]
@@ -0,0 +1,90 @@
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.outbound_mail import OutboundMail
+from datetime import datetime
+from typing import List, Optional
+
+def enqueue_outbound_mail(db: Session, user_id: int, messages: List[dict]) -> List[OutboundMail]:
+    """Queue messages, returning the existing job for an idempotency key seen before."""
+    jobs = {
+        job.idempotency_key: job for job in db.query(OutboundMail).filter(
+            OutboundMail.user_id == user_id,
+            OutboundMail.idempotency_key.in_([msg['idempotency_key'] for msg in messages])
+        )
+    }
+    for msg in messages:
+        if msg['idempotency_key'] not in jobs:
+            job = OutboundMail(user_id=user_id, **msg)
+            db.add(job)
+            jobs[msg['idempotency_key']] = job
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request queued one of the keys first; the retry finds its job
+        db.rollback()
+        return enqueue_outbound_mail(db, user_id, messages)
+    return [jobs[msg['idempotency_key']] for msg in messages]
+
+def get_outbound_mail(db: Session, user_id: int, job_ids: List[int]) -> List[OutboundMail]:
+    return db.query(OutboundMail).filter(
+        OutboundMail.user_id == user_id,
+        OutboundMail.id.in_(job_ids)
+    ).order_by(OutboundMail.id).all()
+
+def _claimable(now: datetime, stale_before: datetime, max_attempts: int):
+    # Due queued jobs, plus jobs whose sender stopped renewing its claim (e.g. a crash)
+    # that still have attempts left
+    return or_(
+        and_(OutboundMail.status == "queued", OutboundMail.next_attempt_at <= now),
+        and_(OutboundMail.status == "sending", OutboundMail.updated_at < stale_before,
+             OutboundMail.attempts < max_attempts)
+    )
+
+def claim_outbound_mail(db: Session, now: datetime, stale_before: datetime, max_attempts: int) -> Optional[OutboundMail]:
+    """Atomically move one due job to "sending", counting the attempt.
+
+    Abandoned jobs that already used max_attempts are marked failed instead,
+    so a job that keeps crashing its sender is not picked up forever.
+    """
+    db.query(OutboundMail).filter(
+        OutboundMail.status == "sending", OutboundMail.updated_at < stale_before,
+        OutboundMail.attempts >= max_attempts
+    ).update({
+        OutboundMail.status: "failed",
+        OutboundMail.last_error: f"Abandoned after {max_attempts} attempts.",
+    }, synchronize_session=False)
+    db.commit()
+    candidates = [row.id for row in db.query(OutboundMail.id).filter(
+        _claimable(now, stale_before, max_attempts)
+    ).order_by(OutboundMail.next_attempt_at).limit(10)]
+    for job_id in candidates:
+        # The conditional update loses to any worker that claimed the job first
+        claimed = db.query(OutboundMail).filter(
+            OutboundMail.id == job_id, _claimable(now, stale_before, max_attempts)
+        ).update({
+            OutboundMail.status: "sending",
+            OutboundMail.attempts: OutboundMail.attempts + 1,
+            OutboundMail.updated_at: now,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(OutboundMail, job_id)
+    return None
+
+def mark_outbound_mail_sent(db: Session, job: OutboundMail, gmail_message_id: str):
+    job.status = "sent"
+    job.gmail_message_id = gmail_message_id
+    job.last_error = None
+    db.commit()
+
+def retry_outbound_mail(db: Session, job: OutboundMail, error: str, next_attempt_at: datetime):
+    job.status = "queued"
+    job.last_error = error
+    job.next_attempt_at = next_attempt_at
+    db.commit()
+
+def mark_outbound_mail_failed(db: Session, job: OutboundMail, error: str):
+    job.status = "failed"
+    job.last_error = error
+    db.commit()
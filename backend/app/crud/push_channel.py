@@ -0,0 +1,21 @@
+from sqlalchemy.orm import Session
+from app.models.push_channel import PushChannel
+from datetime import datetime
+from typing import Optional
+
+def get_push_channel(db: Session, user_id: int, kind: str) -> Optional[PushChannel]:
+    return db.query(PushChannel).filter(PushChannel.user_id == user_id, PushChannel.kind == kind).first()
+
+def get_push_channel_by_channel_id(db: Session, channel_id: str) -> Optional[PushChannel]:
+    return db.query(PushChannel).filter(PushChannel.channel_id == channel_id).first()
+
+def save_push_channel(db: Session, user_id: int, kind: str, expiration: datetime, **fields) -> PushChannel:
+    channel = get_push_channel(db, user_id, kind)
+    if channel is None:
+        channel = PushChannel(user_id=user_id, kind=kind)
+    channel.expiration = expiration
+    for key, value in fields.items():
+        setattr(channel, key, value)
+    db.add(channel)
+    db.commit()
+    return channel
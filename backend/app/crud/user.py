@@ -1,6 +1,19 @@
 from sqlalchemy.orm import Session
+from app.core.auth_cache import invalidate_user
 from app.models.user import User, UserCreate
 from datetime import datetime
+from typing import Optional
+
+def parse_token_expiry(token_expiry: Optional[str]) -> Optional[datetime]:
+    if not token_expiry:
+        return None
+    try:
+        return datetime.fromisoformat(token_expiry)
+    except ValueError:
+        return None
+
+def get_user(db: Session, user_id: int):
+    return db.get(User, user_id)
 
 def get_user_by_google_id(db: Session, google_id: str):
     return db.query(User).filter(User.google_id == google_id).first()
@@ -15,19 +28,39 @@ def create_user(db: Session, user: UserCreate):
         access_token=user.access_token,
         refresh_token=user.refresh_token,
         token_expiry=user.token_expiry,
+        token_expires_at=parse_token_expiry(user.token_expiry),
         scope=user.scope
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user.email)
     return db_user
 
+def update_user_google_id(db: Session, user: User, google_id: str):
+    user.google_id = google_id
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    invalidate_user(user.email)
+    return user
+
 def update_user_tokens(db: Session, user: User, access_token: str, refresh_token: str, token_expiry: datetime, scope: str):
     user.access_token = access_token
     user.refresh_token = refresh_token
     user.token_expiry = token_expiry.isoformat()
+    user.token_expires_at = token_expiry
     user.scope = scope
     db.add(user)
     db.commit()
     db.refresh(user)
-    return user 
\ No newline at end of file
+    invalidate_user(user.email)
+    return user
+
+def get_users_with_expiring_tokens(db: Session, expires_before: datetime):
+    return db.query(User).filter(
+        User.token_expires_at.isnot(None),
+        User.token_expires_at < expires_before,
+        User.refresh_token.isnot(None),
+        User.refresh_token != ""
+    ).all()
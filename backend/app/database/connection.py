@@ -1,17 +1,92 @@
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 import os
+import time
 
-# Ensure the database directory exists
-db_dir = "app/database"
-if not os.path.exists(db_dir):
-    os.makedirs(db_dir)
+from app.core.config import settings
+from app.services.metrics import Histogram
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app/database/app.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+DEFAULT_DATABASE_URL = "sqlite:///./app/database/app.db"
+# Async drivers used when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL or DEFAULT_DATABASE_URL
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements, by statement type.",
+    ("operation",),
 )
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+def _engine_options(url) -> dict:
+    if url.get_backend_name() != "sqlite":
+        return {
+            "pool_size": settings.DATABASE_POOL_SIZE,
+            "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+            "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+            "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": True,
+        }
+    connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}
+    if _is_memory_sqlite(url):
+        # Every connection to :memory: is a new database, so share a single one
+        return {"connect_args": connect_args, "poolclass": StaticPool}
+    return {
+        "connect_args": connect_args,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT_SECONDS,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a write is in progress; synchronous=NORMAL
+    # is safe under WAL and avoids an fsync on every commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+    cursor.close()
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_SECONDS.observe(elapsed, operation=statement.lstrip().split(None, 1)[0].upper())
+
+def _discard_query_timer(exception_context):
+    # after_cursor_execute does not fire for a failed statement
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(db_engine):
+    """Time every statement executed on db_engine into DB_QUERY_SECONDS."""
+    event.listen(db_engine, "before_cursor_execute", _start_query_timer)
+    event.listen(db_engine, "after_cursor_execute", _record_query_time)
+    event.listen(db_engine, "handle_error", _discard_query_timer)
+
+def build_engine(database_url: str):
+    """Create an engine with the pool and SQLite settings from config."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        # Ensure the database directory exists
+        db_dir = os.path.dirname(url.database)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+    db_engine = create_engine(url, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    instrument_engine(db_engine)
+    return db_engine
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -22,5 +97,87 @@ def get_db():
     finally:
         db.close()
 
+def async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {url.get_backend_name()}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_sessionmaker():
+    """Session factory on the async engine, created on first use.
+
+    Needs the async driver for the database (aiosqlite or asyncpg), which
+    is an optional dependency; the sync engine works without it.
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = make_url(async_database_url())
+        options = _engine_options(url)
+        if url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+            # aiosqlite defaults to no pooling at all
+            options["poolclass"] = AsyncAdaptedQueuePool
+        _async_engine = create_async_engine(url, **options)
+        if url.get_backend_name() == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        instrument_engine(_async_engine.sync_engine)
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_sessionmaker
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+def _add_missing_columns():
+    # create_all() never alters existing tables, so add nullable columns (and
+    # their indexes) introduced after a database file was first created
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                if any(column.name in index.columns for column in missing):
+                    index.create(conn, checkfirst=True)
+
+def _backfill_token_expires_at():
+    # Rows written before token_expires_at existed only have the ISO string; the
+    # refresher range-scans the timestamp, so it would never see those users
+    from app.crud.user import parse_token_expiry
+
+    users = Base.metadata.tables["users"]
+    with engine.begin() as conn:
+        rows = conn.execute(
+            users.select().with_only_columns(users.c.id, users.c.token_expiry)
+            .where(users.c.token_expires_at.is_(None), users.c.token_expiry.isnot(None))
+        ).all()
+        updates = [{"user_id": user_id, "expires_at": parse_token_expiry(token_expiry)} for user_id, token_expiry in rows]
+        updates = [update for update in updates if update["expires_at"] is not None]
+        if updates:
+            conn.execute(
+                users.update().where(users.c.id == bindparam("user_id")).values(token_expires_at=bindparam("expires_at")),
+                updates,
+            )
+
 def create_db_tables():
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _backfill_token_expires_at()
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from app.database.connection import get_db
+from app.core.config import settings
 from app.core.dependencies import get_current_user
+from app.core.etag import compute_etag, etag_headers, etag_matches, not_modified, set_etag
+from app.core.google_errors import google_api_error
+from app.core.projection import parse_fields, projected_response
 from app.models.user import UserInDB
-from .google_auth import get_google_credentials, get_calendar_service
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, timedelta
+from app.services.executor import run_blocking
+from .google_auth import get_google_credentials, get_calendar_service, events_fields_mask
+from .event_cache import get_upcoming_event_rows, row_to_event, cache_event, uncache_event
+from .availability import find_availability
+from .bulk import run_bulk_operations
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter()
 
@@ -26,51 +34,140 @@ class EventResponse(BaseModel):
     attendees: Optional[List[str]]
     html_link: str
 
+class EventUpdateRequest(BaseModel):
+    # Fields left out keep their current values
+    event_id: str
+    summary: Optional[str] = None
+    description: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    attendees: Optional[List[str]] = None
+
+class BulkCreateRequest(BaseModel):
+    events: List[EventRequest] = Field(..., min_length=1, max_length=settings.CALENDAR_BULK_MAX_ITEMS)
+
+class BulkUpdateRequest(BaseModel):
+    events: List[EventUpdateRequest] = Field(..., min_length=1, max_length=settings.CALENDAR_BULK_MAX_ITEMS)
+
+class BulkDeleteRequest(BaseModel):
+    event_ids: List[str] = Field(..., min_length=1, max_length=settings.CALENDAR_BULK_MAX_ITEMS)
+
+class BulkItemResult(BaseModel):
+    index: int
+    success: bool
+    event_id: Optional[str] = None
+    event: Optional[EventResponse] = None
+    error: Optional[str] = None
+    attempts: int
+
+class AvailabilityRequest(BaseModel):
+    attendees: List[str] = Field(..., max_length=500)
+    time_min: datetime # Naive times are taken as UTC
+    time_max: datetime
+    duration_minutes: int = Field(..., ge=1, le=24 * 60)
+    # Spacing between candidate slot starts; defaults to the duration
+    step_minutes: Optional[int] = Field(None, ge=1, le=24 * 60)
+    include_self: bool = True # Also require the user's own primary calendar to be free
+    max_slots: int = Field(50, ge=1, le=1000)
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+class AvailabilityResponse(BaseModel):
+    slots: List[TimeSlot]
+    # Calendars whose busy times could not be read, e.g. not shared with the user
+    errors: Dict[str, str]
+
+def _event_body(request) -> dict:
+    """Calendar event resource for the fields set on an event request."""
+    event = {}
+    if request.summary is not None:
+        event['summary'] = request.summary
+    if request.description is not None:
+        event['description'] = request.description
+    if request.start_time is not None:
+        event['start'] = {'dateTime': request.start_time, 'timeZone': 'UTC'}
+    if request.end_time is not None:
+        event['end'] = {'dateTime': request.end_time, 'timeZone': 'UTC'}
+    if request.attendees:
+        event['attendees'] = [{'email': email} for email in request.attendees]
+    return event
+
+def _event_fields(event: dict) -> dict:
+    # Partial responses may leave out any field but the id
+    start = event.get('start', {})
+    end = event.get('end', {})
+    return {
+        'id': event['id'],
+        'summary': event.get('summary', 'No Title'),
+        'description': event.get('description'),
+        'start_time': start.get('dateTime', start.get('date')),
+        'end_time': end.get('dateTime', end.get('date')),
+        'attendees': [attendee['email'] for attendee in event.get('attendees', [])],
+        'html_link': event.get('htmlLink', ''),
+    }
+
+def _event_response(event: dict) -> EventResponse:
+    return EventResponse(**_event_fields(event))
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
 @router.get("/events", response_model=List[EventResponse])
 async def get_events(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description="Comma-separated EventResponse fields to return."),
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Events in the next 7 days, with an ETag over their ids and updated stamps."""
+    selected = parse_fields(fields, EventResponse)
+    representation = selected and ",".join(selected)
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
         
-        service = get_calendar_service(creds)
+        service = await run_blocking(get_calendar_service, creds)
+
+        if settings.CALENDAR_CACHE_ENABLED:
+            rows = await run_blocking(get_upcoming_event_rows, service, db, current_user.id)
+            etag = compute_etag(current_user.id, representation, *(f"{row.event_id}@{row.updated}" for row in rows))
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+            if selected is not None:
+                return projected_response([row_to_event(row) for row in rows], selected, etag_headers(etag))
+            set_etag(response, etag)
+            return [EventResponse(**row_to_event(row)) for row in rows]
         
         # Get events for the next 7 days
         now = datetime.utcnow()
         time_min = now.isoformat() + 'Z'
         time_max = (now + timedelta(days=7)).isoformat() + 'Z'
         
-        events_result = service.events().list(
+        events_result = await run_blocking(service.events().list(
             calendarId='primary',
             timeMin=time_min,
             timeMax=time_max,
             singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+            orderBy='startTime',
+            fields=events_fields_mask(selected)
+        ).execute)
         
         events = events_result.get('items', [])
-        
-        formatted_events = []
-        for event in events:
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            end = event['end'].get('dateTime', event['end'].get('date'))
-            
-            formatted_events.append(EventResponse(
-                id=event['id'],
-                summary=event.get('summary', 'No Title'),
-                description=event.get('description'),
-                start_time=start,
-                end_time=end,
-                attendees=[attendee['email'] for attendee in event.get('attendees', [])],
-                html_link=event.get('htmlLink', '')
-            ))
-        
-        return formatted_events
+        etag = compute_etag(current_user.id, representation, *(f"{event['id']}@{event.get('updated')}" for event in events))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        if selected is not None:
+            return projected_response([_event_fields(event) for event in events], selected, etag_headers(etag))
+        set_etag(response, etag)
+        return [_event_response(event) for event in events]
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get events: {e}")
+        raise google_api_error(e, f"Failed to get events: {e}")
 
 @router.post("/events", response_model=EventResponse)
 async def create_event(
@@ -79,44 +176,23 @@ async def create_event(
     db: Session = Depends(get_db)
 ):
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
         
-        service = get_calendar_service(creds)
-        
-        event = {
-            'summary': request.summary,
-            'description': request.description,
-            'start': {
-                'dateTime': request.start_time,
-                'timeZone': 'UTC',
-            },
-            'end': {
-                'dateTime': request.end_time,
-                'timeZone': 'UTC',
-            },
-        }
-        
-        if request.attendees:
-            event['attendees'] = [{'email': email} for email in request.attendees]
+        service = await run_blocking(get_calendar_service, creds)
         
-        event_result = service.events().insert(
+        event_result = await run_blocking(service.events().insert(
             calendarId='primary',
-            body=event
-        ).execute()
+            body=_event_body(request)
+        ).execute)
+
+        if settings.CALENDAR_CACHE_ENABLED:
+            await run_blocking(cache_event, db, current_user.id, event_result)
         
-        return EventResponse(
-            id=event_result['id'],
-            summary=event_result.get('summary', 'No Title'),
-            description=event_result.get('description'),
-            start_time=event_result['start'].get('dateTime', event_result['start'].get('date')),
-            end_time=event_result['end'].get('dateTime', event_result['end'].get('date')),
-            attendees=[attendee['email'] for attendee in event_result.get('attendees', [])],
-            html_link=event_result.get('htmlLink', '')
-        )
+        return _event_response(event_result)
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create event: {e}")
+        raise google_api_error(e, f"Failed to create event: {e}")
 
 @router.delete("/events/{event_id}")
 async def delete_event(
@@ -125,15 +201,108 @@ async def delete_event(
     db: Session = Depends(get_db)
 ):
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
         
-        service = get_calendar_service(creds)
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
+        service = await run_blocking(get_calendar_service, creds)
+        await run_blocking(service.events().delete(calendarId='primary', eventId=event_id).execute)
+        if settings.CALENDAR_CACHE_ENABLED:
+            await run_blocking(uncache_event, db, current_user.id, event_id)
         
         return {"message": "Event deleted successfully"}
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete event: {e}")
+        raise google_api_error(e, f"Failed to delete event: {e}")
+
+def _run_bulk(service, db, user_id: int, operations: List[dict]) -> List[dict]:
+    results = run_bulk_operations(service, operations)
+    items = []
+    for index, (operation, result) in enumerate(zip(operations, results)):
+        event = result['event']
+        if result['success'] and settings.CALENDAR_CACHE_ENABLED:
+            if operation['op'] == 'delete':
+                uncache_event(db, user_id, operation['event_id'])
+            else:
+                cache_event(db, user_id, event)
+        items.append({
+            'index': index,
+            'success': result['success'],
+            'event_id': event['id'] if event else operation.get('event_id'),
+            'event': _event_response(event) if event else None,
+            'error': result['error'],
+            'attempts': result['attempts'],
+        })
+    return items
 
- 
\ No newline at end of file
+async def _bulk_response(operations: List[dict], current_user: UserInDB, db: Session, action: str):
+    try:
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
+        if not creds:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
+
+        service = await run_blocking(get_calendar_service, creds)
+        return await run_blocking(_run_bulk, service, db, current_user.id, operations)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise google_api_error(e, f"Failed to {action} events: {e}")
+
+@router.post("/events/bulk", response_model=List[BulkItemResult])
+async def create_events_bulk(
+    request: BulkCreateRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create many events through batch requests, reporting the outcome of each."""
+    operations = [{'op': 'create', 'event': _event_body(event)} for event in request.events]
+    return await _bulk_response(operations, current_user, db, "create")
+
+@router.patch("/events/bulk", response_model=List[BulkItemResult])
+async def update_events_bulk(
+    request: BulkUpdateRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Patch many events through batch requests, reporting the outcome of each."""
+    operations = [{'op': 'update', 'event_id': event.event_id, 'event': _event_body(event)} for event in request.events]
+    return await _bulk_response(operations, current_user, db, "update")
+
+@router.post("/events/bulk/delete", response_model=List[BulkItemResult])
+async def delete_events_bulk(
+    request: BulkDeleteRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete many events through batch requests; events already gone count as deleted."""
+    operations = [{'op': 'delete', 'event_id': event_id} for event_id in request.event_ids]
+    return await _bulk_response(operations, current_user, db, "delete")
+
+@router.post("/availability", response_model=AvailabilityResponse)
+async def get_availability(
+    request: AvailabilityRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Find slots where every attendee is free, from one batched freeBusy lookup."""
+    time_min, time_max = _as_utc(request.time_min), _as_utc(request.time_max)
+    if time_max <= time_min:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="time_max must be after time_min.")
+    calendar_ids = list(dict.fromkeys((['primary'] if request.include_self else []) + request.attendees))
+    if not calendar_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No calendars to check.")
+    try:
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
+        if not creds:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
+
+        service = await run_blocking(get_calendar_service, creds)
+        step = timedelta(minutes=request.step_minutes) if request.step_minutes else None
+        slots, errors = await run_blocking(
+            find_availability, service, calendar_ids, time_min, time_max,
+            timedelta(minutes=request.duration_minutes), step, request.max_slots
+        )
+        return AvailabilityResponse(slots=[TimeSlot(start=start, end=end) for start, end in slots], errors=errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise google_api_error(e, f"Failed to find availability: {e}")
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from app.services.google_client import add_to_batch, execute_batch
+
+# freebusy.query accepts at most this many calendars per call
+FREEBUSY_MAX_CALENDARS = 50
+
+Interval = Tuple[datetime, datetime]
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+def _to_rfc3339(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def query_free_busy(service, calendar_ids: List[str], time_min: datetime, time_max: datetime):
+    """Fetch busy intervals for many calendars in one upstream round trip.
+
+    Up to FREEBUSY_MAX_CALENDARS calendars go in one freebusy.query; larger
+    lists are split across queries sent together as a single batch request.
+    Returns ({calendar id: [(start, end), ...]}, {calendar id: error reason}).
+    """
+    chunks = [calendar_ids[i:i + FREEBUSY_MAX_CALENDARS] for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS)]
+    requests = [service.freebusy().query(body={
+        'timeMin': _to_rfc3339(time_min),
+        'timeMax': _to_rfc3339(time_max),
+        'timeZone': 'UTC',
+        'items': [{'id': calendar_id} for calendar_id in chunk],
+    }) for chunk in chunks]
+    responses = {}
+    errors = {}
+    if len(requests) == 1:
+        responses['0'] = requests[0].execute()
+    else:
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                for calendar_id in chunks[int(request_id)]:
+                    errors[calendar_id] = str(exception)
+                return
+            responses[request_id] = response
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for index, request in enumerate(requests):
+            add_to_batch(batch, request, str(index))
+        execute_batch(batch, requests)
+    busy = {}
+    for response in responses.values():
+        for calendar_id, calendar in response.get('calendars', {}).items():
+            if calendar.get('errors'):
+                errors[calendar_id] = ", ".join(error.get('reason', 'unknown') for error in calendar['errors'])
+                continue
+            busy[calendar_id] = [(_parse_time(period['start']), _parse_time(period['end'])) for period in calendar.get('busy', [])]
+    return busy, errors
+
+def merge_busy_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Merge overlapping or touching intervals in one sweep over them sorted by start."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def find_free_slots(busy: List[Interval], window_start: datetime, window_end: datetime, duration: timedelta,
+                    step: Optional[timedelta] = None, limit: Optional[int] = None) -> List[Interval]:
+    """Slots of exactly duration inside the window that avoid every busy interval.
+
+    busy must be merged and sorted (see merge_busy_intervals). Within each
+    gap, slots start at the gap's start and advance by step (default:
+    duration); at most limit slots are returned.
+    """
+    step = step or duration
+    slots = []
+    cursor = window_start
+    for start, end in busy + [(window_end, window_end)]:
+        gap_end = min(start, window_end)
+        slot_start = cursor
+        while slot_start + duration <= gap_end:
+            slots.append((slot_start, slot_start + duration))
+            if limit is not None and len(slots) >= limit:
+                return slots
+            slot_start += step
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            break
+    return slots
+
+def find_availability(service, calendar_ids: List[str], time_min: datetime, time_max: datetime, duration: timedelta,
+                      step: Optional[timedelta] = None, limit: Optional[int] = None):
+    """Common free slots across calendars; returns (slots, errors by calendar id)."""
+    busy, errors = query_free_busy(service, calendar_ids, time_min, time_max)
+    merged = merge_busy_intervals([interval for intervals in busy.values() for interval in intervals])
+    return find_free_slots(merged, time_min, time_max, duration, step, limit), errors
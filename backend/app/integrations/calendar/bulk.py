@@ -0,0 +1,101 @@
+import uuid
+from typing import List
+
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.services.google_client import add_to_batch, backoff, execute_batch, is_rate_limited, network_errors
+
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, network_errors()):
+        return True
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status in RETRYABLE_STATUSES or is_rate_limited(error)
+
+def _is_already_applied(operation: dict, error: Exception, attempt: int) -> bool:
+    """Whether the error only shows that an earlier attempt of the operation went through."""
+    if not isinstance(error, HttpError):
+        return False
+    if operation['op'] == 'delete':
+        return error.resp.status == 410
+    # A retried create reuses its first attempt's event id, so a conflict means that attempt landed
+    return operation['op'] == 'create' and attempt > 1 and error.resp.status == 409
+
+def _with_event_ids(operations: List[dict]) -> List[dict]:
+    # Calendar accepts client-chosen ids in base32hex; a uuid4's hex digits are a subset
+    return [
+        {**operation, 'event': {**operation['event'], 'id': uuid.uuid4().hex}}
+        if operation['op'] == 'create' and not operation['event'].get('id') else operation
+        for operation in operations
+    ]
+
+def _created_event(service, operation: dict) -> dict:
+    # Read back the event an earlier attempt created, falling back to what was sent
+    try:
+        return service.events().get(calendarId='primary', eventId=operation['event']['id']).execute()
+    except Exception:
+        return operation['event']
+
+def _request_for(service, operation: dict):
+    if operation['op'] == 'create':
+        return service.events().insert(calendarId='primary', body=operation['event'])
+    if operation['op'] == 'update':
+        return service.events().patch(calendarId='primary', eventId=operation['event_id'], body=operation['event'])
+    return service.events().delete(calendarId='primary', eventId=operation['event_id'])
+
+def _run_batch(service, operations: List[dict], indexes: List[int]) -> dict:
+    """Send one batch; returns {index: (response, exception)}."""
+    outcomes = {}
+
+    def on_response(request_id, response, exception):
+        outcomes[int(request_id)] = (response, exception)
+
+    batch = service.new_batch_http_request(callback=on_response)
+    requests = [_request_for(service, operations[index]) for index in indexes]
+    for index, request in zip(indexes, requests):
+        add_to_batch(batch, request, str(index))
+    try:
+        execute_batch(batch, requests)
+    except Exception as e:
+        # The batch as a whole failed, so every call in it did
+        return {index: (None, e) for index in indexes}
+    return {index: outcomes.get(index, (None, RuntimeError("Missing from batch response"))) for index in indexes}
+
+def run_bulk_operations(service, operations: List[dict]) -> List[dict]:
+    """Apply create/update/delete operations through Calendar batch requests.
+
+    Each operation is {'op': 'create', 'event': body}, {'op': 'update',
+    'event_id': id, 'event': partial body} or {'op': 'delete', 'event_id': id}.
+    Operations go out CALENDAR_BATCH_SIZE per batch. Those failing with a
+    rate limit, 5xx or network error are retried together in later batches,
+    with backoff, up to CALENDAR_BULK_MAX_ATTEMPTS attempts. Creates get a
+    client-generated event id up front, so a retry of an insert that did
+    land conflicts instead of creating a duplicate. Returns one result per
+    operation, in order, with the event, error and attempts.
+    """
+    operations = _with_event_ids(operations)
+    results = [None] * len(operations)
+    pending = list(range(len(operations)))
+    attempt = 0
+    while pending:
+        attempt += 1
+        retry = []
+        for start in range(0, len(pending), settings.CALENDAR_BATCH_SIZE):
+            outcomes = _run_batch(service, operations, pending[start:start + settings.CALENDAR_BATCH_SIZE])
+            for index, (response, exception) in outcomes.items():
+                if exception is None:
+                    results[index] = {'success': True, 'event': response or None, 'error': None, 'attempts': attempt}
+                elif _is_already_applied(operations[index], exception, attempt):
+                    event = _created_event(service, operations[index]) if operations[index]['op'] == 'create' else None
+                    results[index] = {'success': True, 'event': event, 'error': None, 'attempts': attempt}
+                elif _is_retryable(exception) and attempt < settings.CALENDAR_BULK_MAX_ATTEMPTS:
+                    retry.append(index)
+                else:
+                    results[index] = {'success': False, 'event': None, 'error': str(exception), 'attempts': attempt}
+        pending = sorted(retry)
+        if pending:
+            backoff(attempt, settings.CALENDAR_BULK_BACKOFF_SECONDS)
+    return results
@@ -0,0 +1,163 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.crud.calendar import (
+    apply_event_changes, delete_events, get_events_between, get_sync_state,
+    replace_events, upsert_events
+)
+from app.database.connection import SessionLocal
+from app.services.event_stream import publish_event
+from app.services.executor import submit_blocking
+
+# Partial response with just what event_to_row reads, plus status for deletions
+CACHED_EVENT_FIELDS = "items(id,status,summary,description,start,end,attendees/email,htmlLink,updated),nextPageToken,nextSyncToken"
+
+# One sync at a time per user; readers never wait on it once a snapshot exists
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+def _sync_lock(user_id: int) -> threading.Lock:
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(user_id, threading.Lock())
+
+def _to_utc(value: dict) -> datetime:
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')).astimezone(timezone.utc).replace(tzinfo=None)
+    # All-day events only carry a date
+    return datetime.fromisoformat(value['date'])
+
+def event_to_row(event: dict) -> dict:
+    return {
+        'event_id': event['id'],
+        'summary': event.get('summary', 'No Title'),
+        'description': event.get('description'),
+        'start_time': event['start'].get('dateTime', event['start'].get('date')),
+        'end_time': event['end'].get('dateTime', event['end'].get('date')),
+        'start_at': _to_utc(event['start']),
+        'end_at': _to_utc(event['end']),
+        'attendees': json.dumps([attendee['email'] for attendee in event.get('attendees', [])]),
+        'html_link': event.get('htmlLink', ''),
+        'updated': event.get('updated'),
+    }
+
+def _row_payload(row: dict) -> dict:
+    # The row_to_event shape, built from an event_to_row dict
+    return {
+        'id': row['event_id'],
+        'summary': row['summary'],
+        'description': row['description'],
+        'start_time': row['start_time'],
+        'end_time': row['end_time'],
+        'attendees': json.loads(row['attendees']),
+        'html_link': row['html_link'],
+    }
+
+def row_to_event(db_event) -> dict:
+    return {
+        'id': db_event.event_id,
+        'summary': db_event.summary,
+        'description': db_event.description,
+        'start_time': db_event.start_time,
+        'end_time': db_event.end_time,
+        'attendees': json.loads(db_event.attendees or "[]"),
+        'html_link': db_event.html_link or "",
+    }
+
+def _list_events(service, **params):
+    """Page through events.list, returning (items, nextSyncToken)."""
+    items = []
+    page_token = None
+    while True:
+        results = service.events().list(
+            calendarId='primary', singleEvents=True, pageToken=page_token, fields=CACHED_EVENT_FIELDS, **params
+        ).execute()
+        items += results.get('items', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return items, results.get('nextSyncToken')
+
+def _full_sync(service, db, user_id: int):
+    # Everything is fetched before the swap, so readers keep the old snapshot meanwhile
+    items, sync_token = _list_events(service)
+    events = [event_to_row(event) for event in items if event.get('status') != 'cancelled']
+    replace_events(db, user_id, events, sync_token)
+    publish_event(user_id, 'calendar', {'resynced': True})
+
+def _background_full_sync(service, user_id: int):
+    db = SessionLocal()
+    try:
+        with _sync_lock(user_id):
+            _full_sync(service, db, user_id)
+    except Exception as e:
+        print(f"Error resyncing calendar for user {user_id}: {e}")
+    finally:
+        db.close()
+
+def sync_events(service, db, user_id: int, max_age: timedelta = timedelta(0)):
+    """Bring the user's event cache up to date unless synced within max_age.
+
+    If another sync for the user is already running and a snapshot exists,
+    return immediately and let the caller read the current snapshot. When
+    Google invalidates the sync token (410 Gone) the full resync runs in the
+    background while readers keep the old snapshot.
+    """
+    state = get_sync_state(db, user_id)
+    if state is not None and state.last_synced_at and datetime.utcnow() - state.last_synced_at <= max_age:
+        return
+    lock = _sync_lock(user_id)
+    if not lock.acquire(blocking=state is None or not state.sync_token):
+        return
+    try:
+        # Another thread may have finished a sync while we waited for the lock
+        db.expire_all()
+        state = get_sync_state(db, user_id)
+        if state is not None and state.last_synced_at and datetime.utcnow() - state.last_synced_at <= max_age:
+            return
+        if state is None or not state.sync_token:
+            _full_sync(service, db, user_id)
+            return
+        try:
+            items, sync_token = _list_events(service, syncToken=state.sync_token)
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            submit_blocking(_background_full_sync, service, user_id)
+            return
+        changed = [event_to_row(event) for event in items if event.get('status') != 'cancelled']
+        deleted = [event['id'] for event in items if event.get('status') == 'cancelled']
+        apply_event_changes(db, user_id, changed, deleted, sync_token)
+        if changed or deleted:
+            publish_event(user_id, 'calendar', {'changed': [_row_payload(row) for row in changed], 'deleted': deleted})
+    finally:
+        lock.release()
+
+def get_upcoming_event_rows(service, db, user_id: int, days: int = 7):
+    """Cached events in the next days, syncing first if the cache is stale."""
+    try:
+        sync_events(service, db, user_id, timedelta(seconds=settings.CALENDAR_CACHE_MAX_STALENESS_SECONDS))
+    except Exception as e:
+        if get_sync_state(db, user_id) is None:
+            raise
+        print(f"Error syncing calendar, serving cached events: {e}")
+    now = datetime.utcnow()
+    return get_events_between(db, user_id, now, now + timedelta(days=days))
+
+def get_upcoming_events(service, db, user_id: int, days: int = 7):
+    return [row_to_event(event) for event in get_upcoming_event_rows(service, db, user_id, days)]
+
+def cache_event(db, user_id: int, event: dict):
+    """Write a created or updated event through to the cache."""
+    if event.get('status') == 'cancelled':
+        uncache_event(db, user_id, event['id'])
+        return
+    row = event_to_row(event)
+    upsert_events(db, user_id, [row])
+    publish_event(user_id, 'calendar', {'changed': [_row_payload(row)], 'deleted': []})
+
+def uncache_event(db, user_id: int, event_id: str):
+    delete_events(db, user_id, [event_id])
+    publish_event(user_id, 'calendar', {'changed': [], 'deleted': [event_id]})
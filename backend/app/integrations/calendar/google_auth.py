@@ -1,13 +1,7 @@
-import os
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 
-from app.core.config import settings
-from app.crud.user import update_user_tokens
+from app.services.credentials import get_stored_credentials
+from app.services.google_client import get_service
 from .config import CALENDAR_REDIRECT_URI
 
 SCOPES = [
@@ -19,7 +13,24 @@ SCOPES = [
 
 CLIENT_SECRETS_FILE = "./app/credentials.json"
 
+# Part of an event resource each EventResponse field is read from
+EVENT_FIELD_SOURCES = {
+    'id': 'id',
+    'summary': 'summary',
+    'description': 'description',
+    'start_time': 'start',
+    'end_time': 'end',
+    'attendees': 'attendees/email',
+    'html_link': 'htmlLink',
+}
+
+def events_fields_mask(fields: Optional[List[str]] = None) -> str:
+    """Partial-response mask for events.list covering the given EventResponse fields (default: all)."""
+    sources = {'id', 'updated'} | {EVENT_FIELD_SOURCES[name] for name in (fields or EVENT_FIELD_SOURCES)}
+    return f"items({','.join(sorted(sources))})"
+
 def get_google_auth_flow():
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
@@ -27,42 +38,14 @@ def get_google_auth_flow():
     )
     return flow
 
-def get_google_credentials(user_data: dict, user_id: int, db):
+def get_google_credentials(user_id: int, db):
     """Get Google credentials for calendar access"""
-    try:
-        creds = None
-        if user_data:
-            creds = Credentials(
-                token=user_data.get('access_token'),
-                refresh_token=user_data.get('refresh_token'),
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=settings.GOOGLE_CLIENT_ID,
-                client_secret=settings.GOOGLE_CLIENT_SECRET,
-                scopes=SCOPES
-            )
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    from app.crud.user import get_user_by_google_id
-                    db_user = get_user_by_google_id(db, user_data['google_id'])
-                    if db_user:
-                        update_user_tokens(db, db_user, creds.token, creds.refresh_token, creds.expiry, " ".join(creds.scopes))
-                except Exception as e:
-                    print(f"Error refreshing token: {e}")
-                    return None
-            else:
-                print("No valid credentials or refresh token available.")
-                return None
-        return creds
-    except Exception as e:
-        print(f"Error getting Google credentials: {e}")
-        return None
+    return get_stored_credentials(db, user_id, SCOPES)
 
 def get_calendar_service(credentials):
     """Get Google Calendar service"""
     try:
-        service = build('calendar', 'v3', credentials=credentials)
+        service = get_service('calendar', 'v3', credentials)
         return service
     except Exception as e:
         print(f"Error building calendar service: {e}")
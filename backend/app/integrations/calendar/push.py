@@ -0,0 +1,114 @@
+import asyncio
+import hmac
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, Header, Response, status
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.crud.calendar import get_cached_user_ids
+from app.crud.push_channel import get_push_channel, get_push_channel_by_channel_id, save_push_channel
+from app.crud.user import get_user
+from app.database.connection import SessionLocal
+from app.services.credentials import get_user_credentials, user_to_token_data
+from app.services.executor import run_blocking, submit_blocking
+from .event_cache import sync_events
+from .google_auth import SCOPES, get_calendar_service
+
+router = APIRouter()
+
+def _calendar_service(db, user_id: int):
+    user = get_user(db, user_id)
+    creds = get_user_credentials(user_to_token_data(user), db, SCOPES) if user else None
+    return get_calendar_service(creds) if creds else None
+
+def watch_calendar(db, user_id: int):
+    """Open a notification channel on the user's primary calendar, replacing any existing one."""
+    service = _calendar_service(db, user_id)
+    if service is None:
+        return None
+    result = service.events().watch(calendarId='primary', body={
+        'id': str(uuid4()),
+        'type': 'web_hook',
+        'address': f"{settings.PUSH_WEBHOOK_BASE_URL.rstrip('/')}/integrations/calendar/push",
+        'token': secrets.token_urlsafe(32),
+        'params': {'ttl': str(settings.CALENDAR_CHANNEL_TTL_SECONDS)},
+    }).execute()
+    previous = get_push_channel(db, user_id, 'calendar')
+    if previous is not None and previous.channel_id:
+        try:
+            # Channels cannot be extended; stop the old one once the new one is live
+            service.channels().stop(body={'id': previous.channel_id, 'resourceId': previous.resource_id}).execute()
+        except HttpError as e:
+            print(f"Error stopping calendar channel {previous.channel_id}: {e}")
+    expiration = datetime.utcfromtimestamp(int(result['expiration']) / 1000)
+    return save_push_channel(
+        db, user_id, 'calendar', expiration,
+        channel_id=result['id'], resource_id=result['resourceId'], token=result.get('token')
+    )
+
+def refresh_calendar(user_id: int):
+    """Pull the changes behind a notification into the user's event cache."""
+    db = SessionLocal()
+    try:
+        service = _calendar_service(db, user_id)
+        if service is not None:
+            sync_events(service, db, user_id)
+    except Exception as e:
+        print(f"Error handling calendar notification for user {user_id}: {e}")
+    finally:
+        db.close()
+
+def renew_calendar_channels():
+    """Open channels for every cached calendar, replacing those that expire within the margin."""
+    renew_before = datetime.utcnow() + timedelta(seconds=settings.PUSH_CHANNEL_RENEW_MARGIN_SECONDS)
+    db = SessionLocal()
+    try:
+        for user_id in get_cached_user_ids(db):
+            channel = get_push_channel(db, user_id, 'calendar')
+            if channel is not None and channel.expiration > renew_before:
+                continue
+            try:
+                watch_calendar(db, user_id)
+            except HttpError as e:
+                print(f"Error renewing calendar channel for user {user_id}: {e}")
+    finally:
+        db.close()
+
+async def run_calendar_channel_renewal():
+    """Background task keeping calendar channels ahead of their expiry."""
+    while True:
+        try:
+            await run_blocking(renew_calendar_channels)
+        except Exception as e:
+            print(f"Error in calendar channel renewal: {e}")
+        await asyncio.sleep(settings.PUSH_CHANNEL_RENEW_INTERVAL_SECONDS)
+
+def _find_channel_user(channel_id: str, token: Optional[str]) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        channel = get_push_channel_by_channel_id(db, channel_id)
+        if channel is None or not hmac.compare_digest(channel.token or "", token or ""):
+            return None
+        return channel.user_id
+    finally:
+        db.close()
+
+@router.post("", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_calendar_notification(
+    x_goog_channel_id: str = Header(...),
+    x_goog_resource_state: str = Header(...),
+    x_goog_channel_token: Optional[str] = Header(None)
+):
+    """Webhook for Calendar events.watch channels; the body is always empty."""
+    user_id = await run_blocking(_find_channel_user, x_goog_channel_id, x_goog_channel_token)
+    if user_id is None:
+        # Unknown or replaced channel: acknowledge it so Google stops retrying
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    # "sync" only confirms a new channel; anything else means the calendar changed
+    if x_goog_resource_state != 'sync':
+        submit_blocking(refresh_calendar, user_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
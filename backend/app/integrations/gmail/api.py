@@ -1,16 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database.connection import get_db
+from app.database.connection import SessionLocal, get_db
+from app.core.config import settings
 from app.core.dependencies import get_current_user
+from app.core.etag import compute_etag, etag_headers, etag_matches, not_modified, set_etag
+from app.core.google_errors import google_api_error
+from app.core.projection import ndjson_line, parse_fields, project, projected_response
 from app.models.user import UserInDB
-from .google_auth import get_google_credentials, get_gmail_service, search_gmail_messages, get_last_received_email, send_gmail_message
-from pydantic import BaseModel
-from typing import List, Optional
+from app.services.executor import run_blocking
+from .google_auth import get_google_credentials, get_gmail_service, search_gmail_page, list_gmail_message_ids, iter_parsed_messages, get_gmail_message, get_last_received_message_id, message_fields_mask
+from .mirror import search_mailbox, search_local_mailbox, get_last_received_from_mailbox, remember_messages
+from .send_queue import notify_send_queue, queue_messages
+from app.crud.outbound_mail import get_outbound_mail
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal, Optional, Tuple
 
 router = APIRouter()
 
+NEXT_PAGE_HEADER = "X-Next-Page-Token"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Cursors for locally answered searches are offsets; Gmail's are opaque
+LOCAL_CURSOR_PREFIX = "local:"
+# "older:<seconds>:<Gmail token>" continues a search in Gmail past the oldest mirrored message
+OLDER_CURSOR_PREFIX = "older:"
+# Fields a message needs for remember_messages to store it
+REMEMBERED_FIELDS = {'id', 'threadId', 'subject', 'sender', 'date', 'snippet'}
+FIELDS_DESCRIPTION = "Comma-separated EmailResponse fields to return; the rest are not fetched from Gmail."
+
 class EmailSearchRequest(BaseModel):
     query: str
+    # "metadata" skips bodies; fetch them lazily via GET /messages/{message_id}
+    format: Literal['full', 'metadata'] = 'full'
+    # "local" only searches stored mail, "remote" always asks Gmail, "auto"
+    # uses the mirror when enabled and able to answer the query
+    source: Literal['local', 'remote', 'auto'] = 'auto'
+    # Pass the X-Next-Page-Token response header back to get the next page
+    page_size: int = Field(10, ge=1, le=500)
+    page_token: Optional[str] = None
 
 class EmailSendRequest(BaseModel):
     to_email: str
@@ -18,6 +46,23 @@ class EmailSendRequest(BaseModel):
     message_text: str
     thread_id: Optional[str] = None
 
+class BulkEmailItem(EmailSendRequest):
+    # Resending an item with the same key returns its original job
+    idempotency_key: Optional[str] = None
+
+class BulkEmailSendRequest(BaseModel):
+    messages: List[BulkEmailItem] = Field(..., min_length=1, max_length=settings.SEND_QUEUE_MAX_BULK_SIZE)
+
+class SendJobResponse(BaseModel):
+    job_id: int
+    status: Literal['queued', 'sending', 'sent', 'failed']
+    to_email: str
+    attempts: int
+    last_error: Optional[str] = None
+    gmail_message_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class EmailResponse(BaseModel):
     id: str
     threadId: str
@@ -27,52 +72,293 @@ class EmailResponse(BaseModel):
     snippet: str
     body: str
 
+# Streamed lines bypass the response model, so they are cut down to its fields
+EMAIL_FIELDS = list(EmailResponse.model_fields)
+
+def _local_offset(page_token: Optional[str]) -> Optional[int]:
+    """Offset encoded in a local cursor; 0 without a cursor, None for a Gmail token."""
+    if not page_token:
+        return 0
+    if not page_token.startswith(LOCAL_CURSOR_PREFIX):
+        return None
+    try:
+        return int(page_token[len(LOCAL_CURSOR_PREFIX):])
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page token.")
+
+def _next_local_cursor(offset: int, messages: list, page_size: int) -> Optional[str]:
+    return f"{LOCAL_CURSOR_PREFIX}{offset + page_size}" if len(messages) == page_size else None
+
+def _older_cursor(older_than: int, gmail_page_token: Optional[str]) -> str:
+    return f"{OLDER_CURSOR_PREFIX}{older_than}:{gmail_page_token or ''}"
+
+def _parse_older_cursor(page_token: Optional[str]) -> Optional[Tuple[int, Optional[str]]]:
+    if not page_token or not page_token.startswith(OLDER_CURSOR_PREFIX):
+        return None
+    older_than, _, gmail_page_token = page_token[len(OLDER_CURSOR_PREFIX):].partition(":")
+    if not older_than.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page token.")
+    return int(older_than), gmail_page_token or None
+
+def _continue_cursor(older: Optional[Tuple[int, Optional[str]]], next_page_token: Optional[str]) -> Optional[str]:
+    # Later pages of a search continued past the mirror keep its cutoff
+    if older is None or next_page_token is None:
+        return next_page_token
+    return _older_cursor(older[0], next_page_token)
+
+def _cursor_headers(next_page_token: Optional[str]) -> dict:
+    return {NEXT_PAGE_HEADER: next_page_token} if next_page_token else {}
+
+def _message_format(format: str, fields: Optional[List[str]]) -> str:
+    # Bodies are only fetched when they will be returned
+    return format if fields is None or 'body' in fields else 'metadata'
+
+def _rememberable(fields: Optional[List[str]]) -> bool:
+    return settings.SEARCH_INDEX_ENABLED and (fields is None or REMEMBERED_FIELDS <= set(fields))
+
+def _page_response(messages: list, next_page_token: Optional[str], response: Response, stream: bool,
+                   fields: Optional[List[str]] = None):
+    if stream:
+        lines = (ndjson_line(project(message, fields or EMAIL_FIELDS)) for message in messages)
+        return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE, headers=_cursor_headers(next_page_token))
+    if fields is not None:
+        return projected_response(messages, fields, _cursor_headers(next_page_token))
+    response.headers.update(_cursor_headers(next_page_token))
+    return messages
+
+async def _stream_gmail_messages(service, message_ids: List[str], format: str, user_id: int,
+                                 fields: Optional[List[str]] = None):
+    # Each message is written out as soon as its batch is hydrated
+    messages = iter_parsed_messages(service, message_ids, format, message_fields_mask(fields))
+    hydrated = []
+    while True:
+        message = await run_blocking(next, messages, None)
+        if message is None:
+            break
+        hydrated.append(message)
+        yield ndjson_line(project(message, fields or EMAIL_FIELDS))
+    if _rememberable(fields):
+        # The request's session is already closed once streaming starts
+        db = SessionLocal()
+        try:
+            await run_blocking(remember_messages, db, user_id, hydrated)
+        finally:
+            db.close()
+
 @router.post("/search", response_model=List[EmailResponse])
 async def search_emails(
     request: EmailSearchRequest,
+    response: Response,
+    accept: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Search mail one page at a time.
+
+    Send "Accept: application/x-ndjson" to receive one JSON message per line,
+    each written as soon as it is available.
+    """
+    stream = accept is not None and NDJSON_MEDIA_TYPE in accept
+    selected = parse_fields(fields, EmailResponse)
+    format = _message_format(request.format, selected)
+    offset = _local_offset(request.page_token)
+    if request.source == 'local':
+        if offset is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page token for local search.")
+        messages = await run_blocking(search_local_mailbox, db, current_user.id, request.query, format, request.page_size, offset)
+        if messages is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Query is not supported by local search.")
+        return _page_response(messages, _next_local_cursor(offset, messages, request.page_size), response, stream, selected)
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
-        service = get_gmail_service(creds)
-        messages = search_gmail_messages(service, request.query)
-        return messages
+        service = await run_blocking(get_gmail_service, creds)
+        if request.source == 'auto' and settings.MAIL_MIRROR_ENABLED and offset is not None:
+            mirrored = await run_blocking(search_mailbox, service, db, current_user.id, request.query, format, request.page_size, offset)
+            if mirrored is not None:
+                messages, older_than = mirrored
+                next_cursor = _next_local_cursor(offset, messages, request.page_size)
+                if next_cursor is None and older_than is not None:
+                    # The mirror has run out of matches; older ones are only in Gmail
+                    next_cursor = _older_cursor(older_than, None)
+                return _page_response(messages, next_cursor, response, stream, selected)
+        if offset:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Page token does not belong to a Gmail search.")
+        query = request.query
+        gmail_page_token = request.page_token if offset is None else None
+        older = _parse_older_cursor(gmail_page_token)
+        if older is not None:
+            older_than, gmail_page_token = older
+            query = f"{query} before:{older_than}"
+
+        if stream:
+            message_ids, next_page_token = await run_blocking(list_gmail_message_ids, service, query, request.page_size, gmail_page_token)
+            next_page_token = _continue_cursor(older, next_page_token)
+            return StreamingResponse(
+                _stream_gmail_messages(service, message_ids, format, current_user.id, selected),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=_cursor_headers(next_page_token)
+            )
+        messages, next_page_token = await run_blocking(
+            search_gmail_page, service, query, format, request.page_size, gmail_page_token, message_fields_mask(selected)
+        )
+        next_page_token = _continue_cursor(older, next_page_token)
+        if _rememberable(selected):
+            await run_blocking(remember_messages, db, current_user.id, messages)
+        return _page_response(messages, next_page_token, response, stream, selected)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to search emails: {e}")
+        raise google_api_error(e, f"Failed to search emails: {e}")
 
-@router.get("/last-received", response_model=Optional[EmailResponse])
-async def get_last_email(
+@router.get("/messages/{message_id}", response_model=EmailResponse)
+async def get_email(
+    message_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    selected = parse_fields(fields, EmailResponse)
+    # A message's content never changes, so a client holding it needs no upstream call
+    etag = compute_etag(current_user.id, message_id, selected and ",".join(selected))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
-        service = get_gmail_service(creds)
-        email = get_last_received_email(service)
-        return email
+        service = await run_blocking(get_gmail_service, creds)
+        email = await run_blocking(
+            get_gmail_message, service, message_id, _message_format('full', selected), message_fields_mask(selected)
+        )
+        if email is not None and _rememberable(selected):
+            await run_blocking(remember_messages, db, current_user.id, [email])
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get last email: {e}")
+        raise google_api_error(e, f"Failed to get email: {e}")
+    if email is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found.")
+    if selected is not None:
+        return projected_response(email, selected, etag_headers(etag))
+    set_etag(response, etag)
+    return email
 
-@router.post("/send")
-async def send_email(
-    request: EmailSendRequest,
+@router.get("/last-received", response_model=Optional[EmailResponse])
+async def get_last_email(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """The newest message. Its ETag is derived from the message id, so a
+    matching If-None-Match gets a 304 before the message is fetched."""
+    selected = parse_fields(fields, EmailResponse)
+    representation = selected and ",".join(selected)
     try:
-        creds = get_google_credentials(current_user.dict(), current_user.id, db)
+        creds = await run_blocking(get_google_credentials, current_user.id, db)
         if not creds:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not refresh Google credentials.")
-        service = get_gmail_service(creds)
-        send_result = send_gmail_message(service, current_user.email, request.to_email, request.subject, request.message_text, request.thread_id)
-        if send_result:
-            return {"message": "Email sent successfully", "id": send_result['id']}
+        service = await run_blocking(get_gmail_service, creds)
+        email = None
+        if settings.MAIL_MIRROR_ENABLED:
+            email = await run_blocking(get_last_received_from_mailbox, service, db, current_user.id)
+        if email is None:
+            message_id = await run_blocking(get_last_received_message_id, service)
+            etag = compute_etag(current_user.id, message_id, representation)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+            if message_id:
+                email = await run_blocking(
+                    get_gmail_message, service, message_id, _message_format('full', selected), message_fields_mask(selected)
+                )
         else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send email.")
+            etag = compute_etag(current_user.id, email['id'], representation)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+        if selected is not None:
+            return projected_response(email, selected, etag_headers(etag))
+        set_etag(response, etag)
+        return email
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to send email: {e}") 
\ No newline at end of file
+        raise google_api_error(e, f"Failed to get last email: {e}")
+
+def _job_response(job) -> dict:
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'to_email': job.to_email,
+        'attempts': job.attempts,
+        'last_error': job.last_error,
+        'gmail_message_id': job.gmail_message_id,
+        'created_at': job.created_at,
+        'updated_at': job.updated_at,
+    }
+
+def _queue_and_describe(db, user, messages: List[dict]) -> List[dict]:
+    return [_job_response(job) for job in queue_messages(db, user, messages)]
+
+@router.post("/send", response_model=SendJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def send_email(
+    request: EmailSendRequest,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a message for delivery; poll GET /send/jobs/{job_id} for the outcome."""
+    message = {**request.dict(), 'idempotency_key': idempotency_key}
+    jobs = await run_blocking(_queue_and_describe, db, current_user, [message])
+    notify_send_queue()
+    return jobs[0]
+
+@router.post("/send/bulk", response_model=List[SendJobResponse], status_code=status.HTTP_202_ACCEPTED)
+async def send_bulk_email(
+    request: BulkEmailSendRequest,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue many messages at once, returning one job per message in request order.
+
+    Items without their own idempotency_key derive one from the
+    Idempotency-Key header and their position, when the header is sent.
+    """
+    messages = []
+    for index, item in enumerate(request.messages):
+        message = item.dict()
+        if not message['idempotency_key'] and idempotency_key:
+            message['idempotency_key'] = f"{idempotency_key}:{index}"
+        messages.append(message)
+    jobs = await run_blocking(_queue_and_describe, db, current_user, messages)
+    notify_send_queue()
+    return jobs
+
+def _describe_jobs(db, user_id: int, job_ids: List[int]) -> List[dict]:
+    return [_job_response(job) for job in get_outbound_mail(db, user_id, job_ids)]
+
+@router.get("/send/jobs", response_model=List[SendJobResponse])
+async def get_send_jobs(
+    ids: List[int] = Query(..., max_length=settings.SEND_QUEUE_MAX_BULK_SIZE),
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status of several send jobs, e.g. those returned by /send/bulk."""
+    return await run_blocking(_describe_jobs, db, current_user.id, ids)
+
+@router.get("/send/jobs/{job_id}", response_model=SendJobResponse)
+async def get_send_job(
+    job_id: int,
+    current_user: UserInDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    jobs = await run_blocking(_describe_jobs, db, current_user.id, [job_id])
+    if not jobs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Send job not found.")
+    return jobs[0]
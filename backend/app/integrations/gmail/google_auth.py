@@ -1,16 +1,14 @@
-import os
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
-from typing import Optional
+import logging
+from googleapiclient.errors import HttpError
+from typing import List, Optional
 import base64
 from email.mime.text import MIMEText
 
 from app.core.config import settings
-from app.crud.user import update_user_tokens
+from app.services.credentials import get_stored_credentials
+from app.services.google_client import add_to_batch, backoff, execute_batch, get_service, is_rate_limited
 from .config import GMAIL_REDIRECT_URI
+from .mime import extract_body
 
 SCOPES = [
     'openid',
@@ -23,7 +21,10 @@ SCOPES = [
 
 CLIENT_SECRETS_FILE = "./app/credentials.json"
 
+logger = logging.getLogger(__name__)
+
 def get_google_auth_flow():
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
@@ -31,118 +32,195 @@ def get_google_auth_flow():
     )
     return flow
 
-def get_google_credentials(token_data: dict, db_user_id: int, db):
-    creds = None
-    if token_data:
-        creds = Credentials(
-            token=token_data.get('access_token'),
-            refresh_token=token_data.get('refresh_token'),
-            token_uri='https://oauth2.googleapis.com/token',
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET,
-            scopes=SCOPES
+def get_google_credentials(user_id: int, db):
+    return get_stored_credentials(db, user_id, SCOPES)
+
+def get_gmail_service(creds):
+    return get_service('gmail', 'v1', creds)
+
+# Gmail accepts up to 100 calls per batch but recommends no more than 50
+BATCH_SIZE = 50
+# Streamed searches start with a small batch so the first results arrive quickly
+STREAM_FIRST_BATCH_SIZE = 5
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+
+def _get_header(headers, name: str, default: str):
+    return next((h['value'] for h in headers if h['name'] == name), default)
+
+# Part of a messages.get resource each parsed message field is read from
+MESSAGE_FIELD_SOURCES = {
+    'id': 'id',
+    'threadId': 'threadId',
+    'subject': 'payload/headers',
+    'sender': 'payload/headers',
+    'date': 'payload/headers',
+    'snippet': 'snippet',
+    'body': 'payload',
+}
+
+def message_fields_mask(fields: Optional[List[str]]) -> Optional[str]:
+    """Partial-response mask for messages.get covering the given parsed fields."""
+    if fields is None:
+        return None
+    # labelIds is cheap and lets remember_messages store the labels too
+    sources = {'id', 'threadId', 'labelIds'} | {MESSAGE_FIELD_SOURCES[name] for name in fields}
+    if 'payload' in sources:
+        sources.discard('payload/headers')
+    return ",".join(sorted(sources))
+
+def _parse_message(msg_details, include_body: bool = True):
+    # Partial responses may leave out the payload or snippet
+    payload = msg_details.get('payload', {})
+    headers = payload.get('headers', [])
+    return {
+        'id': msg_details['id'],
+        'threadId': msg_details['threadId'],
+        'subject': _get_header(headers, 'Subject', 'No Subject'),
+        'sender': _get_header(headers, 'From', 'Unknown Sender'),
+        'date': _get_header(headers, 'Date', 'No Date'),
+        'snippet': msg_details.get('snippet', ''),
+        'body': extract_body(payload) if include_body and payload else "",
+        # Not part of EmailResponse; kept so remember_messages can store them
+        'labelIds': msg_details.get('labelIds'),
+    }
+
+def _message_get_request(service, message_id: str, format: str = 'full', fields: Optional[str] = None):
+    params = {'fields': fields} if fields else {}
+    if format == 'metadata':
+        return service.users().messages().get(
+            userId='me', id=message_id, format='metadata', metadataHeaders=METADATA_HEADERS, **params
         )
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                from app.crud.user import get_user_by_google_id
-                db_user = get_user_by_google_id(db, token_data['google_id'])
-                if db_user:
-                    update_user_tokens(db, db_user, creds.token, creds.refresh_token, creds.expiry, " ".join(creds.scopes))
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                return None
+    return service.users().messages().get(userId='me', id=message_id, format=format, **params)
+
+def iter_gmail_messages(service, message_ids: List[str], format: str = 'full', missing: Optional[List[str]] = None,
+                        first_batch_size: int = BATCH_SIZE, fields: Optional[str] = None):
+    """Fetch messages through Gmail batch requests, yielding each batch as it lands.
+
+    Messages come out in the order of message_ids. Those Gmail rate limits
+    are sent again in a smaller batch, with backoff, up to
+    GMAIL_BATCH_MAX_ATTEMPTS attempts. Those that still fail to load are
+    logged and skipped; ids Gmail reports as not found are also appended to
+    missing, if given. Batches start at first_batch_size and double up to
+    BATCH_SIZE, so a small first batch keeps time-to-first-message low.
+    fields is an optional partial-response mask (see message_fields_mask).
+    """
+    fetched = {}
+    throttled = {}
+
+    def on_response(request_id, response, exception):
+        if exception is None:
+            fetched[request_id] = response
+        elif is_rate_limited(exception):
+            throttled[request_id] = exception
+        elif missing is not None and isinstance(exception, HttpError) and exception.resp.status == 404:
+            missing.append(request_id)
         else:
-            print("No valid credentials or refresh token available.")
-            return None
-    return creds
+            logger.warning("Error fetching Gmail message %s: %s", request_id, exception)
+
+    start, size = 0, first_batch_size
+    while start < len(message_ids):
+        chunk = message_ids[start:start + size]
+        pending, attempt = chunk, 0
+        while pending:
+            attempt += 1
+            throttled.clear()
+            batch = service.new_batch_http_request(callback=on_response)
+            requests = [_message_get_request(service, message_id, format, fields) for message_id in pending]
+            for message_id, request in zip(pending, requests):
+                add_to_batch(batch, request, message_id)
+            execute_batch(batch, requests)
+            pending = [message_id for message_id in pending if message_id in throttled]
+            if pending and attempt >= settings.GMAIL_BATCH_MAX_ATTEMPTS:
+                logger.warning("Skipping %d Gmail messages still rate limited after %d attempts: %s",
+                               len(pending), attempt, ", ".join(pending))
+                break
+            if pending:
+                backoff(attempt, settings.GMAIL_BATCH_BACKOFF_SECONDS, throttled[pending[0]])
+        for message_id in chunk:
+            if message_id in fetched:
+                yield fetched.pop(message_id)
+        start += size
+        size = min(size * 2, BATCH_SIZE)
+
+def iter_parsed_messages(service, message_ids: List[str], format: str = 'full', fields: Optional[str] = None):
+    """Yield search results one by one as their batches are hydrated."""
+    for msg in iter_gmail_messages(service, message_ids, format, first_batch_size=STREAM_FIRST_BATCH_SIZE, fields=fields):
+        yield _parse_message(msg, include_body=format == 'full')
+
+def get_gmail_messages(service, message_ids: List[str], format: str = 'full', missing: Optional[List[str]] = None,
+                       fields: Optional[str] = None):
+    """Fetch messages through Gmail batch requests, in the order of message_ids."""
+    return list(iter_gmail_messages(service, message_ids, format, missing, fields=fields))
+
+def list_gmail_message_ids(service, query: str, max_results: int = 10, page_token: Optional[str] = None):
+    """Return one page of matching message ids and the token for the next page."""
+    results = service.users().messages().list(
+        userId='me', q=query, maxResults=max_results, pageToken=page_token
+    ).execute()
+    return [msg['id'] for msg in results.get('messages', [])], results.get('nextPageToken')
+
+def search_gmail_page(service, query: str, format: str = 'full', max_results: int = 10, page_token: Optional[str] = None,
+                      fields: Optional[str] = None):
+    """Search one page of the mailbox and hydrate the hits in batches.
 
-def get_gmail_service(creds: Credentials):
-    return build('gmail', 'v1', credentials=creds)
+    Returns (messages, next_page_token). With format='metadata' only headers
+    and snippet are fetched and the body is left empty; clients load it on
+    demand through get_gmail_message. Gmail errors propagate to the caller.
+    """
+    message_ids, next_page_token = list_gmail_message_ids(service, query, max_results, page_token)
+    messages = get_gmail_messages(service, message_ids, format, fields=fields)
+    return [_parse_message(msg, include_body=format == 'full') for msg in messages], next_page_token
 
-def search_gmail_messages(service, query: str):
+def search_gmail_messages(service, query: str, format: str = 'full', max_results: int = 10):
+    return search_gmail_page(service, query, format, max_results)[0]
+
+def get_gmail_message(service, message_id: str, format: str = 'full', fields: Optional[str] = None):
+    """Fetch and parse one message, or None if Gmail has no message with that id."""
     try:
-        results = service.users().messages().list(userId='me', q=query, maxResults=10).execute()
-        messages = results.get('messages', [])
-        parsed_messages = []
-        for msg in messages:
-            msg_details = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-            headers = msg_details['payload']['headers']
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-            date = next((h['value'] for h in headers if h['name'] == 'Date'), 'No Date')
-            snippet = msg_details.get('snippet', '')
-            body = ""
-            if 'parts' in msg_details['payload']:
-                for part in msg_details['payload']['parts']:
-                    if part['mimeType'] == 'text/plain' and 'body' in part and 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                        break
-            elif 'body' in msg_details['payload'] and 'data' in msg_details['payload']['body']:
-                body = base64.urlsafe_b64decode(msg_details['payload']['body']['data']).decode('utf-8')
-            parsed_messages.append({
-                'id': msg['id'],
-                'threadId': msg['threadId'],
-                'subject': subject,
-                'sender': sender,
-                'date': date,
-                'snippet': snippet,
-                'body': body
-            })
-        return parsed_messages
-    except Exception as e:
-        print(f"Error searching Gmail messages: {e}")
-        return []
+        msg_details = _message_get_request(service, message_id, format, fields).execute()
+    except HttpError as e:
+        if e.resp.status == 404:
+            return None
+        raise
+    return _parse_message(msg_details, include_body=format == 'full')
+
+def get_last_received_message_id(service) -> Optional[str]:
+    results = service.users().messages().list(userId='me', maxResults=1).execute()
+    messages = results.get('messages', [])
+    return messages[0]['id'] if messages else None
 
 def get_last_received_email(service):
     try:
-        results = service.users().messages().list(userId='me', maxResults=1).execute()
-        messages = results.get('messages', [])
-        if messages:
-            msg_id = messages[0]['id']
-            msg_details = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            headers = msg_details['payload']['headers']
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-            date = next((h['value'] for h in headers if h['name'] == 'Date'), 'No Date')
-            body = ""
-            if 'parts' in msg_details['payload']:
-                for part in msg_details['payload']['parts']:
-                    if part['mimeType'] == 'text/plain' and 'body' in part and 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                        break
-            elif 'body' in msg_details['payload'] and 'data' in msg_details['payload']['body']:
-                body = base64.urlsafe_b64decode(msg_details['payload']['body']['data']).decode('utf-8')
-            return {
-                'id': msg_id,
-                'threadId': msg_details['threadId'],
-                'subject': subject,
-                'sender': sender,
-                'date': date,
-                'snippet': msg_details.get('snippet', ''),
-                'body': body
-            }
+        message_id = get_last_received_message_id(service)
+        if message_id:
+            return get_gmail_message(service, message_id)
         return None
     except Exception as e:
         print(f"Error getting last email: {e}")
         return None
 
+def build_message_body(sender_email: str, to_email: str, subject: str, message_text: str,
+                       thread_id: Optional[str] = None, message_id: Optional[str] = None) -> dict:
+    """Build the users.messages.send request body for a plain text message."""
+    message = MIMEText(message_text)
+    message['to'] = to_email
+    message['from'] = sender_email
+    message['subject'] = subject
+    if message_id:
+        message['Message-ID'] = message_id
+    if thread_id:
+        message['In-Reply-To'] = f"<{thread_id}@mail.gmail.com>"
+        message['References'] = f"<{thread_id}@mail.gmail.com>"
+    body = {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
+    if thread_id:
+        body['threadId'] = thread_id
+    return body
+
 def send_gmail_message(service, sender_email: str, to_email: str, subject: str, message_text: str, thread_id: Optional[str] = None):
     try:
-        message = MIMEText(message_text)
-        message['to'] = to_email
-        message['from'] = sender_email
-        message['subject'] = subject
-        if thread_id:
-            message['In-Reply-To'] = f"<{thread_id}@mail.gmail.com>"
-            message['References'] = f"<{thread_id}@mail.gmail.com>"
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        body = {'raw': raw_message}
-        if thread_id:
-            body['threadId'] = thread_id
+        body = build_message_body(sender_email, to_email, subject, message_text, thread_id)
         send_message = service.users().messages().send(userId='me', body=body).execute()
         return send_message
     except Exception as e:
         print(f"Error sending Gmail message: {e}")
-        return None 
\ No newline at end of file
+        return None 
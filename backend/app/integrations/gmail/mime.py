@@ -0,0 +1,142 @@
+import base64
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+from app.core.config import settings
+
+TRUNCATION_MARKER = "\n[... message truncated]"
+
+# Base64 characters decoded at a time; a multiple of 4 so each chunk decodes on its own
+_CHUNK_CHARS = 64 * 1024
+_SKIPPED_HTML_TAGS = {'script', 'style', 'head', 'title'}
+_BLOCK_HTML_TAGS = {'br', 'p', 'div', 'tr', 'li', 'table', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+_WHITESPACE = re.compile(r'\s+')
+
+class _TextSink:
+    """Collects decoded text until max_bytes of UTF-8 have been written."""
+
+    def __init__(self, max_bytes: int):
+        self.parts = []
+        self.remaining = max_bytes
+        self.truncated = False
+
+    def write(self, text: str):
+        if self.truncated or not text:
+            return
+        encoded = text.encode('utf-8')
+        if len(encoded) > self.remaining:
+            self.parts.append(encoded[:self.remaining].decode('utf-8', 'ignore'))
+            self.remaining = 0
+            self.truncated = True
+            return
+        self.parts.append(text)
+        self.remaining -= len(encoded)
+
+    def getvalue(self) -> str:
+        return "".join(self.parts) + (TRUNCATION_MARKER if self.truncated else "")
+
+class _HTMLTextExtractor(HTMLParser):
+    """Writes the visible text of an HTML document to a _TextSink."""
+
+    def __init__(self, sink: _TextSink):
+        super().__init__(convert_charrefs=True)
+        self.sink = sink
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_HTML_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_HTML_TAGS:
+            self.sink.write("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_HTML_TAGS:
+            self.sink.write("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_HTML_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_HTML_TAGS:
+            self.sink.write("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.sink.write(_WHITESPACE.sub(' ', data))
+
+def _get_header(part, name: str) -> str:
+    name = name.lower()
+    return next((h['value'] for h in part.get('headers', []) if h['name'].lower() == name), "")
+
+def _charset(part) -> str:
+    for param in _get_header(part, 'Content-Type').split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'charset':
+            charset = value.strip('"\' ')
+            try:
+                return codecs.lookup(charset).name
+            except LookupError:
+                break
+    return 'utf-8'
+
+def _is_attachment(part) -> bool:
+    if part.get('filename') or 'attachmentId' in part.get('body', {}):
+        return True
+    return _get_header(part, 'Content-Disposition').lower().startswith('attachment')
+
+def _iter_leaf_parts(part):
+    """Yield the non-multipart parts of a payload depth-first, skipping attachments."""
+    if _is_attachment(part):
+        return
+    children = part.get('parts')
+    if children:
+        for child in children:
+            yield from _iter_leaf_parts(child)
+    else:
+        yield part
+
+def _decode_part(part, sink: _TextSink, html: bool):
+    # Decode chunk by chunk so a huge body never exists in memory as a whole
+    data = part['body']['data']
+    decoder = codecs.getincrementaldecoder(_charset(part))(errors='replace')
+    parser = _HTMLTextExtractor(sink) if html else None
+    for start in range(0, len(data), _CHUNK_CHARS):
+        chunk = data[start:start + _CHUNK_CHARS]
+        raw = base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+        text = decoder.decode(raw, final=start + _CHUNK_CHARS >= len(data))
+        if parser is not None:
+            parser.feed(text)
+        else:
+            sink.write(text)
+        if sink.truncated:
+            return
+    if parser is not None:
+        parser.close()
+
+def extract_body(payload, max_bytes: Optional[int] = None) -> str:
+    """Return the readable body of a Gmail message payload.
+
+    Walks nested multipart parts, preferring the first text/plain part and
+    falling back to the text of the first text/html part. Attachments are
+    never decoded. Bodies longer than max_bytes (MAIL_BODY_MAX_BYTES by
+    default) are cut there and end with TRUNCATION_MARKER.
+    """
+    if max_bytes is None:
+        max_bytes = settings.MAIL_BODY_MAX_BYTES
+    html_part = None
+    for part in _iter_leaf_parts(payload):
+        if 'data' not in part.get('body', {}):
+            continue
+        mime_type = part.get('mimeType', '').lower()
+        if mime_type == 'text/plain':
+            sink = _TextSink(max_bytes)
+            _decode_part(part, sink, html=False)
+            return sink.getvalue()
+        if mime_type == 'text/html' and html_part is None:
+            html_part = part
+    if html_part is None:
+        return ""
+    sink = _TextSink(max_bytes)
+    _decode_part(html_part, sink, html=True)
+    return sink.getvalue().strip()
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import shlex
+import threading
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.crud.mail import (
+    delete_messages, get_latest_message, get_message_ids, get_sync_state, get_user_ids_with_messages,
+    replace_mailbox, save_sync_state, search_messages, update_message_labels, upsert_messages
+)
+from app.crud.user import get_user
+from app.database.connection import SessionLocal
+from app.services.credentials import get_user_credentials, user_to_token_data
+from app.services.event_stream import publish_event
+from app.services.executor import run_blocking
+from .google_auth import _parse_message, get_gmail_messages, get_gmail_service
+from .search_index import is_search_index_available, optimize_search_index, search_index
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+# Partial responses with just what _to_row and the label check read
+MIRRORED_MESSAGE_FIELDS = 'id,threadId,labelIds,snippet,internalDate,payload'
+VERIFIED_MESSAGE_FIELDS = 'id,labelIds'
+
+# Query operators the local store can answer, mapped to system label ids
+LABEL_OPERATORS = {
+    'in': {'inbox': 'INBOX', 'sent': 'SENT', 'drafts': 'DRAFT', 'spam': 'SPAM', 'trash': 'TRASH'},
+    'is': {'unread': 'UNREAD', 'starred': 'STARRED', 'important': 'IMPORTANT'},
+}
+
+# One sync at a time per user; concurrent callers wait and then see fresh state
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+def _sync_lock(user_id: int) -> threading.Lock:
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(user_id, threading.Lock())
+
+def _to_row(msg_details) -> dict:
+    parsed = _parse_message(msg_details)
+    return {
+        'message_id': parsed['id'],
+        'thread_id': parsed['threadId'],
+        'subject': parsed['subject'],
+        'sender': parsed['sender'],
+        'date': parsed['date'],
+        'snippet': parsed['snippet'],
+        'body': parsed['body'],
+        'label_ids': " ".join(msg_details.get('labelIds', [])),
+        'internal_date': int(msg_details.get('internalDate', 0)),
+    }
+
+def _to_email(db_message, include_body: bool = True) -> dict:
+    return {
+        'id': db_message.message_id,
+        'threadId': db_message.thread_id,
+        'subject': db_message.subject,
+        'sender': db_message.sender,
+        'date': db_message.date,
+        'snippet': db_message.snippet or "",
+        'body': (db_message.body or "") if include_body else ""
+    }
+
+def _message_summary(row: dict) -> dict:
+    return {
+        'id': row['message_id'],
+        'threadId': row['thread_id'],
+        'subject': row['subject'],
+        'sender': row['sender'],
+        'date': row['date'],
+        'snippet': row['snippet'] or "",
+        'labelIds': row['label_ids'].split(),
+    }
+
+def _full_sync(service, db, user_id: int):
+    # Read the history id first so changes made while listing are replayed next time
+    history_id = service.users().getProfile(userId='me').execute()['historyId']
+    message_ids = []
+    page_token = None
+    while len(message_ids) < settings.MAIL_MIRROR_INITIAL_SYNC_SIZE:
+        results = service.users().messages().list(
+            userId='me',
+            maxResults=min(500, settings.MAIL_MIRROR_INITIAL_SYNC_SIZE - len(message_ids)),
+            pageToken=page_token
+        ).execute()
+        message_ids += [msg['id'] for msg in results.get('messages', [])]
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    # Mail arriving while listing shifts pages, so an id can be listed twice
+    messages = get_gmail_messages(service, list(dict.fromkeys(message_ids)), fields=MIRRORED_MESSAGE_FIELDS)
+    rows = [_to_row(msg) for msg in messages]
+    # Listing stopped early if Gmail still had a next page
+    complete = page_token is None
+    oldest_internal_date = None if complete or not rows else min(row['internal_date'] for row in rows)
+    # Everything is fetched before the stored mailbox is touched
+    replace_mailbox(db, user_id, rows, history_id, complete, oldest_internal_date)
+    publish_event(user_id, 'mail', {'resynced': True})
+
+def _incremental_sync(service, db, user_id: int, start_history_id: str):
+    added, deleted, labels = set(), set(), {}
+    history_id = start_history_id
+    page_token = None
+    while True:
+        results = service.users().history().list(
+            userId='me',
+            startHistoryId=start_history_id,
+            historyTypes=HISTORY_TYPES,
+            pageToken=page_token
+        ).execute()
+        for record in results.get('history', []):
+            for item in record.get('messagesAdded', []):
+                added.add(item['message']['id'])
+                deleted.discard(item['message']['id'])
+            for item in record.get('messagesDeleted', []):
+                deleted.add(item['message']['id'])
+                added.discard(item['message']['id'])
+                labels.pop(item['message']['id'], None)
+            for item in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                # The embedded message carries its full label set after the change
+                labels[item['message']['id']] = item['message'].get('labelIds', [])
+        history_id = results.get('historyId', history_id)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    messages = get_gmail_messages(service, sorted(added), fields=MIRRORED_MESSAGE_FIELDS)
+    rows = [_to_row(msg) for msg in messages]
+    upsert_messages(db, user_id, rows)
+    for msg in messages:
+        labels.pop(msg['id'], None)
+    update_message_labels(db, user_id, labels)
+    delete_messages(db, user_id, sorted(deleted))
+    save_sync_state(db, user_id, history_id)
+    if rows or deleted or labels:
+        publish_event(user_id, 'mail', {
+            'added': [_message_summary(row) for row in rows],
+            'deleted': sorted(deleted),
+            'labels': labels,
+        })
+
+def sync_mailbox(service, db, user_id: int, max_age: timedelta = timedelta(0)):
+    """Bring the user's mirror up to date unless it was synced within max_age.
+
+    The first sync copies the newest MAIL_MIRROR_INITIAL_SYNC_SIZE messages;
+    later ones replay users.history.list from the stored historyId.
+    """
+    with _sync_lock(user_id):
+        state = get_sync_state(db, user_id)
+        if state is not None and state.last_synced_at and datetime.utcnow() - state.last_synced_at <= max_age:
+            return
+        # Mirrors synced before their coverage was recorded start over once
+        if state is None or not state.history_id or state.complete is None:
+            _full_sync(service, db, user_id)
+            return
+        try:
+            _incremental_sync(service, db, user_id, state.history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # Gmail keeps history for about a week; past that, start over
+            _full_sync(service, db, user_id)
+
+def _ensure_fresh(service, db, user_id: int):
+    sync_mailbox(service, db, user_id, timedelta(seconds=settings.MAIL_MIRROR_MAX_STALENESS_SECONDS))
+
+def parse_search_query(query: str):
+    """Split a Gmail query into (terms, senders, subjects, labels).
+
+    Returns None for queries using operators the mirror cannot evaluate, so
+    the caller can fall back to Gmail.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        return None
+    terms, senders, subjects, labels = [], [], [], []
+    for token in tokens:
+        name, sep, value = token.partition(':')
+        name = name.lower()
+        if sep and name == 'from' and value:
+            senders.append(value)
+        elif sep and name == 'subject' and value:
+            subjects.append(value)
+        elif sep and value.lower() in LABEL_OPERATORS.get(name, {}):
+            labels.append(LABEL_OPERATORS[name][value.lower()])
+        elif sep or token.startswith('-') or token in ('OR', 'AND') or any(c in token for c in '(){}'):
+            return None
+        else:
+            terms.append(token)
+    return terms, senders, subjects, labels
+
+def search_local_mailbox(db, user_id: int, query: str, format: str = 'full', max_results: int = 10, offset: int = 0) -> Optional[List[dict]]:
+    """Search the locally stored messages without calling Gmail.
+
+    Uses the FTS5 index (ranked) when available and LIKE matching otherwise;
+    returns None if the query uses operators the local store cannot evaluate.
+    """
+    parsed = parse_search_query(query)
+    if parsed is None:
+        return None
+    terms, senders, subjects, labels = parsed
+    if is_search_index_available() and parsed != ([], [], [], []):
+        messages = search_index(db, user_id, terms, senders, subjects, labels, max_results, offset)
+    else:
+        messages = search_messages(db, user_id, terms, senders, subjects, labels, max_results, offset)
+    return [_to_email(msg, include_body=format == 'full') for msg in messages]
+
+def search_mailbox(service, db, user_id: int, query: str, format: str = 'full', max_results: int = 10,
+                   offset: int = 0) -> Optional[Tuple[List[dict], Optional[int]]]:
+    """Answer a search from the mirror, or return None if it cannot.
+
+    Returns the page and the time, in seconds since the epoch, before which
+    more matches may exist only in Gmail; that is None when the mirror holds
+    the whole mailbox. A short first page from a partial mirror returns None,
+    so Gmail answers the whole search.
+    """
+    if parse_search_query(query) is None:
+        return None
+    try:
+        _ensure_fresh(service, db, user_id)
+        messages = search_local_mailbox(db, user_id, query, format, max_results, offset)
+        state = get_sync_state(db, user_id)
+        if state.complete:
+            return messages, None
+        if len(messages) < max_results and (offset == 0 or state.oldest_internal_date is None):
+            return None
+        return messages, state.oldest_internal_date // 1000
+    except Exception as e:
+        print(f"Error searching mailbox mirror: {e}")
+        return None
+
+def get_last_received_from_mailbox(service, db, user_id: int) -> Optional[dict]:
+    """Return the newest mirrored message, or None if the mirror cannot answer."""
+    try:
+        _ensure_fresh(service, db, user_id)
+        message = get_latest_message(db, user_id)
+        return _to_email(message) if message is not None else None
+    except Exception as e:
+        print(f"Error reading mailbox mirror: {e}")
+        return None
+
+def _internal_date(date: str) -> Optional[int]:
+    try:
+        return int(parsedate_to_datetime(date).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def remember_messages(db, user_id: int, emails: List[dict]):
+    """Store messages fetched live from Gmail so local search can find them.
+
+    Bodies of metadata-only results, and labels of results fetched
+    without them, are left as they are.
+    """
+    upsert_messages(db, user_id, [{
+        'message_id': email['id'],
+        'thread_id': email['threadId'],
+        'subject': email['subject'],
+        'sender': email['sender'],
+        'date': email['date'],
+        'snippet': email['snippet'],
+        'body': email['body'] or None,
+        'label_ids': " ".join(email['labelIds']) if email.get('labelIds') is not None else None,
+        'internal_date': _internal_date(email['date']),
+    } for email in emails if email])
+
+def _verify_stored_messages(service, db, user_id: int):
+    # Without a mirror there is no history to replay, so re-check the stored
+    # messages directly; format=minimal returns just ids and labels
+    missing = []
+    messages = get_gmail_messages(
+        service, get_message_ids(db, user_id), format='minimal', missing=missing, fields=VERIFIED_MESSAGE_FIELDS
+    )
+    update_message_labels(db, user_id, {msg['id']: msg.get('labelIds', []) for msg in messages})
+    delete_messages(db, user_id, missing)
+
+def maintain_stored_mail():
+    """Apply upstream deletions and label changes to stored mail, then compact the index.
+
+    Mirrored mailboxes replay their Gmail history; other users' stored
+    messages are re-checked in batches. The FTS triggers carry every
+    resulting change into the search index. A user whose mail cannot be
+    maintained is logged and skipped.
+    """
+    db = SessionLocal()
+    try:
+        for user_id in get_user_ids_with_messages(db):
+            try:
+                user = get_user(db, user_id)
+                creds = get_user_credentials(user_to_token_data(user), db) if user else None
+                if not creds:
+                    continue
+                service = get_gmail_service(creds)
+                if get_sync_state(db, user_id) is not None:
+                    sync_mailbox(service, db, user_id)
+                else:
+                    _verify_stored_messages(service, db, user_id)
+            except Exception:
+                # Leave the session usable for the next user
+                db.rollback()
+                logger.exception("Error maintaining stored mail for user %s", user_id)
+    finally:
+        db.close()
+    optimize_search_index()
+
+async def run_search_index_maintenance():
+    """Background task running maintain_stored_mail periodically."""
+    while True:
+        await asyncio.sleep(settings.SEARCH_INDEX_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            await run_blocking(maintain_stored_mail)
+        except Exception as e:
+            print(f"Error in search index maintenance: {e}")
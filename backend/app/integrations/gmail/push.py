@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import binascii
+import hmac
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.crud.mail import get_mirrored_user_ids, get_sync_state
+from app.crud.push_channel import get_push_channel, save_push_channel
+from app.crud.user import get_user, get_user_by_email
+from app.database.connection import SessionLocal
+from app.services.credentials import get_user_credentials, user_to_token_data
+from app.services.executor import run_blocking, submit_blocking
+from app.services.google_certs import verify_signed_jwt
+from .google_auth import SCOPES, get_gmail_service
+from .mirror import sync_mailbox
+
+router = APIRouter()
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+def watch_mailbox(db, user_id: int):
+    """Start or renew the Gmail watch publishing the user's mailbox changes to GMAIL_PUBSUB_TOPIC."""
+    user = get_user(db, user_id)
+    creds = get_user_credentials(user_to_token_data(user), db, SCOPES) if user else None
+    if not creds:
+        return None
+    # Calling watch again replaces the existing watch, so renewal needs no stop
+    result = get_gmail_service(creds).users().watch(
+        userId='me', body={'topicName': settings.GMAIL_PUBSUB_TOPIC}
+    ).execute()
+    expiration = datetime.utcfromtimestamp(int(result['expiration']) / 1000)
+    return save_push_channel(db, user_id, 'gmail', expiration, history_id=str(result['historyId']))
+
+def refresh_mailbox(email_address: str, history_id: Optional[str]):
+    """Replay the user's Gmail history into their mirror after a notification."""
+    db = SessionLocal()
+    try:
+        user = get_user_by_email(db, email_address)
+        if user is None or get_push_channel(db, user.id, 'gmail') is None:
+            return
+        state = get_sync_state(db, user.id)
+        if state is None:
+            return
+        if history_id and state.history_id and int(state.history_id) >= int(history_id):
+            # An earlier notification's sync already covered this change
+            return
+        creds = get_user_credentials(user_to_token_data(user), db, SCOPES)
+        if creds:
+            sync_mailbox(get_gmail_service(creds), db, user.id)
+    except Exception as e:
+        print(f"Error handling Gmail notification for {email_address}: {e}")
+    finally:
+        db.close()
+
+def renew_mailbox_watches():
+    """Watch every mirrored mailbox, renewing watches that expire within the margin."""
+    renew_before = datetime.utcnow() + timedelta(seconds=settings.PUSH_CHANNEL_RENEW_MARGIN_SECONDS)
+    db = SessionLocal()
+    try:
+        for user_id in get_mirrored_user_ids(db):
+            channel = get_push_channel(db, user_id, 'gmail')
+            if channel is not None and channel.expiration > renew_before:
+                continue
+            try:
+                watch_mailbox(db, user_id)
+            except HttpError as e:
+                print(f"Error renewing Gmail watch for user {user_id}: {e}")
+    finally:
+        db.close()
+
+async def run_mailbox_watch_renewal():
+    """Background task keeping Gmail watches ahead of their seven-day expiry."""
+    while True:
+        try:
+            await run_blocking(renew_mailbox_watches)
+        except Exception as e:
+            print(f"Error in Gmail watch renewal: {e}")
+        await asyncio.sleep(settings.PUSH_CHANNEL_RENEW_INTERVAL_SECONDS)
+
+def verify_pubsub_token(bearer_token: str):
+    """Check the OIDC token Pub/Sub signs push requests with (blocking)."""
+    claims = verify_signed_jwt(bearer_token, settings.GOOGLE_OIDC_CERTS_URL, settings.GMAIL_PUBSUB_AUDIENCE)
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Push token has issuer {claims.get('iss')}")
+    if not claims.get("email_verified") or claims.get("email") != settings.GMAIL_PUBSUB_SERVICE_ACCOUNT:
+        raise ValueError(f"Push token is for {claims.get('email')}")
+
+async def _authorize_push(token: Optional[str], authorization: Optional[str]) -> bool:
+    # Fail closed: every configured check must pass, and at least one must be configured
+    if not settings.GMAIL_PUBSUB_VERIFICATION_TOKEN and not settings.GMAIL_PUBSUB_AUDIENCE:
+        return False
+    if settings.GMAIL_PUBSUB_VERIFICATION_TOKEN and not hmac.compare_digest(
+        token or "", settings.GMAIL_PUBSUB_VERIFICATION_TOKEN
+    ):
+        return False
+    if settings.GMAIL_PUBSUB_AUDIENCE:
+        scheme, _, bearer_token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not bearer_token:
+            return False
+        try:
+            await run_blocking(verify_pubsub_token, bearer_token)
+        except Exception as e:
+            print(f"Rejected Gmail push token: {e}")
+            return False
+    return True
+
+@router.post("", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_gmail_notification(request: Request, token: Optional[str] = None,
+                                     authorization: Optional[str] = Header(None)):
+    """Pub/Sub push endpoint for Gmail watch notifications.
+
+    The message data is base64 JSON with emailAddress and historyId. The
+    sync runs in the background so Pub/Sub gets its acknowledgement at once.
+    """
+    if not await _authorize_push(token, authorization):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid verification token.")
+    try:
+        envelope = await request.json()
+        data = json.loads(base64.b64decode(envelope['message']['data']))
+        email_address = data['emailAddress']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        # A 4xx makes Pub/Sub redeliver, which cannot help a malformed message
+        print("Ignoring malformed Gmail push notification")
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    history_id = data.get('historyId')
+    submit_blocking(refresh_mailbox, email_address, str(history_id) if history_id else None)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,95 @@
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, OperationalError
+
+from app.database.connection import engine
+from app.models.mail import MailMessage
+
+# External-content FTS5 table over mail_messages; the triggers keep it in step
+# with every insert, update (e.g. label changes) and delete on that table
+_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS mail_fts USING fts5(
+        subject, sender, body, label_ids,
+        content='mail_messages', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS mail_fts_ai AFTER INSERT ON mail_messages BEGIN
+        INSERT INTO mail_fts(rowid, subject, sender, body, label_ids)
+        VALUES (new.id, new.subject, new.sender, new.body, new.label_ids);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mail_fts_ad AFTER DELETE ON mail_messages BEGIN
+        INSERT INTO mail_fts(mail_fts, rowid, subject, sender, body, label_ids)
+        VALUES ('delete', old.id, old.subject, old.sender, old.body, old.label_ids);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mail_fts_au AFTER UPDATE ON mail_messages BEGIN
+        INSERT INTO mail_fts(mail_fts, rowid, subject, sender, body, label_ids)
+        VALUES ('delete', old.id, old.subject, old.sender, old.body, old.label_ids);
+        INSERT INTO mail_fts(rowid, subject, sender, body, label_ids)
+        VALUES (new.id, new.subject, new.sender, new.body, new.label_ids);
+    END""",
+]
+
+# Column weights for bm25(): subject, sender, body, label_ids
+_RANKING = "bm25(mail_fts, 10.0, 5.0, 1.0, 0.0)"
+
+_available = False
+
+def create_search_index() -> bool:
+    """Create the FTS5 index and its triggers; returns False if unsupported."""
+    global _available
+    if engine.dialect.name != 'sqlite':
+        print("Full-text search index requires SQLite; falling back to LIKE search.")
+        return False
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'mail_fts'")).first()
+            for statement in _DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index messages stored before the index existed
+                conn.execute(text("INSERT INTO mail_fts(mail_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"SQLite FTS5 unavailable, falling back to LIKE search: {e}")
+        return False
+    _available = True
+    return True
+
+def is_search_index_available() -> bool:
+    return _available
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+def build_match_expression(terms: List[str], senders: List[str], subjects: List[str], labels: List[str]) -> str:
+    clauses = [f"{{subject sender body}} : {_quote(term)}" for term in terms]
+    clauses += [f"sender : {_quote(sender)}" for sender in senders]
+    clauses += [f"subject : {_quote(subject)}" for subject in subjects]
+    clauses += [f"label_ids : {_quote(label)}" for label in labels]
+    return " AND ".join(clauses)
+
+def search_index(db, user_id: int, terms: List[str], senders: List[str], subjects: List[str], labels: List[str], limit: int, offset: int = 0):
+    """Return the user's best matching messages, ranked by bm25."""
+    statement = text(
+        "SELECT mail_messages.* FROM mail_fts "
+        "JOIN mail_messages ON mail_messages.id = mail_fts.rowid "
+        "WHERE mail_fts MATCH :expression AND mail_messages.user_id = :user_id "
+        f"ORDER BY {_RANKING} LIMIT :limit OFFSET :offset"
+    ).bindparams(
+        expression=build_match_expression(terms, senders, subjects, labels),
+        user_id=user_id,
+        limit=limit,
+        offset=offset
+    )
+    return db.query(MailMessage).from_statement(statement).all()
+
+def optimize_search_index():
+    """Rebuild the index if it drifted from mail_messages, then merge its segments."""
+    if not _available:
+        return
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("INSERT INTO mail_fts(mail_fts) VALUES ('integrity-check')"))
+        except DatabaseError as e:
+            print(f"Search index out of date, rebuilding: {e}")
+            conn.execute(text("INSERT INTO mail_fts(mail_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO mail_fts(mail_fts) VALUES ('optimize')"))
@@ -0,0 +1,140 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from email.utils import make_msgid
+from typing import List, Optional
+from uuid import uuid4
+
+from googleapiclient.errors import HttpError
+
+from app.core.config import settings
+from app.crud.outbound_mail import (
+    claim_outbound_mail, enqueue_outbound_mail, mark_outbound_mail_failed,
+    mark_outbound_mail_sent, retry_outbound_mail
+)
+from app.crud.user import get_user
+from app.database.connection import SessionLocal
+from app.services.credentials import get_user_credentials, user_to_token_data
+from app.services.executor import run_blocking
+from app.services.google_client import is_rate_limited, network_errors
+from .google_auth import SCOPES, build_message_body, get_gmail_service
+
+# Gmail answers these when it is briefly unavailable; throttling is told apart by is_rate_limited
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+# Set whenever jobs are queued so idle workers start without waiting for the next poll
+_wakeup: Optional[asyncio.Event] = None
+
+def queue_messages(db, user, messages: List[dict]):
+    """Queue outgoing messages for a user and return their jobs.
+
+    Each message may carry an idempotency_key; a key that was queued before
+    returns the original job instead of queueing the message again.
+    """
+    domain = user.email.rpartition('@')[2] or None
+    return enqueue_outbound_mail(db, user.id, [{
+        'idempotency_key': msg.get('idempotency_key') or uuid4().hex,
+        'to_email': msg['to_email'],
+        'subject': msg['subject'],
+        'message_text': msg['message_text'],
+        'thread_id': msg.get('thread_id'),
+        'rfc822_message_id': make_msgid(domain=domain),
+    } for msg in messages])
+
+def notify_send_queue():
+    if _wakeup is not None:
+        _wakeup.set()
+
+def _backoff(attempts: int, retry_after: Optional[float] = None) -> float:
+    # Exponential with jitter, so a burst of throttled jobs does not retry in lockstep
+    delay = min(settings.SEND_QUEUE_BACKOFF_MAX_SECONDS, settings.SEND_QUEUE_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return max(random.uniform(delay / 2, delay), retry_after or 0)
+
+def _retry_after(error: HttpError) -> Optional[float]:
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _retry_or_fail(db, job, error: str, retry_after: Optional[float] = None):
+    if job.attempts >= settings.SEND_QUEUE_MAX_ATTEMPTS:
+        mark_outbound_mail_failed(db, job, error)
+        return
+    next_attempt_at = datetime.utcnow() + timedelta(seconds=_backoff(job.attempts, retry_after))
+    retry_outbound_mail(db, job, error, next_attempt_at)
+
+def _find_delivered(service, job) -> Optional[str]:
+    # A failed or interrupted attempt may still have reached Gmail, so look for
+    # our Message-ID among sent mail before sending again
+    results = service.users().messages().list(
+        userId='me', q=f"in:sent rfc822msgid:{job.rfc822_message_id.strip('<>')}", maxResults=1
+    ).execute()
+    messages = results.get('messages', [])
+    return messages[0]['id'] if messages else None
+
+def deliver(db, job):
+    """Send one claimed job and record the outcome on it."""
+    user = get_user(db, job.user_id)
+    if user is None:
+        mark_outbound_mail_failed(db, job, "User no longer exists.")
+        return
+    creds = get_user_credentials(user_to_token_data(user), db, SCOPES)
+    if not creds:
+        _retry_or_fail(db, job, "Could not refresh Google credentials.")
+        return
+    try:
+        service = get_gmail_service(creds)
+        gmail_message_id = _find_delivered(service, job) if job.attempts > 1 else None
+        if gmail_message_id is None:
+            body = build_message_body(
+                user.email, job.to_email, job.subject, job.message_text, job.thread_id, job.rfc822_message_id
+            )
+            gmail_message_id = service.users().messages().send(userId='me', body=body).execute()['id']
+        mark_outbound_mail_sent(db, job, gmail_message_id)
+    except HttpError as e:
+        if e.resp.status in RETRYABLE_STATUSES or is_rate_limited(e):
+            _retry_or_fail(db, job, str(e), _retry_after(e))
+        else:
+            mark_outbound_mail_failed(db, job, str(e))
+    except network_errors() as e:
+        _retry_or_fail(db, job, f"Network error: {e}")
+
+def process_next_job() -> bool:
+    """Claim and deliver one due job; returns False if none was due."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        job = claim_outbound_mail(
+            db, now, now - timedelta(seconds=settings.SEND_QUEUE_LEASE_SECONDS), settings.SEND_QUEUE_MAX_ATTEMPTS
+        )
+        if job is None:
+            return False
+        try:
+            deliver(db, job)
+        except Exception as e:
+            # Retried with backoff like a transient error instead of sitting in "sending" until its lease lapses
+            db.rollback()
+            print(f"Error delivering send job {job.id}: {e}")
+            _retry_or_fail(db, job, f"Unexpected error: {e}")
+        return True
+    finally:
+        db.close()
+
+async def _worker(wakeup: asyncio.Event):
+    while True:
+        wakeup.clear()
+        try:
+            while await run_blocking(process_next_job):
+                pass
+        except Exception as e:
+            print(f"Error in send queue worker: {e}")
+        try:
+            await asyncio.wait_for(wakeup.wait(), settings.SEND_QUEUE_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_send_queue():
+    """Background task running SEND_QUEUE_WORKERS delivery workers."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    await asyncio.gather(*(_worker(_wakeup) for _ in range(settings.SEND_QUEUE_WORKERS)))
@@ -1,17 +1,36 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database.connection import create_db_tables
+from fastapi.responses import ORJSONResponse
+from app.database.connection import create_db_tables, dispose_async_engine
 from app.core.config import settings
+from app.core.request_metrics import RequestMetricsMiddleware
+from app.services.executor import configure_threadpool, shutdown_executor
+from app.services.http_transport import close_http_client
+from app.services.shared_state import close_state
+from app.services.tracing import configure_tracing, shutdown_tracing
+from app.services.credentials import run_token_refresher
+from app.services.event_stream import run_event_delivery
+from app.integrations.gmail.mirror import run_search_index_maintenance
+from app.integrations.gmail.send_queue import run_send_queue
+from app.integrations.gmail.search_index import create_search_index
+from app.integrations.gmail.push import run_mailbox_watch_renewal
+from app.integrations.calendar.push import run_calendar_channel_renewal
 from app.integrations.gmail.api import router as gmail_api_router
 from app.integrations.gmail.auth import router as gmail_auth_router
+from app.integrations.gmail.push import router as gmail_push_router
 from app.integrations.calendar.api import router as calendar_api_router
 from app.integrations.calendar.auth import router as calendar_auth_router
+from app.integrations.calendar.push import router as calendar_push_router
 from app.api.auth import router as auth_router
+from app.api.metrics import router as metrics_router
+from app.api.events import router as events_router, run_event_stream_sync
 
 app = FastAPI(
     title="Gmail & Calendar Manager Backend MVP",
     description="FastAPI backend for managing Gmail and Calendar interactions.",
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 origins = [
@@ -25,17 +44,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Page-Token", "ETag"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(auth_router, prefix="/api/auth", tags=["Auth"])
 app.include_router(gmail_api_router, prefix="/integrations/gmail/api", tags=["Gmail API"])
 app.include_router(gmail_auth_router, prefix="/integrations/gmail/auth", tags=["Gmail Auth"])
 app.include_router(calendar_api_router, prefix="/integrations/calendar/api", tags=["Calendar API"])
 app.include_router(calendar_auth_router, prefix="/integrations/calendar/auth", tags=["Calendar Auth"])
+if settings.PUSH_NOTIFICATIONS_ENABLED:
+    # Unauthenticated webhooks; without push there is nothing for them to accept
+    app.include_router(gmail_push_router, prefix="/integrations/gmail/push", tags=["Push Notifications"])
+    app.include_router(calendar_push_router, prefix="/integrations/calendar/push", tags=["Push Notifications"])
+app.include_router(events_router, prefix="/api/events", tags=["Events"])
+app.include_router(metrics_router, tags=["Metrics"])
 
 @app.on_event("startup")
 def on_startup():
-    create_db_tables()
+    if settings.DATABASE_CREATE_TABLES:
+        create_db_tables()
+    if settings.SEARCH_INDEX_ENABLED:
+        create_search_index()
+    configure_threadpool()
+    configure_tracing()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.background_tasks = [
+        asyncio.create_task(run_token_refresher()),
+        asyncio.create_task(run_send_queue()),
+        asyncio.create_task(run_event_stream_sync()),
+        asyncio.create_task(run_event_delivery()),
+    ]
+    if settings.SEARCH_INDEX_ENABLED:
+        app.state.background_tasks.append(asyncio.create_task(run_search_index_maintenance()))
+    if settings.PUSH_NOTIFICATIONS_ENABLED:
+        if settings.GMAIL_PUBSUB_TOPIC:
+            app.state.background_tasks.append(asyncio.create_task(run_mailbox_watch_renewal()))
+        if settings.PUSH_WEBHOOK_BASE_URL:
+            app.state.background_tasks.append(asyncio.create_task(run_calendar_channel_renewal()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in app.state.background_tasks:
+        task.cancel()
+    await dispose_async_engine()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    shutdown_executor()
+    close_http_client()
+    close_state()
+    shutdown_tracing()
 
 @app.get("/")
 async def read_root():
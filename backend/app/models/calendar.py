@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from app.database.connection import Base
+
+# SQLAlchemy Models for the local calendar event cache
+class CalendarEvent(Base):
+    __tablename__ = "calendar_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event_id = Column(String, nullable=False)
+    summary = Column(String)
+    description = Column(Text)
+    start_time = Column(String) # As returned by Google (dateTime or all-day date)
+    end_time = Column(String)
+    start_at = Column(DateTime) # Naive UTC, for range queries
+    end_at = Column(DateTime)
+    attendees = Column(Text) # JSON list of attendee emails
+    html_link = Column(String)
+    updated = Column(String)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "event_id", name="uq_calendar_events_user_event"),
+        Index("ix_calendar_events_user_start_at", "user_id", "start_at"),
+    )
+
+class CalendarSyncState(Base):
+    __tablename__ = "calendar_sync_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    sync_token = Column(String)
+    last_synced_at = Column(DateTime)
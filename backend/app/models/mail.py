@@ -0,0 +1,34 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from app.database.connection import Base
+
+# SQLAlchemy Models for the local mailbox mirror
+class MailMessage(Base):
+    __tablename__ = "mail_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message_id = Column(String, nullable=False)
+    thread_id = Column(String)
+    subject = Column(String)
+    sender = Column(String)
+    date = Column(String)
+    snippet = Column(Text)
+    body = Column(Text)
+    label_ids = Column(String) # Space separated Gmail label ids
+    internal_date = Column(BigInteger) # Milliseconds since the epoch, as reported by Gmail
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "message_id", name="uq_mail_messages_user_message"),
+        Index("ix_mail_messages_user_internal_date", "user_id", "internal_date"),
+    )
+
+class MailSyncState(Base):
+    __tablename__ = "mail_sync_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    history_id = Column(String)
+    last_synced_at = Column(DateTime)
+    # Whether the initial sync copied the whole mailbox and, if not, the
+    # internalDate of the oldest message it copied; older mail is only in Gmail
+    complete = Column(Boolean)
+    oldest_internal_date = Column(BigInteger)
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from app.database.connection import Base
+
+# SQLAlchemy Model for the durable outbound mail queue
+class OutboundMail(Base):
+    __tablename__ = "outbound_mail"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    idempotency_key = Column(String, nullable=False)
+    to_email = Column(String, nullable=False)
+    subject = Column(String)
+    message_text = Column(Text)
+    thread_id = Column(String)
+    # Message-ID header we set, used to find out whether an interrupted attempt was delivered
+    rfc822_message_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued") # queued, sending, sent or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text)
+    gmail_message_id = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_outbound_mail_user_key"),
+        Index("ix_outbound_mail_status_next_attempt", "status", "next_attempt_at"),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from app.database.connection import Base
+
+# SQLAlchemy Model for Gmail watches and Calendar notification channels
+class PushChannel(Base):
+    __tablename__ = "push_channels"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False) # "gmail" or "calendar"
+    channel_id = Column(String, unique=True) # Calendar channel id; Gmail watches have none
+    resource_id = Column(String) # Calendar resource id, needed to stop the channel
+    token = Column(String) # Secret Calendar echoes back in X-Goog-Channel-Token
+    history_id = Column(String) # Gmail history id when the watch started
+    expiration = Column(DateTime, index=True) # Naive UTC
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "kind", name="uq_push_channels_user_kind"),
+    )
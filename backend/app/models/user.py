@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 # SQLAlchemy Model
 class User(Base):
@@ -14,6 +15,8 @@ class User(Base):
     access_token = Column(String)
     refresh_token = Column(String)
     token_expiry = Column(String)
+    # Same instant as token_expiry, as a naive UTC timestamp the refresher can range-scan
+    token_expires_at = Column(DateTime, index=True)
     scope = Column(String)
 
 # Pydantic Models for API (request/response)
@@ -33,6 +36,7 @@ class UserInDB(UserBase):
     access_token: str
     refresh_token: str
     token_expiry: str
+    token_expires_at: Optional[datetime] = None
     scope: str
 
     class Config:
@@ -43,4 +47,5 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 class TokenData(BaseModel):
-    email: Optional[str] = None 
\ No newline at end of file
+    email: Optional[str] = None
+    exp: Optional[int] = None # Expiry of the verified token, in seconds since the epoch 
\ No newline at end of file
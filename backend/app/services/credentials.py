@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List, Optional
+
+from app.core.config import settings
+from app.crud.user import get_user, get_users_with_expiring_tokens, parse_token_expiry, update_user_tokens
+from app.database.connection import SessionLocal
+from app.services.executor import run_blocking
+from app.services.http_transport import google_auth_request
+from app.services.metrics import Counter, Histogram
+from app.services.shared_state import get_state
+from app.services.tracing import span
+
+if TYPE_CHECKING:
+    # google.oauth2 loads cryptography; it is imported where credentials are built
+    from google.oauth2.credentials import Credentials
+
+TOKEN_REFRESHES = Counter(
+    "google_token_refreshes_total",
+    "Google token refreshes by outcome: refreshed, failed, or shared with a concurrent refresh.",
+    ("outcome",),
+)
+TOKEN_REFRESH_SECONDS = Histogram(
+    "google_token_refresh_duration_seconds",
+    "Latency of refreshing a Google access token, persisting it included.",
+)
+
+# A shared lock per user, "credentials:refresh:<id>", so concurrent refreshes
+# from any worker collapse into a single upstream call
+REFRESH_LOCK_PREFIX = "credentials:refresh:"
+# Most recently refreshed access token per user, "credentials:<id>" -> access token and
+# expiry, for callers that loaded the user row before another refresh was committed
+REFRESHED_PREFIX = "credentials:"
+# Refresh tokens Google answered with invalid_grant, "credentials:rejected:<id>" -> token hash;
+# they are not retried until the user signs in again with a new one or the entry lapses
+REJECTED_PREFIX = "credentials:rejected:"
+
+class RefreshTokenRejected(RuntimeError):
+    """The user's refresh token was revoked or has expired; they have to sign in again."""
+
+def _refresh_lock(user_id: int):
+    # The lease outlives the slowest refresh the pooled client allows
+    ttl = settings.GOOGLE_HTTP_CONNECT_TIMEOUT_SECONDS + settings.GOOGLE_HTTP_TIMEOUT_SECONDS
+    return get_state().lock(f"{REFRESH_LOCK_PREFIX}{user_id}", ttl)
+
+def _remember_refreshed(user_id: int, creds: 'Credentials'):
+    # The refresh token stays in the database only
+    get_state().set(f"{REFRESHED_PREFIX}{user_id}", {
+        'access_token': creds.token,
+        'token_expiry': creds.expiry.isoformat(),
+    }, (creds.expiry - datetime.utcnow()).total_seconds())
+
+def _latest_refreshed(user_data: dict, default_scopes: Optional[List[str]] = None) -> Optional['Credentials']:
+    """The user's credentials with the access token another refresh cached, if there is one."""
+    refreshed = get_state().get(f"{REFRESHED_PREFIX}{user_data['id']}")
+    if refreshed is None:
+        return None
+    return build_credentials({**user_data, **refreshed, 'token_expires_at': None}, default_scopes)
+
+def _token_hash(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+def _is_rejected(user_id: int, refresh_token: Optional[str]) -> bool:
+    return bool(refresh_token) and get_state().get(f"{REJECTED_PREFIX}{user_id}") == _token_hash(refresh_token)
+
+def _is_invalid_grant(error: Exception) -> bool:
+    from google.auth.exceptions import RefreshError
+    # RefreshError carries Google's decoded error response as its second argument
+    return (isinstance(error, RefreshError) and len(error.args) > 1
+            and isinstance(error.args[1], dict) and error.args[1].get('error') == 'invalid_grant')
+
+def _is_fresh(creds: 'Credentials', margin: timedelta = timedelta(0)) -> bool:
+    if not creds.valid:
+        return False
+    return creds.expiry is None or creds.expiry - margin > datetime.utcnow()
+
+def build_credentials(user_data: dict, default_scopes: Optional[List[str]] = None) -> 'Credentials':
+    from google.oauth2.credentials import Credentials
+    expiry = user_data.get('token_expires_at') or parse_token_expiry(user_data.get('token_expiry'))
+    # Refresh with the scopes the user actually granted at login
+    scopes = (user_data.get('scope') or "").split() or default_scopes
+    return Credentials(
+        token=user_data.get('access_token') or None,
+        refresh_token=user_data.get('refresh_token') or None,
+        token_uri=settings.GOOGLE_TOKEN_URI,
+        client_id=settings.GOOGLE_CLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET,
+        scopes=scopes,
+        expiry=expiry
+    )
+
+def user_to_token_data(user) -> dict:
+    return {
+        'id': user.id,
+        'access_token': user.access_token,
+        'refresh_token': user.refresh_token,
+        'token_expiry': user.token_expiry,
+        'token_expires_at': user.token_expires_at,
+        'scope': user.scope,
+    }
+
+def refresh_credentials(db, user_id: int, creds: 'Credentials', margin: timedelta = timedelta(0)) -> 'Credentials':
+    """Refresh and persist a user's credentials unless another thread just did.
+
+    Callers for the same user, in any worker, wait on one shared lock; whoever
+    gets it second finds the fresh token in the shared state and returns it
+    without calling Google. Raises RefreshTokenRejected, without calling
+    Google, once Google has answered the refresh token with invalid_grant.
+    """
+    with _refresh_lock(user_id):
+        token_data = {'id': user_id, 'refresh_token': creds.refresh_token, 'scope': " ".join(creds.scopes or [])}
+        latest = _latest_refreshed(token_data)
+        if latest is not None and _is_fresh(latest, margin):
+            TOKEN_REFRESHES.inc(outcome="shared")
+            return latest
+        if _is_rejected(user_id, creds.refresh_token):
+            raise RefreshTokenRejected(f"Refresh token for user {user_id} was rejected; sign in again")
+        with span("google token refresh", **{"user.id": user_id}):
+            start = time.perf_counter()
+            try:
+                creds.refresh(google_auth_request())
+                db_user = get_user(db, user_id)
+                if db_user:
+                    update_user_tokens(db, db_user, creds.token, creds.refresh_token, creds.expiry, " ".join(creds.scopes or []))
+            except Exception as e:
+                TOKEN_REFRESHES.inc(outcome="failed")
+                if _is_invalid_grant(e):
+                    get_state().set(f"{REJECTED_PREFIX}{user_id}", _token_hash(creds.refresh_token),
+                                    settings.TOKEN_REJECTED_RETRY_SECONDS)
+                raise
+            finally:
+                TOKEN_REFRESH_SECONDS.observe(time.perf_counter() - start)
+        TOKEN_REFRESHES.inc(outcome="refreshed")
+        _remember_refreshed(user_id, creds)
+        return creds
+
+def get_user_credentials(user_data: dict, db, default_scopes: Optional[List[str]] = None) -> Optional['Credentials']:
+    """Return valid Google credentials for a user, refreshing them only if expired."""
+    creds = build_credentials(user_data, default_scopes)
+    if _is_fresh(creds):
+        return creds
+    latest = _latest_refreshed(user_data, default_scopes)
+    if latest is not None and _is_fresh(latest):
+        return latest
+    if not creds.refresh_token:
+        print("No valid credentials or refresh token available.")
+        return None
+    if _is_rejected(user_data['id'], creds.refresh_token):
+        print(f"Refresh token for user {user_data['id']} was rejected; sign in again.")
+        return None
+    try:
+        return refresh_credentials(db, user_data['id'], creds)
+    except Exception as e:
+        print(f"Error refreshing token: {e}")
+        return None
+
+def get_stored_credentials(db, user_id: int, default_scopes: Optional[List[str]] = None) -> Optional['Credentials']:
+    """get_user_credentials for the tokens on the user's row; authenticated users carry none."""
+    user = get_user(db, user_id)
+    return get_user_credentials(user_to_token_data(user), db, default_scopes) if user else None
+
+def refresh_expiring_tokens():
+    """Refresh every token that expires within TOKEN_REFRESH_MARGIN_SECONDS.
+
+    Users whose refresh token Google rejected are skipped.
+    """
+    margin = timedelta(seconds=settings.TOKEN_REFRESH_MARGIN_SECONDS)
+    db = SessionLocal()
+    try:
+        for user in get_users_with_expiring_tokens(db, datetime.utcnow() + margin):
+            if _is_rejected(user.id, user.refresh_token):
+                continue
+            creds = build_credentials(user_to_token_data(user))
+            try:
+                refresh_credentials(db, user.id, creds, margin)
+            except Exception as e:
+                print(f"Error refreshing token for user {user.id}: {e}")
+    finally:
+        db.close()
+
+async def run_token_refresher():
+    """Background task keeping stored tokens ahead of expiry."""
+    while True:
+        try:
+            await run_blocking(refresh_expiring_tokens)
+        except Exception as e:
+            print(f"Error in token refresher: {e}")
+        await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL_SECONDS)
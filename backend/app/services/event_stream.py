@@ -0,0 +1,194 @@
+import asyncio
+import json
+import secrets
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.executor import run_blocking
+from app.services.shared_state import get_state
+
+# Events are kept in the shared state so a stream sees what any worker published:
+# "events:<user id>" is the sequence of the user's newest event and
+# "events:<user id>:<sequence>" holds each of the last EVENT_STREAM_HISTORY_SIZE
+EVENTS_PREFIX = "events:"
+# Event ids are "<epoch>-<sequence>". The epoch is created along with the event
+# log, so a client resuming after the log was lost (a restart with the memory
+# backend) is told to refetch instead of silently missing events
+EPOCH_KEY = f"{EVENTS_PREFIX}epoch"
+# A publisher that died mid-append holds up the user's log at most this long
+PUBLISH_LOCK_SECONDS = 10.0
+
+def _epoch(state) -> str:
+    epoch = state.get(EPOCH_KEY)
+    if epoch is None:
+        with state.lock(EPOCH_KEY, PUBLISH_LOCK_SECONDS):
+            epoch = state.get(EPOCH_KEY)
+            if epoch is None:
+                epoch = secrets.token_hex(4)
+                state.set(EPOCH_KEY, epoch)
+    return epoch
+
+class Subscriber:
+    """One open stream: a bounded queue filled by its process's delivery task."""
+
+    def __init__(self, user_id: int, sequence: int):
+        self.user_id = user_id
+        # Sequence of the last event handed to this stream
+        self.sequence = sequence
+        self.queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        # Set when the client fell too far behind; the stream then ends so the
+        # client reconnects and resumes from its Last-Event-ID
+        self.overflowed = False
+
+    def _deliver(self, event: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+            self.sequence = event['sequence']
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class EventBroker:
+    """Per-user fan-out of change events to open streams in every worker.
+
+    publish is callable from any thread of any worker: it appends the event
+    to the user's log in the shared state. Each process's run_delivery task
+    reads the logs of users with streams open in that process, right after
+    a local publish or subscribe and every EVENT_STREAM_POLL_SECONDS for
+    other workers' events, and hands new events to the streams in order.
+    """
+
+    def __init__(self, history_size: int):
+        self.history_size = history_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+
+    def _wake(self):
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # The delivery task's loop has shut down
+                pass
+
+    def publish(self, user_id: int, event_type: str, data: dict) -> dict:
+        state = get_state()
+        key = f"{EVENTS_PREFIX}{user_id}"
+        with state.lock(key, PUBLISH_LOCK_SECONDS):
+            sequence = (state.get(key) or 0) + 1
+            event = {
+                'id': f"{_epoch(state)}-{sequence}",
+                'sequence': sequence,
+                'event': event_type,
+                'data': json.dumps(data, separators=(',', ':'), default=str),
+            }
+            # The event is stored before the sequence moves, so readers never see a gap
+            state.set(f"{key}:{sequence}", event)
+            state.set(key, sequence)
+            state.delete(f"{key}:{sequence - self.history_size}")
+        self._wake()
+        return event
+
+    def subscribe(self, user_id: int, last_event_id: Optional[str] = None) -> Tuple[Subscriber, bool]:
+        """Open a stream; this reads the shared state, so call it through run_blocking.
+
+        Events after last_event_id still in the user's log are delivered
+        first. Returns (subscriber, reset); reset means those events are no
+        longer available and the client should refetch.
+        """
+        state = get_state()
+        latest = state.get(f"{EVENTS_PREFIX}{user_id}") or 0
+        sequence, reset = latest, last_event_id is not None
+        if last_event_id is not None:
+            epoch, _, seen = last_event_id.partition('-')
+            if epoch == _epoch(state) and seen.isdigit() and latest - self.history_size <= int(seen) <= latest:
+                sequence, reset = int(seen), False
+        subscriber = Subscriber(user_id, sequence)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        if sequence < latest:
+            self._wake()
+        return subscriber, reset
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def subscribed_user_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._subscribers)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _read_logs(self, cursors: Dict[int, int]) -> Dict[int, Tuple[int, List[dict]]]:
+        # user id -> (newest sequence, stored events after the cursor)
+        state = get_state()
+        logs = {}
+        for user_id, cursor in cursors.items():
+            key = f"{EVENTS_PREFIX}{user_id}"
+            latest = state.get(key) or 0
+            first = max(cursor, latest - self.history_size) + 1
+            events = (state.get(f"{key}:{sequence}") for sequence in range(first, latest + 1))
+            logs[user_id] = (latest, [event for event in events if event is not None])
+        return logs
+
+    async def deliver_new_events(self):
+        """Hand each stream open in this process the events published since its last one."""
+        with self._lock:
+            subscribers = {user_id: list(streams) for user_id, streams in self._subscribers.items()}
+        if not subscribers:
+            return
+        cursors = {user_id: min(s.sequence for s in streams) for user_id, streams in subscribers.items()}
+        logs = await run_blocking(self._read_logs, cursors)
+        for user_id, (latest, events) in logs.items():
+            for subscriber in subscribers[user_id]:
+                # Events it has not seen were dropped from the log, or the log
+                # itself was lost; the client reconnects and is told to refetch
+                if subscriber.sequence < latest - self.history_size or subscriber.sequence > latest:
+                    subscriber.overflowed = True
+                    continue
+                for event in events:
+                    if event['sequence'] > subscriber.sequence:
+                        subscriber._deliver(event)
+
+    async def run_delivery(self):
+        """Background task feeding this process's streams from the shared event log."""
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.EVENT_STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.deliver_new_events()
+            except Exception as e:
+                print(f"Error delivering stream events: {e}")
+
+broker = EventBroker(settings.EVENT_STREAM_HISTORY_SIZE)
+
+def publish_event(user_id: int, event_type: str, data: dict):
+    """Notify the user's open streams, in any worker, of a change; safe to call from any thread."""
+    try:
+        broker.publish(user_id, event_type, data)
+    except Exception as e:
+        # Streams are a convenience; the change itself is already stored
+        print(f"Error publishing {event_type} event for user {user_id}: {e}")
+
+async def run_event_delivery():
+    await broker.run_delivery()
+
+def format_event(event: dict) -> str:
+    """Serialize an event in the text/event-stream wire format."""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {event['data']}\n\n"
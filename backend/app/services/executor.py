@@ -0,0 +1,34 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio.to_thread
+
+from app.core.config import settings
+
+# Blocking googleapiclient/httplib2 and SQLAlchemy calls run here so they
+# never stall the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_IO_THREADS,
+    thread_name_prefix="blocking-io",
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared I/O thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (the current trace span) over to the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def submit_blocking(func, *args, **kwargs):
+    """Schedule a blocking call on the I/O pool without waiting for it."""
+    return _executor.submit(func, *args, **kwargs)
+
+def configure_threadpool():
+    # Sync dependencies such as get_db and get_current_user run on anyio's
+    # worker threads; size that pool to match instead of its default of 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.BLOCKING_IO_THREADS
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.services.google_certs import verify_signed_jwt
+from app.services.shared_state import get_state
+
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+# sha256 of an ID token -> its verified claims
+VERIFIED_TOKEN_PREFIX = "firebase:token:"
+
+_init_lock = threading.Lock()
+
+def _service_account_info() -> Optional[dict]:
+    service_account_path = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH", "firebase-service-account.json")
+    if os.path.exists(service_account_path):
+        with open(service_account_path) as f:
+            return json.load(f)
+    if os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON"):
+        return json.loads(os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON"))
+    return None
+
+def get_firebase_auth():
+    """Return the firebase_admin.auth module, initializing the default app on first use.
+
+    firebase_admin is imported here rather than at module import so processes
+    that never verify a Firebase token do not pay for loading it.
+    """
+    import firebase_admin
+    from firebase_admin import auth as firebase_auth
+
+    with _init_lock:
+        if not firebase_admin._apps:
+            # Use the service account from a file or environment variable if available
+            service_account_info = _service_account_info()
+            if service_account_info:
+                firebase_admin.initialize_app(firebase_admin.credentials.Certificate(service_account_info))
+            else:
+                # Fallback to default credentials (for development)
+                firebase_admin.initialize_app()
+    return firebase_auth
+
+@functools.lru_cache(maxsize=None)
+def firebase_project_id() -> Optional[str]:
+    if settings.FIREBASE_PROJECT_ID:
+        return settings.FIREBASE_PROJECT_ID
+    service_account_info = _service_account_info()
+    if service_account_info and service_account_info.get("project_id"):
+        return service_account_info["project_id"]
+    return os.getenv("GOOGLE_CLOUD_PROJECT")
+
+def _verify_signed_token(id_token: str, project_id: str) -> dict:
+    # Checks the signature, iat, exp and aud against the cached securetoken certs
+    claims = verify_signed_jwt(id_token, settings.FIREBASE_CERTS_URL, project_id)
+    if claims.get("iss") != FIREBASE_ISSUER_PREFIX + project_id:
+        raise ValueError(f"Firebase ID token has issuer {claims.get('iss')}")
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise ValueError("Firebase ID token has an invalid subject")
+    if claims.get("auth_time", 0) > time.time():
+        raise ValueError("Firebase ID token has an auth_time in the future")
+    return {**claims, "uid": subject}
+
+def verify_id_token(id_token: str) -> dict:
+    """Verify a Firebase ID token and return its claims, with the user id as 'uid' (blocking).
+
+    Tokens are checked locally against the cached signing certs, and tokens
+    already verified are remembered for FIREBASE_VERIFIED_TOKEN_TTL_SECONDS
+    (never past their expiry), so a login needs no network call. Without a
+    project id, or against the Auth emulator, firebase_admin verifies instead.
+    """
+    key = VERIFIED_TOKEN_PREFIX + hashlib.sha256(id_token.encode()).hexdigest()
+    claims = get_state().get(key)
+    if claims is not None:
+        return claims
+    project_id = firebase_project_id()
+    if project_id and not os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+        claims = _verify_signed_token(id_token, project_id)
+    else:
+        claims = get_firebase_auth().verify_id_token(id_token)
+    ttl = min(settings.FIREBASE_VERIFIED_TOKEN_TTL_SECONDS, claims.get("exp", 0) - time.time())
+    get_state().set(key, claims, ttl)
+    return claims
@@ -0,0 +1,60 @@
+from app.core.config import settings
+from app.services.shared_state import get_state
+
+# Google's current signing certs per URL (key id -> PEM), kept for the max-age they are served with
+CERTS_PREFIX = "google-certs:"
+# Tokens signed with unknown keys seen in the current refetch window, per URL
+UNKNOWN_KEY_PREFIX = "google-certs:unknown-key:"
+# A token signed with an unknown key refetches the certs at most this often
+UNKNOWN_KEY_REFETCH_SECONDS = 60
+
+def _max_age(cache_control: str) -> int:
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return 0
+
+def _fetch_signing_certs(url: str) -> dict:
+    from app.services.http_transport import get_http_client
+
+    response = get_http_client().get(url)
+    response.raise_for_status()
+    # Caches in front of Google report how long they have held the response already
+    age = int(response.headers.get("age", "0") or 0)
+    certs = response.json()
+    get_state().set(CERTS_PREFIX + url, certs, _max_age(response.headers.get("cache-control", "")) - age)
+    return certs
+
+def get_signing_certs(url: str, unknown_key: bool = False) -> dict:
+    """Google's token signing certs served at url, refetched only once their max-age has passed.
+
+    unknown_key asks for a refetch because a token named a key id not in the
+    cached set, as happens right after Google rotates keys.
+    """
+    state = get_state()
+    certs = state.get(CERTS_PREFIX + url)
+    if certs is not None:
+        # Only the first unknown key any worker sees in a window triggers a refetch
+        if unknown_key and state.incr(UNKNOWN_KEY_PREFIX + url, 1, UNKNOWN_KEY_REFETCH_SECONDS) == 1:
+            return _fetch_signing_certs(url)
+        return certs
+    # One worker fetches expired certs while the others wait for its result
+    with state.lock(CERTS_PREFIX + url, settings.GOOGLE_HTTP_CONNECT_TIMEOUT_SECONDS + settings.GOOGLE_HTTP_TIMEOUT_SECONDS):
+        certs = state.get(CERTS_PREFIX + url)
+        return _fetch_signing_certs(url) if certs is None else certs
+
+def verify_signed_jwt(token: str, url: str, audience: str) -> dict:
+    """Check an RS256 JWT against the certs at url, plus its iat, exp and aud, and return its claims."""
+    from google.auth import jwt
+
+    header = jwt.decode_header(token)
+    if header.get("alg") != "RS256":
+        raise ValueError(f"Token has algorithm {header.get('alg')}, expected RS256")
+    key_id = header.get("kid")
+    certs = get_signing_certs(url)
+    if key_id not in certs:
+        certs = get_signing_certs(url, unknown_key=True)
+    if key_id not in certs:
+        raise ValueError("Token is signed with an unknown key")
+    return jwt.decode(token, certs={key_id: certs[key_id]}, audience=audience)
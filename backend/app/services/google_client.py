@@ -0,0 +1,235 @@
+import functools
+import hashlib
+import random
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.services.http_transport import pooled_http
+from app.services.metrics import Counter, Histogram
+from app.services.rate_limiter import acquire_quota, quota_cost
+from app.services.tracing import span
+
+# googleapiclient, httplib2 and google_auth_httplib2 are imported on first use
+# rather than here, so importing the app does not pay for loading them
+
+# Raw discovery documents, read once from the copies bundled with googleapiclient
+_documents = {}
+# Built resources keyed by (api, version), shared by every user; credentials are
+# attached to each request instead, so there is one resource per API in a process
+_services = {}
+_lock = threading.Lock()
+# Google reports some rate limiting as 403 with one of these reasons rather than 429
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+GOOGLE_CALLS = Counter(
+    "google_api_calls_total",
+    "Google API calls by method and outcome: ok, the HTTP error status, or network.",
+    ("method", "status"),
+)
+GOOGLE_CALL_SECONDS = Histogram(
+    "google_api_call_duration_seconds",
+    "Latency of single Google API calls, quota waits excluded.",
+    ("method",),
+)
+GOOGLE_BATCH_SECONDS = Histogram(
+    "google_api_batch_duration_seconds",
+    "Latency of Google batch requests by the method of their first call.",
+    ("method",),
+)
+SERVICE_LOOKUPS = Counter(
+    "google_service_cache_lookups_total",
+    "get_service lookups by API and whether the client was cached.",
+    ("api", "result"),
+)
+SERVICE_BUILD_SECONDS = Histogram(
+    "google_service_build_duration_seconds",
+    "Time spent building Google API clients from discovery documents.",
+    ("api",),
+)
+
+def _call_status(error) -> str:
+    resp = getattr(error, "resp", None)
+    return str(resp.status) if resp is not None else "network"
+
+def _load_document(api: str, version: str) -> str:
+    document = _documents.get((api, version))
+    if document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc(api, version)
+        if document is None:
+            raise ValueError(f"No bundled discovery document for {api} {version}")
+        if settings.GOOGLE_API_ROOT_URL:
+            # Point the client at a local stand-in instead of googleapis.com
+            document = document.replace('"https://www.googleapis.com/"', f'"{settings.GOOGLE_API_ROOT_URL}"')
+            document = document.replace(f'"https://{api}.googleapis.com/"', f'"{settings.GOOGLE_API_ROOT_URL}"')
+        _documents[(api, version)] = document
+    return document
+
+def _quota_user(credentials) -> str:
+    # The refresh token outlives access tokens, so it identifies the user's quota
+    return hashlib.sha256((credentials.refresh_token or credentials.token or "").encode()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _request_class():
+    from googleapiclient.http import HttpRequest
+
+    class QuotaLimitedRequest(HttpRequest):
+        """HttpRequest whose execute() first waits for the user's and project's quota.
+
+        Each call is counted and timed by method and outcome.
+        """
+
+        def execute(self, http=None, num_retries=0):
+            acquire_quota(self.methodId, _quota_user(self.http.credentials))
+            with span(f"google {self.methodId}", **{"google.method": self.methodId}) as current:
+                start = time.perf_counter()
+                status = "ok"
+                try:
+                    return super().execute(http=http, num_retries=num_retries)
+                except Exception as e:
+                    status = _call_status(e)
+                    raise
+                finally:
+                    GOOGLE_CALL_SECONDS.observe(time.perf_counter() - start, method=self.methodId)
+                    GOOGLE_CALLS.inc(method=self.methodId, status=status)
+                    if current is not None:
+                        current.set_attribute("google.status", status)
+
+    return QuotaLimitedRequest
+
+def _build_request(http, *args, **kwargs):
+    # The shared resource's http carries no credentials; _BoundService swaps in the user's
+    return _request_class()(http, *args, **kwargs)
+
+def _request_http(credentials):
+    import google_auth_httplib2
+
+    # Requests send over the shared pooled client rather than a per-resource
+    # httplib2.Http, which is not thread-safe and reconnects per instance
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=pooled_http())
+
+class _BoundService:
+    """A shared resource, or one nested in it, whose requests run with one user's credentials."""
+
+    def __init__(self, resource, credentials):
+        self._resource = resource
+        self._credentials = credentials
+
+    def __getattr__(self, name):
+        attr = getattr(self._resource, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def bound(*args, **kwargs):
+            return self._bind(attr(*args, **kwargs))
+
+        return bound
+
+    def _bind(self, result):
+        from googleapiclient.discovery import Resource
+        if isinstance(result, Resource):
+            return _BoundService(result, self._credentials)
+        if isinstance(result, _request_class()):
+            result.http = _request_http(self._credentials)
+        return result
+
+def network_errors() -> tuple:
+    """Transport failure types, for except clauses, without importing httplib2 up front."""
+    from httplib2 import HttpLib2Error
+    return (OSError, HttpLib2Error)
+
+def is_rate_limited(error) -> bool:
+    """Whether a Google API error means the call was throttled rather than refused."""
+    from googleapiclient.errors import HttpError
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    details = error.error_details if isinstance(error.error_details, list) else []
+    return error.resp.status == 403 and any(
+        isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS for detail in details
+    )
+
+def retry_after_seconds(error) -> Optional[int]:
+    """Whole seconds from the Retry-After header of a throttled call's response, if it sent one."""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after", "") if resp is not None else ""
+    return int(value) if value.strip().isdigit() else None
+
+def backoff(attempt: int, base_seconds: float, error=None):
+    """Sleep before retrying calls that failed on their attempt-th try.
+
+    Waits a jittered base_seconds * 2 ** (attempt - 1), or longer if error
+    is a throttled response whose Retry-After asks for more.
+    """
+    delay = base_seconds * 2 ** (attempt - 1)
+    time.sleep(max(random.uniform(delay / 2, delay), retry_after_seconds(error) or 0))
+
+def add_to_batch(batch, request, request_id: str):
+    """Add a call to a batch request, counting it under its own method and outcome once it completes."""
+    method = request.methodId
+
+    def count(request_id, response, exception):
+        GOOGLE_CALLS.inc(method=method, status="ok" if exception is None else _call_status(exception))
+
+    batch.add(request, callback=count, request_id=request_id)
+
+def execute_batch(batch, requests):
+    """Execute a batch request once the quota covers every request added to it.
+
+    Calls added with add_to_batch are counted as their responses arrive; if
+    the batch request itself fails, every call is counted with its error.
+    """
+    if not requests:
+        batch.execute()
+        return
+    from googleapiclient.errors import HttpError
+
+    cost = sum(quota_cost(request.methodId) for request in requests)
+    acquire_quota(requests[0].methodId, _quota_user(requests[0].http.credentials), cost)
+    method = requests[0].methodId
+    with span(f"google batch {method}", **{"google.method": method, "google.batch_size": len(requests)}):
+        start = time.perf_counter()
+        try:
+            batch.execute()
+        except (HttpError, *network_errors()) as e:
+            for request in requests:
+                GOOGLE_CALLS.inc(method=request.methodId, status=_call_status(e))
+            raise
+        finally:
+            GOOGLE_BATCH_SECONDS.observe(time.perf_counter() - start, method=method)
+
+def get_service(api: str, version: str, credentials):
+    """Return a googleapiclient resource whose requests run with these credentials.
+
+    Each API is built from its bundled discovery document once per process
+    and shared by every user; the returned wrapper attaches credentials to
+    each request it makes. Repeated calls therefore skip discovery parsing
+    and client construction, and memory does not grow with the number of
+    users.
+    """
+    key = (api, version)
+    service = _services.get(key)
+    if service is not None:
+        SERVICE_LOOKUPS.inc(api=api, result="hit")
+        return _BoundService(service, credentials)
+    SERVICE_LOOKUPS.inc(api=api, result="miss")
+    from googleapiclient.discovery import build_from_document
+    start = time.perf_counter()
+    service = build_from_document(
+        _load_document(api, version),
+        http=pooled_http(),
+        requestBuilder=_build_request,
+    )
+    SERVICE_BUILD_SECONDS.observe(time.perf_counter() - start, api=api)
+    with _lock:
+        # A concurrent miss may have built it too; keep whichever was stored first
+        service = _services.setdefault(key, service)
+    return _BoundService(service, credentials)
+
+def clear_service_cache():
+    with _lock:
+        _services.clear()
@@ -0,0 +1,141 @@
+import functools
+import socket
+import threading
+from typing import Optional
+
+from app.core.config import settings
+
+# httpx (and h2 for HTTP/2) are imported when the first Google call is made
+
+_client = None
+_client_lock = threading.Lock()
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_http_client():
+    """The process-wide pooled keep-alive client every Google call goes through.
+
+    httpx.Client is safe to share between threads, so connections (and TLS
+    sessions) to googleapis.com are reused across users and requests instead
+    of being opened per call. HTTP/2 is negotiated when enabled and the h2
+    package is installed, otherwise connections are HTTP/1.1 keep-alive.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                transport = httpx.HTTPTransport(
+                    http2=settings.GOOGLE_HTTP2_ENABLED and http2_available(),
+                    limits=httpx.Limits(
+                        max_connections=settings.GOOGLE_HTTP_POOL_SIZE,
+                        max_keepalive_connections=settings.GOOGLE_HTTP_POOL_SIZE,
+                        keepalive_expiry=settings.GOOGLE_HTTP_KEEPALIVE_SECONDS,
+                    ),
+                    # Request headers and body go out in separate writes; without
+                    # this, Nagle's algorithm holds the body back on a reused
+                    # connection until the server's delayed ACK
+                    socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+                )
+                _client = httpx.Client(
+                    transport=transport,
+                    follow_redirects=True,
+                    timeout=httpx.Timeout(
+                        settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+                        connect=settings.GOOGLE_HTTP_CONNECT_TIMEOUT_SECONDS,
+                        # A caller waiting for a free connection is not a network failure
+                        pool=None,
+                    ),
+                )
+    return _client
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+def _send(method: str, url: str, body=None, headers: Optional[dict] = None, timeout: Optional[float] = None):
+    """Send one request on the shared client, raising OSError subclasses on transport failures."""
+    import httpx
+    kwargs = {} if timeout is None else {"timeout": timeout}
+    try:
+        return get_http_client().request(method, url, content=body, headers=headers, **kwargs)
+    except httpx.TimeoutException as e:
+        raise TimeoutError(f"{method} {url}: {e}") from e
+    except httpx.TransportError as e:
+        raise ConnectionError(f"{method} {url}: {e}") from e
+
+class PooledHttp:
+    """httplib2.Http stand-in sending requests over the shared pooled client.
+
+    googleapiclient and google_auth_httplib2 only call request(); transport
+    failures surface as OSError, which both already treat as retryable.
+    """
+    follow_redirects = True
+    timeout = None
+    redirect_codes = frozenset((300, 301, 302, 303, 307, 308))
+    connections = {}
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+
+        response = _send(method, uri, body, headers)
+        info = dict(response.headers)
+        # httpx has already decoded the body
+        info.pop("content-encoding", None)
+        info["status"] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason_phrase
+        return resp, response.content
+
+    def close(self):
+        # The shared client outlives any one caller
+        pass
+
+_pooled_http = PooledHttp()
+
+def pooled_http() -> PooledHttp:
+    return _pooled_http
+
+@functools.lru_cache(maxsize=None)
+def _auth_request_class():
+    import google.auth.exceptions
+    import google.auth.transport
+
+    class _Response(google.auth.transport.Response):
+        def __init__(self, response):
+            self._response = response
+
+        @property
+        def status(self):
+            return self._response.status_code
+
+        @property
+        def headers(self):
+            return self._response.headers
+
+        @property
+        def data(self):
+            return self._response.content
+
+    class PooledRequest(google.auth.transport.Request):
+        """google.auth transport Request over the shared pooled client."""
+
+        def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+            try:
+                return _Response(_send(method, url, body, headers, timeout))
+            except OSError as e:
+                raise google.auth.exceptions.TransportError(e) from e
+
+    return PooledRequest
+
+def google_auth_request():
+    """A Request for credentials.refresh() that reuses the pooled connections."""
+    return _auth_request_class()()
@@ -0,0 +1,61 @@
+import time
+
+from app.core.config import settings
+from app.services.metrics import Histogram
+from app.services.shared_state import get_state
+
+# Quota schedules: "quota:<api>:<quota user>" and "quota:<api>"
+QUOTA_PREFIX = "quota:"
+
+QUOTA_WAIT_SECONDS = Histogram(
+    "google_api_quota_wait_seconds",
+    "Time Google API calls waited for quota in the client-side rate limiter.",
+    ("api", "method"),
+)
+
+def _charge(key: str, rate: float, cost: int):
+    """Wait until key's token bucket has cost units for this call.
+
+    The bucket refills at rate units per second and holds up to
+    GOOGLE_QUOTA_BURST_SECONDS of them. It is kept as the time its units
+    are spent up to (GCRA), so every worker charges it with one atomic
+    reservation in the shared state. Calls are served in the order they
+    reserve, and each sleeps without holding anything until its turn.
+    """
+    burst = settings.GOOGLE_QUOTA_BURST_SECONDS
+    # A call costing more than a full bucket would never fit; let it empty the bucket instead
+    cost = min(cost, max(rate * burst, 1))
+    wait = get_state().reserve(f"{QUOTA_PREFIX}{key}", cost / rate, burst)
+    if wait > 0:
+        time.sleep(wait)
+
+def quota_cost(method_id: str) -> int:
+    return settings.GOOGLE_QUOTA_COSTS.get(method_id, 1)
+
+def acquire_quota(method_id: str, quota_user: str, cost: int = None) -> float:
+    """Wait until the user's and the project's quota for this method's API allow cost units.
+
+    method_id is the discovery method id, e.g. "gmail.users.messages.get",
+    and cost defaults to that method's entry in GOOGLE_QUOTA_COSTS. The
+    user's quota is paid first, so a user sending a burst waits on their own
+    calls instead of crowding others out of the project quota. Returns the
+    seconds spent waiting.
+    """
+    api = method_id.split('.', 1)[0]
+    user_rate = settings.GOOGLE_USER_QUOTA_PER_SECOND.get(api)
+    project_rate = settings.GOOGLE_PROJECT_QUOTA_PER_SECOND.get(api)
+    if not settings.GOOGLE_QUOTA_ENABLED or (user_rate is None and project_rate is None):
+        return 0.0
+    if cost is None:
+        cost = quota_cost(method_id)
+    start = time.monotonic()
+    if user_rate is not None:
+        _charge(f"{api}:{quota_user}", user_rate, cost)
+    if project_rate is not None:
+        _charge(api, project_rate, cost)
+    waited = time.monotonic() - start
+    QUOTA_WAIT_SECONDS.observe(waited, api=api, method=method_id)
+    return waited
+
+def reset_quota_buckets():
+    get_state().delete_prefix(QUOTA_PREFIX)
@@ -0,0 +1,453 @@
+import contextlib
+import math
+import re
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+from urllib.parse import unquote, urlparse
+
+import orjson
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+
+# A lock held elsewhere is polled this often at first, backing off to the max
+LOCK_POLL_SECONDS = 0.005
+LOCK_POLL_MAX_SECONDS = 0.1
+# The SQLite backend drops expired rows once every this many writes
+SQLITE_PURGE_EVERY = 1000
+# Deletes the lock key only if it still holds the caller's token
+REDIS_RELEASE_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+)
+# Adds ARGV[1] to the counter and, when ARGV[2] is given and the counter has no
+# expiry yet, sets it; one script so a crash cannot leave a counter that never expires
+REDIS_INCR_SCRIPT = (
+    "local value = redis.call('incrby', KEYS[1], ARGV[1]) "
+    "if ARGV[2] and redis.call('pttl', KEYS[1]) == -1 then redis.call('pexpire', KEYS[1], ARGV[2]) end "
+    "return value"
+)
+# Pushes the schedule at KEYS[1] back by ARGV[1] seconds on the server's clock and
+# returns, as a string since Lua numbers reply as integers, how long the caller waits
+REDIS_RESERVE_SCRIPT = (
+    "local t = redis.call('time') "
+    "local now = tonumber(t[1]) + tonumber(t[2]) / 1000000 "
+    "local scheduled = math.max(tonumber(redis.call('get', KEYS[1]) or 0), now) + tonumber(ARGV[1]) "
+    "redis.call('set', KEYS[1], string.format('%.6f', scheduled), 'px', math.max(math.ceil((scheduled - now) * 1000), 1)) "
+    "return string.format('%.6f', math.max(scheduled - tonumber(ARGV[2]) - now, 0))"
+)
+
+_state = None
+_state_lock = threading.Lock()
+
+class LockTimeout(TimeoutError):
+    """A shared lock was still held elsewhere when the caller's timeout ran out."""
+
+class RedisError(RuntimeError):
+    """An error reply from the Redis server."""
+
+class SharedState:
+    """Key/value entries with TTLs, counters and locks seen by every worker process.
+
+    Values are anything orjson can serialize and come back as plain JSON
+    types, whichever backend is in use. A ttl of None keeps an entry until
+    it is deleted; a ttl <= 0 stores nothing.
+    """
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add amount to the counter at key and return its new value.
+
+        A missing counter starts from 0 and expires ttl seconds after that
+        first increment; later increments leave its expiry alone.
+        """
+        raise NotImplementedError
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        """Reserve the next interval seconds of the schedule at key and return how long to wait for it.
+
+        The schedule is when the reservations made so far run out; each one
+        starts there, or now if that has passed, and pushes it interval
+        seconds further. A caller may run up to burst seconds ahead of its
+        reservation, so the wait is whatever lies beyond that. Reservations
+        are served in the order they were made.
+        """
+        raise NotImplementedError
+
+    def _try_acquire(self, name: str, token: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def _release(self, name: str, token: str):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def lock(self, name: str, ttl: float, timeout: Optional[float] = None):
+        """Hold the lock called name, across processes, for the duration of the block.
+
+        The lock lapses ttl seconds after it is taken so a crashed holder
+        cannot keep it forever. Waits at most timeout seconds (forever when
+        None) before raising LockTimeout.
+        """
+        token = secrets.token_hex(16)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = LOCK_POLL_SECONDS
+        while not self._try_acquire(name, token, ttl):
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LockTimeout(f"Timed out waiting for lock {name}")
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX_SECONDS)
+        try:
+            yield
+        finally:
+            self._release(name, token)
+
+    def close(self):
+        pass
+
+class MemoryState(SharedState):
+    """State kept in this process; only consistent with a single worker."""
+
+    def __init__(self, max_entries: int):
+        self._entries = TTLCache(max_entries)
+        self._reserve_lock = threading.Lock()
+        # Lock name -> [lock, callers holding or waiting for it]; dropped when unused
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        value = self._entries.get(key)
+        return None if value is None else _loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        # Stored serialized, as the other backends do, so callers never share or mutate the stored object
+        self._entries.set(key, orjson.dumps(value), math.inf if ttl is None else ttl)
+
+    def delete(self, key: str):
+        self._entries.pop(key)
+
+    def delete_prefix(self, prefix: str):
+        self._entries.clear(prefix)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self._entries.incr(key, amount, math.inf if ttl is None else ttl)
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        with self._reserve_lock:
+            now = time.time()
+            scheduled = max(self._entries.get(key) or 0.0, now) + interval
+            # Once the schedule has passed the entry means nothing, so it expires then
+            self._entries.set(key, scheduled, scheduled - now)
+        return max(scheduled - burst - now, 0.0)
+
+    @contextlib.contextmanager
+    def lock(self, name: str, ttl: float, timeout: Optional[float] = None):
+        # Every holder is in this process and releases on exit, so the lock never needs to lapse
+        with self._locks_guard:
+            entry = self._locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=-1 if timeout is None else timeout):
+                raise LockTimeout(f"Timed out waiting for lock {name}")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[name]
+
+def _loads(value) -> Any:
+    # Counters and schedules are stored as numbers, everything else as JSON
+    return value if isinstance(value, (int, float)) else orjson.loads(value)
+
+class SQLiteState(SharedState):
+    """State in a SQLite file, shared by the worker processes on one host.
+
+    Each thread keeps its own connection; WAL lets readers run alongside the
+    single writer. Expiry uses the wall clock, which all processes share.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_shared_state_expires_at ON shared_state (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every statement here is a single atomic write or read
+            conn = sqlite3.connect(self.path, timeout=settings.SQLITE_BUSY_TIMEOUT_SECONDS,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _wrote(self, conn: sqlite3.Connection):
+        self._writes += 1
+        if self._writes % SQLITE_PURGE_EVERY == 0:
+            conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return None if row is None else _loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if ttl is not None and ttl <= 0:
+            return
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, orjson.dumps(value), None if ttl is None else time.time() + ttl),
+        )
+        self._wrote(conn)
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        self._connection().execute("DELETE FROM shared_state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        conn = self._connection()
+        # An expired counter restarts from amount with a new expiry
+        value = conn.execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (:key, :amount, :expires_at) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= :now THEN excluded.value ELSE CAST(value AS INTEGER) + excluded.value END, "
+            "expires_at = CASE WHEN expires_at <= :now THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            {"key": key, "amount": amount, "expires_at": None if ttl is None else now + ttl, "now": now},
+        ).fetchone()[0]
+        self._wrote(conn)
+        return value
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        now = time.time()
+        conn = self._connection()
+        # The schedule expires when it passes, so an expired row's value is never ahead of now
+        scheduled = conn.execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (:key, :scheduled, :scheduled) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = max(CAST(value AS REAL), :now) + :interval, "
+            "expires_at = max(CAST(value AS REAL), :now) + :interval "
+            "RETURNING value",
+            {"key": key, "scheduled": now + interval, "interval": interval, "now": now},
+        ).fetchone()[0]
+        self._wrote(conn)
+        return max(scheduled - burst - now, 0.0)
+
+    def _try_acquire(self, name: str, token: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE expires_at <= ?",
+            (f"lock:{name}", orjson.dumps(token), now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, name: str, token: str):
+        self._connection().execute(
+            "DELETE FROM shared_state WHERE key = ? AND value = ?", (f"lock:{name}", orjson.dumps(token))
+        )
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+def _encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+class _RedisConnection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def command(self, *args):
+        self.sock.sendall(_encode_command(args))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected Redis reply {line!r}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+class RedisState(SharedState):
+    """State on a Redis-protocol server, shared by workers on any number of hosts.
+
+    Speaks RESP over plain sockets, so no client library is needed; idle
+    connections are pooled for reuse. Keys are namespaced with key_prefix.
+    """
+
+    def __init__(self, url: str, key_prefix: str = ""):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.key_prefix = key_prefix
+        self._idle = deque()
+
+    def _connect(self) -> _RedisConnection:
+        conn = _RedisConnection(self.host, self.port, settings.SHARED_STATE_TIMEOUT_SECONDS)
+        try:
+            if self.password:
+                conn.command("AUTH", *filter(None, (self.username, self.password)))
+            if self.db:
+                conn.command("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _command(self, *args):
+        try:
+            conn = self._idle.pop()
+        except IndexError:
+            conn = self._connect()
+        try:
+            reply = conn.command(*args)
+        except RedisError:
+            # The error reply was read in full, so the connection is still usable
+            self._idle.append(conn)
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        self._idle.append(conn)
+        return reply
+
+    def get(self, key: str) -> Any:
+        value = self._command("GET", self.key_prefix + key)
+        return None if value is None else orjson.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            self._command("SET", self.key_prefix + key, orjson.dumps(value))
+        elif ttl > 0:
+            self._command("SET", self.key_prefix + key, orjson.dumps(value), "PX", max(int(ttl * 1000), 1))
+
+    def delete(self, key: str):
+        self._command("DEL", self.key_prefix + key)
+
+    def delete_prefix(self, prefix: str):
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self.key_prefix + prefix) + "*"
+        cursor = b"0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", pattern, "COUNT", 1000)
+            if keys:
+                self._command("DEL", *keys)
+            if cursor == b"0":
+                return
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        if ttl is None:
+            return self._command("EVAL", REDIS_INCR_SCRIPT, 1, self.key_prefix + key, amount)
+        return self._command("EVAL", REDIS_INCR_SCRIPT, 1, self.key_prefix + key, amount, max(int(ttl * 1000), 1))
+
+    def reserve(self, key: str, interval: float, burst: float) -> float:
+        return float(self._command("EVAL", REDIS_RESERVE_SCRIPT, 1, self.key_prefix + key, interval, burst))
+
+    def _try_acquire(self, name: str, token: str, ttl: float) -> bool:
+        key = f"{self.key_prefix}lock:{name}"
+        return self._command("SET", key, token, "PX", max(int(ttl * 1000), 1), "NX") is not None
+
+    def _release(self, name: str, token: str):
+        self._command("EVAL", REDIS_RELEASE_SCRIPT, 1, f"{self.key_prefix}lock:{name}", token)
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+def create_state(backend: str) -> SharedState:
+    if backend == "memory":
+        return MemoryState(settings.SHARED_STATE_MEMORY_MAX_ENTRIES)
+    if backend == "sqlite":
+        return SQLiteState(settings.SHARED_STATE_SQLITE_PATH)
+    if backend == "redis":
+        return RedisState(settings.SHARED_STATE_REDIS_URL, settings.SHARED_STATE_KEY_PREFIX)
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND {backend!r}, expected memory, sqlite or redis")
+
+def get_state() -> SharedState:
+    """The process's SHARED_STATE_BACKEND, created on first use.
+
+    Auth caches, Firebase certs and verified tokens, token refresh locks and
+    Google quota schedules all live here, so with the sqlite or redis backend
+    every worker process sees the same entries.
+    """
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_state(settings.SHARED_STATE_BACKEND)
+    return _state
+
+def close_state():
+    global _state
+    with _state_lock:
+        if _state is not None:
+            _state.close()
+            _state = None
@@ -0,0 +1,44 @@
+import contextlib
+
+from app.core.config import settings
+
+# Set by configure_tracing; while None, span() does nothing and OpenTelemetry is never imported
+_tracer = None
+_provider = None
+
+def configure_tracing():
+    """Export spans to TRACING_OTLP_ENDPOINT when TRACING_ENABLED is set.
+
+    Needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http, which
+    are optional dependencies; without them tracing stays off.
+    """
+    global _tracer, _provider
+    if not settings.TRACING_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        print(f"Tracing disabled, OpenTelemetry SDK or OTLP exporter not installed: {e}")
+        return
+    _provider = TracerProvider(resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("app")
+
+def shutdown_tracing():
+    """Flush spans still waiting to be exported."""
+    if _provider is not None:
+        _provider.shutdown()
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Record a span around the block, yielding it, or None when tracing is off."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
@@ -0,0 +1,94 @@
+"""Benchmark authenticated request throughput with and without the auth cache.
+
+Sends requests to GET /api/auth/me, the cheapest authenticated route, and
+reports requests/sec with AUTH_CACHE_ENABLED off and on. The user lives in a
+throwaway SQLite database so the app database is left untouched:
+
+    python -m benchmarks.bench_auth --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.core.auth_cache import clear_auth_cache
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.crud.user import create_user
+from app.database.connection import Base, get_db
+from app.models.user import UserCreate
+
+
+async def measure(app, token: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+        (await client.get("/api/auth/me")).raise_for_status()
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                (await client.get("/api/auth/me")).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auth fast path benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.main import app
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def bench_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db = BenchSession()
+    create_user(db, UserCreate(
+        email="bench@example.com", google_id="bench", access_token="fake-token",
+        refresh_token="fake-refresh-token", token_expiry="", scope=""
+    ))
+    db.close()
+    app.dependency_overrides[get_db] = bench_db
+    token = create_access_token({"sub": "bench@example.com"}, timedelta(hours=1))
+
+    results = {}
+    for enabled in (False, True):
+        settings.AUTH_CACHE_ENABLED = enabled
+        clear_auth_cache()
+        results[enabled] = asyncio.run(measure(app, token, args.requests, args.concurrency))
+    print(f"{args.requests} requests to /api/auth/me, concurrency {args.concurrency}")
+    print(f"  without cache: {results[False]:8.0f} req/s")
+    print(f"  with cache:    {results[True]:8.0f} req/s ({results[True] / results[False]:.1f}x)")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
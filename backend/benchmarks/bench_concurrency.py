@@ -0,0 +1,94 @@
+"""Check that slow upstream calls do not serialize requests on one worker.
+
+Fires N parallel requests at /integrations/gmail/api/messages/{id} while
+the fake Gmail server sleeps for --latency-ms on every call. With the
+blocking calls off the event loop the batch should finish in roughly one
+upstream latency; the script exits non-zero if it takes more than
+--max-factor latencies:
+
+    python -m benchmarks.bench_concurrency --requests 100 --latency-ms 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.core.config import settings
+
+from .fake_google import start_fake_google
+
+FAKE_USER = {
+    "id": 1,
+    "email": "me@example.com",
+    "google_id": "fake-google-id",
+    "access_token": "fake-token",
+    "refresh_token": "fake-refresh-token",
+    "token_expiry": "",
+    "scope": "",
+}
+
+
+async def run(requests: int, latency: float) -> float:
+    from app.core.dependencies import get_current_user
+    from app.database.connection import get_db
+    from app.main import app
+    from app.models.user import UserInDB
+
+    async def fake_current_user():
+        return UserInDB(**FAKE_USER)
+
+    async def no_db():
+        yield None
+
+    app.dependency_overrides[get_current_user] = fake_current_user
+    app.dependency_overrides[get_db] = no_db
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+        # Warm up the client cache so the measurement covers request handling only
+        await client.get("/integrations/gmail/api/messages/msg000000")
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.get(f"/integrations/gmail/api/messages/msg{i:06d}") for i in range(requests)
+        ))
+        elapsed = time.perf_counter() - start
+    failed = [r for r in responses if r.status_code != 200]
+    if failed:
+        raise SystemExit(f"{len(failed)} requests failed, first: {failed[0].status_code} {failed[0].text}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop concurrency check")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--max-factor", type=float, default=3.0)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    server, base_url = start_fake_google(mailbox_size=args.requests, latency=latency)
+    settings.GOOGLE_API_ROOT_URL = base_url
+    # All requests share one fake user; measure the event loop, not the quota limiter
+    settings.GOOGLE_QUOTA_ENABLED = False
+    elapsed = asyncio.run(run(args.requests, latency))
+    server.shutdown()
+
+    factor = elapsed / latency
+    print(f"{args.requests} parallel requests, upstream latency {args.latency_ms:.0f} ms: "
+          f"{elapsed * 1000:.0f} ms total ({factor:.1f}x upstream latency)")
+    if factor > args.max_factor:
+        print(f"FAIL: expected at most {args.max_factor}x upstream latency")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark concurrent token updates and user lookups against SQLite.
+
+Runs the same mixed workload (user lookups with a share of token updates)
+from many threads on two engines over throwaway database files: the old
+default engine (rollback journal, default pool) and the configured engine
+from app.database.connection.build_engine (WAL, tuned pool, busy timeout):
+
+    python -m benchmarks.bench_database --threads 32 --operations 200 --write-ratio 0.2
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.crud.user import create_user, get_user_by_email, update_user_tokens
+from app.database.connection import Base, build_engine
+from app.models.user import UserCreate
+
+USERS = 50
+
+
+def seed(Session):
+    db = Session()
+    for i in range(USERS):
+        create_user(db, UserCreate(
+            email=f"user{i}@example.com", google_id=f"google-{i}", access_token="token",
+            refresh_token="refresh", token_expiry="", scope=""
+        ))
+    db.close()
+
+
+def workload(Session, operations: int, write_ratio: float) -> int:
+    """Run the mixed workload on one thread; returns the number of failed operations."""
+    failures = 0
+    db = Session()
+    try:
+        for _ in range(operations):
+            email = f"user{random.randrange(USERS)}@example.com"
+            try:
+                user = get_user_by_email(db, email)
+                if random.random() < write_ratio:
+                    update_user_tokens(db, user, f"token-{random.random()}", "refresh",
+                                       datetime.utcnow() + timedelta(hours=1), "")
+                else:
+                    db.commit()
+            except OperationalError:
+                db.rollback()
+                failures += 1
+    finally:
+        db.close()
+    return failures
+
+
+def run(engine, threads: int, operations: int, write_ratio: float):
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(Session)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        failures = sum(pool.map(lambda _: workload(Session, operations, write_ratio), range(threads)))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return threads * operations / elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database concurrency benchmark")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    engines = {
+        "default engine": create_engine(
+            f"sqlite:///{os.path.join(directory, 'default.db')}", connect_args={"check_same_thread": False}
+        ),
+        "configured engine": build_engine(f"sqlite:///{os.path.join(directory, 'configured.db')}"),
+    }
+    print(f"{args.threads} threads x {args.operations} operations, {args.write_ratio:.0%} token updates")
+    for name, engine in engines.items():
+        throughput, failures = run(engine, args.threads, args.operations, args.write_ratio)
+        print(f"  {name:<18} {throughput:8.0f} ops/s, {failures} failed (database locked)")
+
+
+if __name__ == "__main__":
+    main()
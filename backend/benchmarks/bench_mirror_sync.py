@@ -0,0 +1,97 @@
+"""Benchmark Gmail mirror syncs end to end and check the stored mailbox after each.
+
+Runs a full sync of a partial mirror (the fake mailbox holds more than
+--initial-size messages), adds --added messages upstream, then replays
+them with an incremental sync, all against the local fake Gmail server
+and a throwaway database. Reports how long each sync took and exits with
+status 1 if a sync fails or leaves the wrong messages, history id or
+coverage behind:
+
+    python -m benchmarks.bench_mirror_sync --mailbox-size 300 --initial-size 200 --added 25
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .bench_startup import PLACEHOLDER_ENV
+from .fake_google import start_fake_google
+
+
+def check(label: str, actual, expected) -> bool:
+    ok = actual == expected
+    if not ok:
+        print(f"  MISMATCH {label}: {actual!r}, expected {expected!r}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gmail mirror sync benchmark")
+    parser.add_argument("--mailbox-size", type=int, default=300)
+    parser.add_argument("--initial-size", type=int, default=200, help="MAIL_MIRROR_INITIAL_SYNC_SIZE")
+    parser.add_argument("--added", type=int, default=25, help="Messages added upstream between syncs")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # The app's settings must validate, and use a throwaway database, before it is imported
+    for name, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'mirror.db')}"
+    from google.oauth2.credentials import Credentials
+
+    from app.core.config import settings
+    from app.crud.mail import get_message_ids, get_sync_state
+    from app.database.connection import SessionLocal, create_db_tables
+    from app.integrations.gmail.google_auth import get_gmail_service
+    from app.integrations.gmail.mirror import _full_sync, _incremental_sync
+    import app.models.mail  # noqa: F401
+    import app.models.user  # noqa: F401
+
+    server, base_url = start_fake_google(mailbox_size=args.mailbox_size, latency=args.latency_ms / 1000)
+    settings.GOOGLE_API_ROOT_URL = base_url
+    settings.GOOGLE_QUOTA_ENABLED = False
+    settings.MAIL_MIRROR_INITIAL_SYNC_SIZE = args.initial_size
+    create_db_tables()
+    service = get_gmail_service(Credentials(token="fake-token"))
+    db = SessionLocal()
+    user_id = 1
+    mirrored = min(args.initial_size, args.mailbox_size)
+    ok = True
+    try:
+        start = time.perf_counter()
+        _full_sync(service, db, user_id)
+        full_seconds = time.perf_counter() - start
+        state = get_sync_state(db, user_id)
+        oldest = state.oldest_internal_date
+        ok &= check("messages after full sync", len(get_message_ids(db, user_id)), mirrored)
+        ok &= check("history id after full sync", state.history_id, str(args.mailbox_size))
+        ok &= check("coverage after full sync", state.complete, args.initial_size >= args.mailbox_size)
+
+        server.fake.mailbox.size += args.added
+        start = time.perf_counter()
+        _incremental_sync(service, db, user_id, state.history_id)
+        incremental_seconds = time.perf_counter() - start
+        db.expire_all()
+        state = get_sync_state(db, user_id)
+        ok &= check("messages after incremental sync", len(get_message_ids(db, user_id)),
+                    mirrored + args.added)
+        ok &= check("history id after incremental sync", state.history_id, str(args.mailbox_size + args.added))
+        # Replaying history adds new mail but never reaches further back
+        ok &= check("coverage after incremental sync", (state.complete, state.oldest_internal_date),
+                    (args.initial_size >= args.mailbox_size, oldest))
+    except Exception as e:
+        print(f"  Sync failed: {e!r}")
+        sys.exit(1)
+    finally:
+        db.close()
+        server.shutdown()
+
+    print(f"full sync of {mirrored} messages {full_seconds * 1000:8.1f} ms")
+    print(f"incremental sync of {args.added} messages {incremental_seconds * 1000:8.1f} ms")
+    print("stored mailbox consistent" if ok else "stored mailbox INCONSISTENT")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark serializing a page of search results.
+
+Compares the default path (validate against List[EmailResponse], then
+json.dumps) with the orjson response class, and with a fields= projection
+serialized directly by orjson, reporting time per page and payload size:
+
+    python -m benchmarks.bench_serialization --messages 100 --body-size 20000 --fields id,subject,sender
+"""
+import argparse
+import json
+import os
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.core.projection import projected_response
+from app.integrations.gmail.api import EmailResponse
+
+RESPONSE_ADAPTER = TypeAdapter(List[EmailResponse])
+
+
+def synthetic_page(messages: int, body_size: int) -> List[dict]:
+    return [{
+        'id': f"msg{i:06d}",
+        'threadId': f"thr{i:06d}",
+        'subject': f"Message {i}",
+        'sender': f"sender{i}@example.com",
+        'date': "Mon, 1 Jan 2024 00:00:00 +0000",
+        'snippet': f"Snippet of message {i}",
+        'body': "Lorem ipsum dolor sit amet. " * (body_size // 28),
+    } for i in range(messages)]
+
+
+def validated(response_class):
+    # What FastAPI does with a response_model: validate, encode, render
+    def serialize(page):
+        return response_class(jsonable_encoder(RESPONSE_ADAPTER.validate_python(page))).body
+    return serialize
+
+
+def timed(serialize, page, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = serialize(page)
+    return (time.perf_counter() - start) / repeat, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--body-size", type=int, default=20000)
+    parser.add_argument("--fields", default="id,subject,sender")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    page = synthetic_page(args.messages, args.body_size)
+    fields = args.fields.split(",")
+    paths = {
+        "response model + json": validated(JSONResponse),
+        "response model + orjson": validated(ORJSONResponse),
+        f"fields={args.fields} + orjson": lambda page: projected_response(page, fields).body,
+        f"fields={args.fields} + json": lambda page: json.dumps([{name: m[name] for name in fields} for m in page]).encode(),
+    }
+    print(f"{args.messages} messages, {args.body_size} byte bodies")
+    for name, serialize in paths.items():
+        seconds, size = timed(serialize, page, args.repeat)
+        print(f"  {name:<40} {seconds * 1000:8.2f} ms/page {size / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
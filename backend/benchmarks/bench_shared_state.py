@@ -0,0 +1,123 @@
+"""Benchmark the shared-state backends and check they stay consistent across processes.
+
+Times get, set, incr and an uncontended lock on each backend. Then, for the
+sqlite and redis backends, several processes each increment one counter and
+do a locked read-modify-write of one value; any lost update means the
+backend is not safe to share between workers and the run exits with status
+1. Redis runs against the fake server unless --redis-url is given:
+
+    python -m benchmarks.bench_shared_state --ops 2000 --processes 4 --iterations 200
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.services.shared_state import MemoryState, RedisState, SQLiteState
+
+from .fake_redis import start_fake_redis
+
+KEY_PREFIX = "bench:"
+
+
+def open_state(backend: str, target: str):
+    if backend == "memory":
+        return MemoryState(100000)
+    if backend == "sqlite":
+        return SQLiteState(target)
+    return RedisState(target, KEY_PREFIX)
+
+
+def time_operations(state, ops: int) -> dict:
+    def hold_lock(i):
+        with state.lock(f"lock:{i % 100}", 10):
+            pass
+
+    operations = {
+        "set": lambda i: state.set(f"key:{i % 100}", {"value": i}, 60),
+        "get": lambda i: state.get(f"key:{i % 100}"),
+        "incr": lambda i: state.incr("counter", 1, 60),
+        "lock": hold_lock,
+    }
+    timings = {}
+    for name, operation in operations.items():
+        start = time.perf_counter()
+        for i in range(ops):
+            operation(i)
+        timings[name] = (time.perf_counter() - start) / ops
+    return timings
+
+
+def contend(backend: str, target: str, iterations: int):
+    state = open_state(backend, target)
+    for _ in range(iterations):
+        state.incr("shared:counter", 1, 600)
+        with state.lock("shared:lock", 10):
+            state.set("shared:total", (state.get("shared:total") or 0) + 1, 600)
+    state.close()
+
+
+def check_processes(backend: str, target: str, processes: int, iterations: int) -> bool:
+    state = open_state(backend, target)
+    state.delete_prefix("shared:")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=contend, args=(backend, target, iterations)) for _ in range(processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    expected = processes * iterations
+    counter, total = state.get("shared:counter"), state.get("shared:total")
+    state.close()
+    consistent = counter == expected and total == expected
+    print(f"  {backend:<7} {processes} processes x {iterations}: counter {counter}, locked total {total} "
+          f"of {expected} in {elapsed:.2f}s {'consistent' if consistent else 'LOST UPDATES'}")
+    return consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared state backend benchmark")
+    parser.add_argument("--ops", type=int, default=2000, help="Operations timed per kind")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=200, help="Updates per process")
+    parser.add_argument("--redis-url", help="A real Redis to use instead of the fake")
+    args = parser.parse_args()
+
+    server = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        server, redis_url = start_fake_redis()
+    targets = {
+        "memory": None,
+        "sqlite": os.path.join(tempfile.mkdtemp(), "shared_state.db"),
+        "redis": redis_url,
+    }
+
+    print(f"{args.ops} operations of each kind, microseconds per operation")
+    for backend, target in targets.items():
+        state = open_state(backend, target)
+        timings = time_operations(state, args.ops)
+        state.delete_prefix("")
+        state.close()
+        print(f"  {backend:<7} " + " ".join(f"{name} {seconds * 1e6:8.1f}" for name, seconds in timings.items()))
+
+    print("Cross-process consistency")
+    consistent = all([check_processes(backend, targets[backend], args.processes, args.iterations)
+                      for backend in ("sqlite", "redis")])
+    if server is not None:
+        server.shutdown()
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == "__main__":
+    main()
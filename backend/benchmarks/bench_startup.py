@@ -0,0 +1,114 @@
+"""Measure how long importing the app takes, per module, and fail on regressions.
+
+Imports app.main in fresh interpreters and reports the median wall-clock
+import time (interpreter startup excluded), the slowest modules by
+cumulative time under -X importtime, and whether any SDK meant to load on
+first use (firebase_admin, googleapiclient's discovery and transport,
+google_auth_oauthlib, ...) was imported anyway. Exits with status 1 if the
+median exceeds --threshold-ms or a lazy module was imported, so it can
+gate CI:
+
+    python -m benchmarks.bench_startup --runs 9 --top 20 --threshold-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+TARGET = "app.main"
+# Imported on first use; none of these may load with the app itself
+LAZY_MODULES = [
+    "firebase_admin",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "google_auth_httplib2",
+    "google_auth_oauthlib",
+    "google.auth.transport.requests",
+    "google.oauth2.credentials",
+    "httplib2",
+    "httpx",
+]
+# Required settings, so the benchmark runs without a .env file
+PLACEHOLDER_ENV = {
+    "GOOGLE_CLIENT_ID": "bench",
+    "GOOGLE_CLIENT_SECRET": "bench",
+    "GOOGLE_REDIRECT_URI": "http://localhost/callback",
+    "SECRET_KEY": "bench",
+}
+
+
+def _child_env() -> dict:
+    env = {**PLACEHOLDER_ENV, **os.environ}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def wall_time(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=_child_env(), check=True)
+    return time.perf_counter() - start
+
+
+def import_times() -> dict:
+    """Cumulative import time in microseconds per module for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        capture_output=True, text=True, env=_child_env(), check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def loaded_lazy_modules() -> list:
+    code = f"import json, sys, {TARGET}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=_child_env(), check=True)
+    loaded = set(json.loads(result.stdout.splitlines()[-1]))
+    return [module for module in LAZY_MODULES if module in loaded]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark")
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--threshold-ms", type=float, default=1500.0,
+                        help="Fail if the median import of app.main takes longer")
+    args = parser.parse_args()
+
+    # One warm-up run so every measured run reads compiled bytecode
+    import_times()
+    interpreter = statistics.median(wall_time("pass") for _ in range(args.runs))
+    total_ms = (statistics.median(wall_time(f"import {TARGET}") for _ in range(args.runs)) - interpreter) * 1000
+    samples = defaultdict(list)
+    for _ in range(args.runs):
+        for module, micros in import_times().items():
+            samples[module].append(micros)
+    medians = {module: statistics.median(values) for module, values in samples.items()}
+
+    print(f"import {TARGET}: {total_ms:.0f} ms median of {args.runs} runs (threshold {args.threshold_ms:.0f} ms)")
+    print("Slowest modules by cumulative import time (-X importtime adds overhead):")
+    slowest = sorted((module for module in medians if module != TARGET), key=medians.get, reverse=True)
+    for module in slowest[:args.top]:
+        print(f"  {medians[module] / 1000:8.1f} ms  {module}")
+
+    failed = False
+    eager = loaded_lazy_modules()
+    if eager:
+        print(f"FAIL: imported eagerly by {TARGET}: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.threshold_ms:
+        print(f"FAIL: import time {total_ms:.0f} ms exceeds {args.threshold_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark connection reuse for Google API calls and token refreshes.
+
+Runs the same sustained load (messages.get calls from many threads, with a
+token refresh every --refresh-every calls) against the fake Google server
+twice: with a new httplib2 connection per request and a new requests
+session per refresh, as before, and over the shared pooled transport. After
+a warm-up pass of each, it reports requests per second and how many TCP
+connections the server accepted; against googleapis.com each of those is
+also a TLS handshake:
+
+    python -m benchmarks.bench_transport --threads 16 --calls 50 --latency-ms 20
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .bench_startup import PLACEHOLDER_ENV
+
+# The app's settings must validate before it is imported
+for name, value in PLACEHOLDER_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.core.config import settings
+from app.services import google_client
+from app.services.http_transport import close_http_client, google_auth_request
+
+from .fake_google import start_fake_google
+
+
+def per_request_connection(credentials):
+    # The transport before the pooled client: a fresh httplib2.Http per request
+    import google_auth_httplib2
+    from googleapiclient.http import build_http
+
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+
+
+def new_session_request():
+    from google.auth.transport.requests import Request
+    return Request()
+
+
+def run(fake, token_uri: str, threads: int, calls: int, refresh_every: int, make_refresh_request) -> tuple:
+    from google.oauth2.credentials import Credentials
+
+    def worker(index: int):
+        creds = Credentials(token=f"token-{index}", refresh_token=f"refresh-{index}", token_uri=token_uri,
+                            client_id="bench", client_secret="bench")
+        service = google_client.get_service("gmail", "v1", creds)
+        for call in range(calls):
+            service.users().messages().get(userId="me", id=f"msg{call:06d}", format="metadata").execute()
+            if refresh_every and (call + 1) % refresh_every == 0:
+                creds.refresh(make_refresh_request())
+
+    google_client.clear_service_cache()
+    connections = fake.connection_count
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return time.perf_counter() - start, fake.connection_count - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled transport benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=50, help="API calls per thread")
+    parser.add_argument("--refresh-every", type=int, default=10, help="Refresh the token every N calls; 0 for never")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_google(mailbox_size=args.calls, latency=args.latency_ms / 1000)
+    settings.GOOGLE_API_ROOT_URL = base_url
+    # Every thread is its own user, but one fake project
+    settings.GOOGLE_QUOTA_ENABLED = False
+    token_uri = f"{base_url}token"
+    refreshes = args.threads * (args.calls // args.refresh_every if args.refresh_every else 0)
+    requests = args.threads * args.calls + refreshes
+    print(f"{args.threads} threads x {args.calls} calls, {refreshes} token refreshes, "
+          f"upstream latency {args.latency_ms:g} ms")
+
+    pooled_request_http = google_client._request_http
+    results = {}
+    # The first pass loads each transport's libraries and fills the pool; the second is reported
+    for _ in range(2):
+        google_client._request_http = per_request_connection
+        try:
+            results["connection per request"] = run(server.fake, token_uri, args.threads, args.calls,
+                                                    args.refresh_every, new_session_request)
+        finally:
+            google_client._request_http = pooled_request_http
+        results["shared pooled client"] = run(server.fake, token_uri, args.threads, args.calls,
+                                              args.refresh_every, google_auth_request)
+    close_http_client()
+    server.shutdown()
+
+    for name, (elapsed, connections) in results.items():
+        print(f"  {name:<24} {requests / elapsed:8.1f} req/s {connections:6d} connections "
+              f"({connections / requests:.2f} per request)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+"""Local stand-in for the Google APIs used by the backend.
+
+Serves the Gmail REST and batch endpoints from a generated mailbox, records
+sent mail, serves the Calendar events and freeBusy endpoints from a
+generated calendar, accepts Gmail watches and Calendar channels, and issues
+tokens and userinfo for the OAuth code exchange and token refresh, with a
+configurable per-request latency and error rate, so benchmarks can run
+without touching live Google. It also signs Firebase ID tokens and serves
+their signing cert the way Google's securetoken endpoint does. Run it standalone with:
+
+    python -m benchmarks.fake_google --port 8765 --latency-ms 50 --mailbox-size 500 --error-rate 0.01
+"""
+import argparse
+import base64
+import functools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+GMAIL_PREFIX = "/gmail/v1/users/me"
+CALENDAR_PREFIX = "/calendar/v3/calendars/primary"
+TOKEN_PATH = "/token"
+USERINFO_PATH = "/oauth2/v2/userinfo"
+# Statuses Google answers overloaded or throttled calls with
+TRANSIENT_ERRORS = (429, 500, 503)
+FIREBASE_CERTS_PATH = "/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_PROJECT_ID = "fake-project"
+FAKE_PROFILE = {"id": "fake-google-id", "email": "me@example.com", "verified_email": True, "name": "Fake User"}
+
+
+class FakeMailbox:
+    def __init__(self, size: int = 100, body_size: int = 2000):
+        self.size = size
+        self.body_size = body_size
+
+    def message_ids(self):
+        # Newest first, like Gmail
+        return [f"msg{i:06d}" for i in range(self.size - 1, -1, -1)]
+
+    def get(self, message_id: str, format: str = "full"):
+        index = int(message_id[3:])
+        if index >= self.size:
+            return None
+        headers = [
+            {"name": "Subject", "value": f"Message {index}"},
+            {"name": "From", "value": f"sender{index % 17}@example.com"},
+            {"name": "To", "value": "me@example.com"},
+            {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 +0000"},
+        ]
+        message = {
+            "id": message_id,
+            "threadId": message_id,
+            "labelIds": ["INBOX"],
+            "snippet": f"Snippet of message {index}",
+            "historyId": str(index + 1),
+            "internalDate": str(1704103200000 + index * 1000),
+            "payload": {"mimeType": "multipart/alternative", "headers": headers},
+        }
+        if format == "metadata":
+            return message
+        text = (f"Body of message {index}. " * (self.body_size // 20 + 1))[: self.body_size]
+        message["payload"]["parts"] = [
+            {
+                "partId": "0",
+                "mimeType": "text/plain",
+                "body": {"size": len(text), "data": base64.urlsafe_b64encode(text.encode()).decode()},
+            }
+        ]
+        return message
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def _format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeCalendar:
+    def __init__(self, size: int = 50):
+        self.events = {}
+        self.version = 0
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        for i in range(size):
+            self.insert({
+                "summary": f"Event {i}",
+                "start": {"dateTime": (now + timedelta(hours=3 * i)).isoformat()},
+                "end": {"dateTime": (now + timedelta(hours=3 * i + 1)).isoformat()},
+                "attendees": [{"email": f"guest{i % 5}@example.com"}],
+            })
+
+    def insert(self, event: dict) -> dict:
+        self.version += 1
+        event = dict(event, id=event.get("id") or f"evt{uuid4().hex[:12]}", status="confirmed",
+                     htmlLink="https://calendar.example.com/event", updated=str(self.version))
+        self.events[event["id"]] = event
+        return event
+
+    def patch(self, event_id: str, changes: dict):
+        event = self.events.get(event_id)
+        if event is None or event["status"] == "cancelled":
+            return None
+        self.version += 1
+        event.update(changes, updated=str(self.version))
+        return event
+
+    def delete(self, event_id: str) -> bool:
+        event = self.events.get(event_id)
+        if event is None or event["status"] == "cancelled":
+            return False
+        self.version += 1
+        event.update(status="cancelled", updated=str(self.version))
+        return True
+
+    def free_busy(self, query: dict) -> dict:
+        time_min, time_max = _parse_time(query["timeMin"]), _parse_time(query["timeMax"])
+        calendars = {}
+        for item in query.get("items", []):
+            calendar_id = item["id"]
+            if calendar_id.endswith("@unknown.example.com"):
+                calendars[calendar_id] = {"errors": [{"domain": "global", "reason": "notFound"}], "busy": []}
+                continue
+            if calendar_id == "primary":
+                periods = [
+                    (_parse_time(e["start"]["dateTime"]), _parse_time(e["end"]["dateTime"]))
+                    for e in self.events.values() if e["status"] != "cancelled"
+                ]
+            else:
+                # Other people are busy for an hour every few hours, offset by their address
+                seed = sum(calendar_id.encode())
+                start = time_min.replace(minute=0, second=0, microsecond=0) + timedelta(hours=seed % 3)
+                periods = []
+                while start < time_max:
+                    periods.append((start, start + timedelta(hours=1)))
+                    start += timedelta(hours=2 + seed % 4)
+            calendars[calendar_id] = {"busy": [
+                {"start": _format_time(start), "end": _format_time(end)}
+                for start, end in periods if start < time_max and end > time_min
+            ]}
+        return {"kind": "calendar#freeBusy", "timeMin": query["timeMin"], "timeMax": query["timeMax"], "calendars": calendars}
+
+    def list(self, sync_token: str = None):
+        if sync_token is not None and not sync_token.isdigit():
+            return 410, {"error": {"code": 410, "message": "Sync token is no longer valid."}}
+        since = int(sync_token or 0)
+        items = [
+            e for e in self.events.values()
+            if int(e["updated"]) > since and (sync_token is not None or e["status"] != "cancelled")
+        ]
+        return 200, {"items": items, "nextSyncToken": str(self.version)}
+
+
+class FakeFirebase:
+    """Signs Firebase ID tokens with a generated key and serves its cert."""
+
+    def __init__(self, project_id: str = FIREBASE_PROJECT_ID, max_age: int = 3600):
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+
+        self.project_id = project_id
+        # Seconds the cert may be cached, sent as Cache-Control max-age
+        self.max_age = max_age
+        self.key_id = uuid4().hex
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=7)).sign(key, hashes.SHA256())
+        )
+        self.key_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+        self.cert_fetches = 0
+
+    def certs(self) -> dict:
+        self.cert_fetches += 1
+        return {self.key_id: self.cert_pem}
+
+    def mint_id_token(self, uid: str, email: str, lifetime: int = 3600) -> str:
+        from google.auth import crypt, jwt
+
+        now = int(time.time())
+        signer = crypt.RSASigner.from_string(self.key_pem, key_id=self.key_id)
+        return jwt.encode(signer, {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "auth_time": now,
+            "user_id": uid,
+            "sub": uid,
+            "iat": now,
+            "exp": now + lifetime,
+            "email": email,
+            "email_verified": True,
+            "firebase": {"identities": {"email": [email]}, "sign_in_provider": "password"},
+        }).decode()
+
+
+class FakeGoogle:
+    def __init__(self, mailbox_size: int = 100, latency: float = 0.0, body_size: int = 2000,
+                 calendar_size: int = 50, send_errors=(), calendar_errors=(), error_rate: float = 0.0,
+                 seed: int = None):
+        self.mailbox = FakeMailbox(mailbox_size, body_size)
+        self.calendar = FakeCalendar(calendar_size)
+        # Statuses returned, in order, by the next messages.send calls
+        self.send_errors = list(send_errors)
+        # Statuses returned, in order, by the next calendar event writes
+        self.calendar_errors = list(calendar_errors)
+        # Message-ID header (without brackets) -> id of each sent message
+        self.sent = {}
+        # Open Calendar notification channels: channel id -> watch request body
+        self.channels = {}
+        self.watching_mailbox = False
+        self.latency = latency
+        # Fraction of API calls, batch parts included, answered with a random transient error
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.request_count = 0
+        # TCP connections accepted; fewer than requests when clients keep connections alive
+        self.connection_count = 0
+        self.error_count = 0
+        self.token_count = 0
+        self._lock = threading.Lock()
+
+    @functools.cached_property
+    def firebase(self) -> FakeFirebase:
+        # Generating the signing key takes a moment, so only when first needed
+        return FakeFirebase()
+
+    def _injected_error(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.error_count += 1
+            status = self._random.choice(TRANSIENT_ERRORS)
+            return status, {"error": {"code": status, "message": "Injected fake failure"}}
+        return None
+
+    def issue_token(self, body: bytes):
+        """Answer an authorization_code or refresh_token grant with a fresh access token."""
+        form = parse_qs(body.decode())
+        grant_type = form.get("grant_type", [""])[0]
+        if grant_type not in ("authorization_code", "refresh_token"):
+            return 400, {"error": "unsupported_grant_type"}
+        self.token_count += 1
+        token = {"access_token": f"fake-access-{uuid4().hex}", "expires_in": 3600, "token_type": "Bearer"}
+        if grant_type == "authorization_code":
+            token["refresh_token"] = f"fake-refresh-{uuid4().hex}"
+        if "scope" in form:
+            token["scope"] = form["scope"][0]
+        return 200, token
+
+    def dispatch(self, method: str, path: str, query: dict, body: bytes):
+        """Handle one API call and return (status, json-serializable payload)."""
+        error = self._injected_error()
+        if error:
+            return error
+        if method == "POST" and path == TOKEN_PATH:
+            return self.issue_token(body)
+        if method == "GET" and path == USERINFO_PATH:
+            return 200, FAKE_PROFILE
+        if method == "GET" and path == FIREBASE_CERTS_PATH:
+            return 200, self.firebase.certs()
+        if method == "GET" and path == f"{GMAIL_PREFIX}/profile":
+            return 200, {
+                "emailAddress": "me@example.com",
+                "messagesTotal": self.mailbox.size,
+                "historyId": str(self.mailbox.size),
+            }
+        if method == "POST" and path == f"{GMAIL_PREFIX}/watch":
+            self.watching_mailbox = True
+            expiration = datetime.now(timezone.utc) + timedelta(days=7)
+            return 200, {"historyId": str(self.mailbox.size), "expiration": str(int(expiration.timestamp() * 1000))}
+        if method == "POST" and path == f"{GMAIL_PREFIX}/stop":
+            self.watching_mailbox = False
+            return 204, None
+        if method == "GET" and path == f"{GMAIL_PREFIX}/history":
+            # Messages are only ever added, each bumping the history id by one
+            start = int(query.get("startHistoryId", ["0"])[0])
+            return 200, {"history": [
+                {"id": str(index + 1), "messagesAdded": [{"message": {"id": f"msg{index:06d}", "labelIds": ["INBOX"]}}]}
+                for index in range(start, self.mailbox.size)
+            ], "historyId": str(self.mailbox.size)}
+        if method == "POST" and path == f"{GMAIL_PREFIX}/messages/send":
+            if self.send_errors:
+                status = self.send_errors.pop(0)
+                return status, {"error": {"code": status, "message": "Fake send failure"}}
+            raw = base64.urlsafe_b64decode(json.loads(body)["raw"])
+            headers = BytesParser(policy=HTTP).parsebytes(raw, headersonly=True)
+            sent_id = f"sent{len(self.sent):06d}"
+            self.sent[str(headers["Message-ID"]).strip("<>")] = sent_id
+            return 200, {"id": sent_id, "threadId": sent_id, "labelIds": ["SENT"]}
+        if method == "GET" and path == f"{GMAIL_PREFIX}/messages" and "rfc822msgid:" in query.get("q", [""])[0]:
+            message_id = query["q"][0].split("rfc822msgid:", 1)[1].split()[0]
+            sent_id = self.sent.get(message_id)
+            return 200, {"messages": [{"id": sent_id, "threadId": sent_id}] if sent_id else [], "resultSizeEstimate": int(bool(sent_id))}
+        if method == "GET" and path == f"{GMAIL_PREFIX}/messages":
+            max_results = int(query.get("maxResults", ["100"])[0])
+            offset = int(query.get("pageToken", ["0"])[0])
+            all_ids = self.mailbox.message_ids()
+            ids = all_ids[offset:offset + max_results]
+            page = {
+                "messages": [{"id": i, "threadId": i} for i in ids],
+                "resultSizeEstimate": len(all_ids),
+            }
+            if offset + max_results < len(all_ids):
+                page["nextPageToken"] = str(offset + max_results)
+            return 200, page
+        if method == "GET" and path.startswith(f"{GMAIL_PREFIX}/messages/"):
+            message_id = path.rsplit("/", 1)[1]
+            message = self.mailbox.get(message_id, query.get("format", ["full"])[0])
+            if message is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, message
+        if method == "POST" and path == "/calendar/v3/freeBusy":
+            return 200, self.calendar.free_busy(json.loads(body))
+        if method == "POST" and path == f"{CALENDAR_PREFIX}/events/watch":
+            channel = json.loads(body)
+            ttl = int(channel.get("params", {}).get("ttl", 7 * 24 * 3600))
+            expiration = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            self.channels[channel["id"]] = channel
+            return 200, {
+                "kind": "api#channel", "id": channel["id"], "resourceId": f"resource-{channel['id']}",
+                "token": channel.get("token"), "expiration": str(int(expiration.timestamp() * 1000)),
+            }
+        if method == "POST" and path == "/calendar/v3/channels/stop":
+            self.channels.pop(json.loads(body)["id"], None)
+            return 204, None
+        if method in ("POST", "PATCH", "DELETE") and path.startswith(f"{CALENDAR_PREFIX}/events") and self.calendar_errors:
+            status = self.calendar_errors.pop(0)
+            return status, {"error": {"code": status, "message": "Fake calendar failure"}}
+        if path == f"{CALENDAR_PREFIX}/events":
+            if method == "GET":
+                return self.calendar.list(query.get("syncToken", [None])[0])
+            if method == "POST":
+                event = json.loads(body)
+                if event.get("id") in self.calendar.events:
+                    return 409, {"error": {"code": 409, "message": "The requested identifier already exists."}}
+                return 200, self.calendar.insert(event)
+        if method == "GET" and path.startswith(f"{CALENDAR_PREFIX}/events/"):
+            event = self.calendar.events.get(path.rsplit("/", 1)[1])
+            if event is None:
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, event
+        if method == "PATCH" and path.startswith(f"{CALENDAR_PREFIX}/events/"):
+            event = self.calendar.patch(path.rsplit("/", 1)[1], json.loads(body))
+            if event is None:
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, event
+        if method == "DELETE" and path.startswith(f"{CALENDAR_PREFIX}/events/"):
+            if self.calendar.delete(path.rsplit("/", 1)[1]):
+                return 204, None
+            return 410, {"error": {"code": 410, "message": "Resource has been deleted"}}
+        return 404, {"error": {"code": 404, "message": f"No fake route for {method} {path}"}}
+
+    def dispatch_batch(self, content_type: str, body: bytes) -> tuple:
+        """Answer a multipart/mixed batch request, returning (content_type, body)."""
+        envelope = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = f"batch_{uuid4().hex}"
+        chunks = []
+        for part in envelope.iter_parts():
+            inner = part.get_payload(decode=True)
+            head, _, inner_body = inner.partition(b"\r\n\r\n")
+            if not _:
+                head, _, inner_body = inner.partition(b"\n\n")
+            request_line = head.splitlines()[0].decode()
+            method, target, _version = request_line.split(" ", 2)
+            parsed = urlparse(target)
+            status, payload = self.dispatch(method, parsed.path, parse_qs(parsed.query), inner_body)
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; keep-alive clients would otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+    fake: FakeGoogle = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.fake._lock:
+            self.fake.connection_count += 1
+
+    def _handle(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with self.fake._lock:
+            self.fake.request_count += 1
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        parsed = urlparse(self.path)
+        # Handling is quick; the lock keeps the fake's state consistent across threads
+        if parsed.path == "/batch" or parsed.path.startswith("/batch/"):
+            with self.fake._lock:
+                content_type, payload = self.fake.dispatch_batch(self.headers["Content-Type"], body)
+            self._send(200, content_type, payload)
+            return
+        with self.fake._lock:
+            status, payload = self.fake.dispatch(method, parsed.path, parse_qs(parsed.query), body)
+        headers = {}
+        if parsed.path == FIREBASE_CERTS_PATH and status == 200:
+            headers["Cache-Control"] = f"public, max-age={self.fake.firebase.max_age}, must-revalidate, no-transform"
+        self._send(status, "application/json; charset=UTF-8", b"" if payload is None else json.dumps(payload).encode(), headers)
+
+    def _send(self, status: int, content_type: str, payload: bytes, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once; the socketserver default is 5
+    request_queue_size = 256
+
+
+def start_fake_google(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """Start a FakeGoogle server in a daemon thread and return (server, base_url)."""
+    fake = FakeGoogle(**kwargs)
+    handler = type("FakeGoogleHandler", (_Handler,), {"fake": fake})
+    server = _Server((host, port), handler)
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def build_fake_service(base_url: str, api: str = "gmail", version: str = "v1"):
+    """Build a googleapiclient resource that talks to the fake server."""
+    document = json.loads(get_static_doc(api, version))
+    document["rootUrl"] = base_url
+    document["baseUrl"] = base_url + document["servicePath"]
+    return build_from_document(document, credentials=Credentials(token="fake-token"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--mailbox-size", type=int, default=100)
+    parser.add_argument("--body-size", type=int, default=2000)
+    parser.add_argument("--calendar-size", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of calls answered with a random 429, 500 or 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server, url = start_fake_google(
+        args.host, args.port, mailbox_size=args.mailbox_size, latency=args.latency_ms / 1000,
+        body_size=args.body_size, calendar_size=args.calendar_size, error_rate=args.error_rate, seed=args.seed
+    )
+    print(f"Fake Google APIs listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
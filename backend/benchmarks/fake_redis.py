@@ -0,0 +1,216 @@
+"""Local stand-in for a Redis server, speaking just enough RESP for the shared state.
+
+Supports PING, AUTH, SELECT, GET, SET (EX, PX, NX), DEL, INCRBY, PEXPIRE,
+SCAN, FLUSHDB, and EVAL of the counter, lock release and quota reserve scripts, so the redis backend can
+be exercised without a Redis install. Run it standalone with:
+
+    python -m benchmarks.fake_redis --port 6390
+"""
+import argparse
+import re
+import socketserver
+import threading
+import time
+
+
+class RedisCommandError(Exception):
+    pass
+
+
+def _glob_to_regex(pattern: bytes) -> re.Pattern:
+    parts = []
+    chars = iter(pattern.decode())
+    for char in chars:
+        if char == "\\":
+            parts.append(re.escape(next(chars, "\\")))
+        elif char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+class FakeRedis:
+    def __init__(self):
+        # key -> (value, expires at on the monotonic clock or None)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.command_count = 0
+
+    def _get(self, key: bytes):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, name: str, args: list):
+        with self.lock:
+            self.command_count += 1
+            handler = getattr(self, f"cmd_{name}", None)
+            if handler is None:
+                raise RedisCommandError(f"ERR unknown command '{name}'")
+            return handler(*args)
+
+    def cmd_ping(self, *args):
+        return "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_get(self, key):
+        entry = self._get(key)
+        return None if entry is None else entry[0]
+
+    def cmd_set(self, key, value, *options):
+        expires_at = None
+        options = list(options)
+        if b"NX" in [option.upper() for option in options] and self._get(key) is not None:
+            return None
+        for i, option in enumerate(options):
+            if option.upper() == b"PX":
+                expires_at = time.monotonic() + int(options[i + 1]) / 1000
+            elif option.upper() == b"EX":
+                expires_at = time.monotonic() + int(options[i + 1])
+        self.data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def cmd_incrby(self, key, amount):
+        entry = self._get(key)
+        try:
+            value = (0 if entry is None else int(entry[0])) + int(amount)
+        except ValueError:
+            raise RedisCommandError("ERR value is not an integer or out of range")
+        self.data[key] = (str(value).encode(), None if entry is None else entry[1])
+        return value
+
+    def cmd_pexpire(self, key, milliseconds):
+        entry = self._get(key)
+        if entry is None:
+            return 0
+        self.data[key] = (entry[0], time.monotonic() + int(milliseconds) / 1000)
+        return 1
+
+    def cmd_scan(self, cursor, *options):
+        pattern = None
+        for i, option in enumerate(options):
+            if option.upper() == b"MATCH":
+                pattern = _glob_to_regex(options[i + 1])
+        keys = [key for key in list(self.data) if self._get(key) is not None
+                and (pattern is None or pattern.fullmatch(key.decode()))]
+        # Everything in one pass
+        return [b"0", keys]
+
+    def cmd_flushdb(self, *args):
+        self.data.clear()
+        return "OK"
+
+    def cmd_eval(self, script, numkeys, *args):
+        # Imported here so starting the fake does not load the app settings
+        from app.services.shared_state import REDIS_INCR_SCRIPT, REDIS_RELEASE_SCRIPT, REDIS_RESERVE_SCRIPT
+
+        if script.decode() == REDIS_INCR_SCRIPT:
+            key, amount = args[0], args[1]
+            value = self.cmd_incrby(key, amount)
+            if len(args) > 2 and self._get(key)[1] is None:
+                self.cmd_pexpire(key, args[2])
+            return value
+        if script.decode() == REDIS_RELEASE_SCRIPT:
+            key, token = args[0], args[1]
+            entry = self._get(key)
+            if entry is not None and entry[0] == token:
+                del self.data[key]
+                return 1
+            return 0
+        if script.decode() == REDIS_RESERVE_SCRIPT:
+            key, interval, burst = args[0], float(args[1]), float(args[2])
+            now = time.time()
+            entry = self._get(key)
+            scheduled = max(0.0 if entry is None else float(entry[0]), now) + interval
+            self.data[key] = (b"%.6f" % scheduled, time.monotonic() + scheduled - now)
+            return b"%.6f" % max(scheduled - burst - now, 0)
+        raise RedisCommandError("ERR only the counter, lock release and quota reserve scripts are supported")
+
+
+def _encode_reply(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RedisCommandError):
+        return b"-%s\r\n" % str(reply).encode()
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(item) for item in reply)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    fake = None
+    disable_nagle_algorithm = True
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            try:
+                reply = self.fake.execute(args[0].decode().lower(), args[1:])
+            except RedisCommandError as e:
+                reply = e
+            except (TypeError, IndexError, ValueError):
+                reply = RedisCommandError(f"ERR wrong arguments for '{args[0].decode()}' command")
+            self.wfile.write(_encode_reply(reply))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+
+def start_fake_redis(host: str = "127.0.0.1", port: int = 0):
+    """Start a FakeRedis server in a daemon thread and return (server, url)."""
+    fake = FakeRedis()
+    handler = type("FakeRedisHandler", (_Handler,), {"fake": fake})
+    server = _Server((host, port), handler)
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    server, url = start_fake_redis(args.host, args.port)
+    print(f"Fake Redis listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
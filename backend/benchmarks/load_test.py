@@ -0,0 +1,320 @@
+"""End-to-end load test of the backend against the fake Google APIs.
+
+Runs the app under uvicorn on a loopback port with a throwaway SQLite
+database, points every Google call (API, token refresh and the OAuth code
+exchange) and Firebase cert fetches at benchmarks.fake_google, and drives each scenario with a fixed
+number of concurrent clients for --duration seconds per concurrency level.
+Reports throughput and p50/p95/p99 latency per scenario and level, writes
+them as JSON with --output, and compares against an earlier run with
+--compare, exiting with status 1 when throughput drops or p95/p99 grow by
+more than --max-regression. --shared-state picks the shared state backend;
+redis runs against benchmarks.fake_redis:
+
+    python -m benchmarks.load_test --scenarios search,events --concurrency 1,10,50 --output run.json
+    python -m benchmarks.load_test --latency-ms 50 --error-rate 0.01 --compare run.json
+    python -m benchmarks.load_test --scenarios auth-me,search --shared-state redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import count
+
+import httpx
+
+from .bench_startup import PLACEHOLDER_ENV
+from .fake_google import FIREBASE_CERTS_PATH, start_fake_google
+from .fake_redis import start_fake_redis
+
+GMAIL_API = "/integrations/gmail/api"
+GMAIL_AUTH = "/integrations/gmail/auth"
+CALENDAR_API = "/integrations/calendar/api"
+# Result fields compared between runs and whether a higher value is better
+COMPARED_METRICS = {"throughput_rps": True, "p95_ms": False, "p99_ms": False}
+
+
+def _search(client, user, sequence):
+    return client.post(f"{GMAIL_API}/search", headers=_bearer(user),
+                       json={"query": "in:inbox", "source": "remote", "format": "metadata", "page_size": 10})
+
+
+def _last_received(client, user, sequence):
+    return client.get(f"{GMAIL_API}/last-received", headers=_bearer(user))
+
+
+def _send(client, user, sequence):
+    return client.post(f"{GMAIL_API}/send", headers={**_bearer(user), "Idempotency-Key": f"load-{sequence}"},
+                       json={"to_email": "to@example.com", "subject": f"Load {sequence}", "message_text": "Hello"})
+
+
+def _events(client, user, sequence):
+    return client.get(f"{CALENDAR_API}/events", headers=_bearer(user))
+
+
+def _auth_me(client, user, sequence):
+    return client.get("/api/auth/me", headers=_bearer(user))
+
+
+def _auth_login(client, user, sequence):
+    return client.get(f"{GMAIL_AUTH}/login")
+
+
+def _auth_callback(client, user, sequence):
+    return client.get(f"{GMAIL_AUTH}/callback", params={"code": f"fake-code-{sequence}"})
+
+
+def _auth_firebase(client, user, sequence):
+    return client.post("/api/auth/firebase-token", json={"id_token": user["id_token"]})
+
+
+# Scenario name -> (request function, statuses counted as success)
+SCENARIOS = {
+    "search": (_search, {200}),
+    "last-received": (_last_received, {200}),
+    "send": (_send, {202}),
+    "events": (_events, {200}),
+    "auth-me": (_auth_me, {200}),
+    "auth-login": (_auth_login, {307}),
+    "auth-callback": (_auth_callback, {302}),
+    "auth-firebase": (_auth_firebase, {200}),
+}
+
+
+def _bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['jwt']}"}
+
+
+def percentile(ordered: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configure(args, fake_url: str, firebase_project_id: str, redis_url: str = None) -> str:
+    """Point the app at a throwaway database and the fake; must run before app is imported."""
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    for name, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    # The fake serves the OAuth endpoints over plain http
+    os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+
+    from app.core.config import settings
+    settings.GOOGLE_API_ROOT_URL = fake_url
+    settings.GOOGLE_TOKEN_URI = f"{fake_url}token"
+    settings.FIREBASE_CERTS_URL = fake_url + FIREBASE_CERTS_PATH.lstrip("/")
+    settings.FIREBASE_PROJECT_ID = firebase_project_id
+    # Every simulated user shares one process and one fake project
+    settings.GOOGLE_QUOTA_ENABLED = args.quota
+    settings.MAIL_MIRROR_ENABLED = False
+    settings.CALENDAR_CACHE_ENABLED = False
+    settings.SHARED_STATE_BACKEND = args.shared_state
+    settings.SHARED_STATE_SQLITE_PATH = os.path.join(workdir, "shared_state.db")
+    if redis_url:
+        settings.SHARED_STATE_REDIS_URL = redis_url
+
+    secrets_path = os.path.join(workdir, "credentials.json")
+    with open(secrets_path, "w") as f:
+        json.dump({"web": {
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+            "auth_uri": f"{fake_url}o/oauth2/auth",
+            "token_uri": settings.GOOGLE_TOKEN_URI,
+            "redirect_uris": [settings.GOOGLE_REDIRECT_URI],
+        }}, f)
+    from app.integrations.calendar import google_auth as calendar_google_auth
+    from app.integrations.gmail import google_auth as gmail_google_auth
+    gmail_google_auth.CLIENT_SECRETS_FILE = secrets_path
+    calendar_google_auth.CLIENT_SECRETS_FILE = secrets_path
+    return workdir
+
+
+def seed_users(users: int, expired_tokens: bool, firebase) -> list:
+    """Create the simulated users, each with a backend JWT and a Firebase ID token."""
+    from app.core.security import create_access_token
+    from app.crud.user import create_user
+    from app.database.connection import SessionLocal, create_db_tables
+    from app.models.user import UserCreate
+
+    create_db_tables()
+    # Expired tokens make each user's first request refresh through the fake
+    expiry = datetime.utcnow() + (timedelta(hours=-1) if expired_tokens else timedelta(hours=2))
+    seeded = []
+    with SessionLocal() as db:
+        for i in range(users):
+            email = f"load{i}@example.com"
+            create_user(db, UserCreate(
+                email=email, google_id=f"load-{i}", access_token=f"fake-token-{i}",
+                refresh_token=f"fake-refresh-{i}", token_expiry=expiry.isoformat(), scope=""
+            ))
+            seeded.append({
+                "jwt": create_access_token({"sub": email}, timedelta(hours=2)),
+                # The Firebase uid matches google_id, so logins find the seeded user
+                "id_token": firebase.mint_id_token(f"load-{i}", email),
+            })
+    return seeded
+
+
+def start_app(port: int):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_level(base_url: str, scenario: str, concurrency: int, duration: float, users: list,
+                    sequence: count) -> dict:
+    """Drive one scenario with a closed loop of concurrent clients for duration seconds."""
+    request, expected = SCENARIOS[scenario]
+    latencies, statuses = [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # One request per worker first, so connection setup is not measured
+        await asyncio.gather(*(request(client, users[i % len(users)], next(sequence)) for i in range(concurrency)))
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int):
+            user = users[index % len(users)]
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = (await request(client, user, next(sequence))).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if status not in expected),
+        "statuses": {str(status): n for status, n in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def compare(results: list, baseline: dict, max_regression: float) -> list:
+    """Print the change against a baseline run and return the regressions found."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with baseline (max regression {max_regression:.0%}):")
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            print(f"  {result['scenario']:<14} c={result['concurrency']:<4} not in baseline")
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before[metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            changes.append(f"{metric} {old:g} -> {new:g} ({change:+.1%})")
+            if (-change if higher_is_better else change) > max_regression:
+                regressions.append(f"{result['scenario']} @ {result['concurrency']}: {metric} {change:+.1%}")
+        print(f"  {result['scenario']:<14} c={result['concurrency']:<4} " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario and level")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--expired-tokens", action="store_true", help="Start every user with an expired Google token")
+    parser.add_argument("--quota", action="store_true", help="Keep the client-side Google quota limiter on")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fake Google latency per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake Google calls that fail")
+    parser.add_argument("--mailbox-size", type=int, default=500)
+    parser.add_argument("--calendar-size", type=int, default=50)
+    parser.add_argument("--body-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shared-state", choices=("memory", "sqlite", "redis"), default="memory")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Largest tolerated relative drop in throughput or rise in p95/p99")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    fake_server, fake_url = start_fake_google(
+        mailbox_size=args.mailbox_size, latency=args.latency_ms / 1000, body_size=args.body_size,
+        calendar_size=args.calendar_size, error_rate=args.error_rate, seed=args.seed
+    )
+    redis_server, redis_url = start_fake_redis() if args.shared_state == "redis" else (None, None)
+    configure(args, fake_url, fake_server.fake.firebase.project_id, redis_url)
+    users = seed_users(args.users, args.expired_tokens, fake_server.fake.firebase)
+    port = _free_port()
+    server = start_app(port)
+
+    results = []
+    sequence = count()
+    print(f"Fake Google latency {args.latency_ms:g} ms, error rate {args.error_rate:g}, "
+          f"{args.users} users, {args.duration:g} s per level, {args.shared_state} shared state")
+    print(f"  {'scenario':<14} {'conc':>4} {'requests':>8} {'errors':>6} {'req/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for scenario in scenarios:
+        for level in levels:
+            result = asyncio.run(run_level(f"http://127.0.0.1:{port}", scenario, level, args.duration, users, sequence))
+            results.append(result)
+            print(f"  {scenario:<14} {level:>4} {result['requests']:>8} {result['errors']:>6} "
+                  f"{result['throughput_rps']:>9.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+    server.should_exit = True
+    fake_server.shutdown()
+    if redis_server is not None:
+        redis_server.shutdown()
+    print(f"Fake Google served {fake_server.fake.request_count} requests, "
+          f"{fake_server.fake.token_count} tokens, {fake_server.fake.firebase.cert_fetches} Firebase cert fetches, "
+          f"{fake_server.fake.error_count} injected errors")
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("FAIL: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
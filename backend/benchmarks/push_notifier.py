@@ -0,0 +1,87 @@
+"""Post sample push notifications to a running backend.
+
+Stands in for Google while testing the webhook receivers locally: a Gmail
+notification is wrapped in the Pub/Sub push envelope, and a Calendar
+notification carries the X-Goog-Channel-* headers of an events.watch
+channel (look the channel id and token up in the push_channels table):
+
+    python -m benchmarks.push_notifier gmail --email me@example.com --history-id 120 --token secret
+    python -m benchmarks.push_notifier calendar --channel-id <id> --channel-token <token>
+"""
+import argparse
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import uuid4
+
+import httpx
+
+DEFAULT_BACKEND = "http://127.0.0.1:8000"
+
+
+def gmail_notification(email_address: str, history_id: int, subscription: str = "projects/local/subscriptions/gmail-push") -> dict:
+    """A Pub/Sub push request body for a Gmail mailbox change."""
+    data = json.dumps({"emailAddress": email_address, "historyId": history_id}).encode()
+    return {
+        "message": {
+            "data": base64.b64encode(data).decode(),
+            "messageId": uuid4().hex,
+            "publishTime": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        },
+        "subscription": subscription,
+    }
+
+
+def calendar_notification_headers(channel_id: str, channel_token: Optional[str] = None,
+                                  resource_state: str = "exists", message_number: int = 1) -> dict:
+    """Headers Google sends with a Calendar channel notification."""
+    headers = {
+        "X-Goog-Channel-ID": channel_id,
+        "X-Goog-Resource-ID": f"resource-{channel_id}",
+        "X-Goog-Resource-State": resource_state,
+        "X-Goog-Message-Number": str(message_number),
+    }
+    if channel_token:
+        headers["X-Goog-Channel-Token"] = channel_token
+    return headers
+
+
+def send_gmail_notification(client: httpx.Client, email_address: str, history_id: int, token: Optional[str] = None) -> int:
+    params = {"token": token} if token else None
+    response = client.post("/integrations/gmail/push", params=params, json=gmail_notification(email_address, history_id))
+    return response.status_code
+
+
+def send_calendar_notification(client: httpx.Client, channel_id: str, channel_token: Optional[str] = None,
+                               resource_state: str = "exists") -> int:
+    headers = calendar_notification_headers(channel_id, channel_token, resource_state)
+    return client.post("/integrations/calendar/push", headers=headers).status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--count", type=int, default=1, help="Notifications to send")
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+    gmail = subparsers.add_parser("gmail")
+    gmail.add_argument("--email", required=True)
+    gmail.add_argument("--history-id", type=int, required=True)
+    gmail.add_argument("--token", help="GMAIL_PUBSUB_VERIFICATION_TOKEN")
+    calendar = subparsers.add_parser("calendar")
+    calendar.add_argument("--channel-id", required=True)
+    calendar.add_argument("--channel-token")
+    calendar.add_argument("--resource-state", default="exists")
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.backend) as client:
+        for i in range(args.count):
+            if args.kind == "gmail":
+                status = send_gmail_notification(client, args.email, args.history_id + i, args.token)
+            else:
+                status = send_calendar_notification(client, args.channel_id, args.channel_token, args.resource_state)
+            print(f"{args.kind} notification {i + 1}: HTTP {status}")
+
+
+if __name__ == "__main__":
+    main()